@@ -0,0 +1,151 @@
+"""ARIMA stage of the hybrid model: order search and per-ticker fitting.
+
+For every ``Stock Name`` the differencing order d comes from the ADF test
+(``stationarity.choose_differencing``), then (p, q) is chosen by a stepwise
+search in the style of Hyndman-Khandakar: start from a few small orders and
+move to a neighbouring order only while AIC improves, so most of the grid is
+never fitted. An exhaustive grid with AIC pruning is available too.
+
+Tickers are fitted in a process pool and each fitted model is pickled to
+disk under a key made of the ticker, a hash of its series and the search
+settings, so unchanged tickers are loaded instead of refitted.
+"""
+
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import statsmodels
+from statsmodels.tsa.arima.model import ARIMA
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskCache, content_hash
+from instrumentation import instrument
+from stationarity import choose_differencing
+
+ARIMA_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'arima')
+
+
+# Fit one ARIMA order; returns None when the fit fails
+def fit_arima(series, order, start_params=None):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            return ARIMA(series, order=order).fit(start_params=start_params)
+        except (ValueError, np.linalg.LinAlgError):
+            return None
+
+
+# Stepwise (p, q) search for a fixed d, moving to the best neighbour while AIC improves.
+# Returns (best result, number of models fitted).
+def stepwise_search(series, d, max_p=5, max_q=5, max_fits=40):
+    fitted = {}
+
+    def evaluate(p, q):
+        if (p, q) not in fitted and 0 <= p <= max_p and 0 <= q <= max_q and len(fitted) < max_fits:
+            fitted[(p, q)] = fit_arima(series, (p, d, q))
+        return fitted.get((p, q))
+
+    for p, q in ((2, 2), (0, 0), (1, 0), (0, 1)):
+        evaluate(p, q)
+    best = _best(fitted)
+    if best is None:
+        return None, len(fitted)
+
+    improved = True
+    while improved and len(fitted) < max_fits:
+        improved = False
+        p, q = best
+        for dp, dq in ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)):
+            result = evaluate(p + dp, q + dq)
+            if result is not None and result.aic < fitted[best].aic:
+                best, improved = (p + dp, q + dq), True
+    return fitted[best], len(fitted)
+
+
+# Exhaustive search over p <= max_p, q <= max_q, abandoning a row of q values once
+# AIC has stopped improving on the row's best by more than prune_delta
+def grid_search(series, d, max_p=5, max_q=5, prune_delta=10.0):
+    best, num_fits = None, 0
+    for p in range(max_p + 1):
+        row_best = np.inf
+        for q in range(max_q + 1):
+            result = fit_arima(series, (p, d, q))
+            num_fits += 1
+            if result is None:
+                continue
+            if best is None or result.aic < best.aic:
+                best = result
+            if result.aic > row_best + prune_delta:
+                break
+            row_best = min(row_best, result.aic)
+    return best, num_fits
+
+
+def _best(fitted):
+    candidates = {order: result for order, result in fitted.items() if result is not None}
+    return min(candidates, key=lambda order: candidates[order].aic) if candidates else None
+
+
+# Choose d and (p, q) for one series and fit it
+def select_arima(series, search='stepwise', max_d=2, alpha=0.05, **search_params):
+    d = choose_differencing(series, alpha=alpha, max_d=max_d)
+    if search == 'stepwise':
+        result, num_fits = stepwise_search(series, d, **search_params)
+    elif search == 'grid':
+        result, num_fits = grid_search(series, d, **search_params)
+    else:
+        raise ValueError(f'Unknown ARIMA search: {search}')
+    return result, num_fits
+
+
+# Worker: fit (or load from cache) the model for one ticker
+def _fit_ticker(task):
+    ticker_column, ticker, values, key, cache_dir, search, search_params = task
+    cache = DiskCache(cache_dir)
+    start = time.perf_counter()
+    cached = key in cache
+    if cached:
+        result, num_fits = cache.get(key), 0
+    else:
+        result, num_fits = select_arima(values, search=search, **search_params)
+        if result is not None:
+            cache.put(key, result)
+    row = {ticker_column: ticker, 'num_observations': len(values), 'order': None, 'aic': np.nan,
+           'bic': np.nan, 'num_fits': num_fits, 'cached': cached,
+           'fit_seconds': time.perf_counter() - start, 'model_key': key}
+    if result is not None:
+        row.update(order=tuple(result.model.order), aic=result.aic, bic=result.bic)
+    return row
+
+
+# Fit an ARIMA model per ticker across a process pool (n_workers=1 runs in-process;
+# mp_context, a multiprocessing context, sets how the workers are started).
+# Returns one row per ticker; models are stored in cache_dir and can be read back
+# with load_arima_model(row['model_key']).
+@instrument
+def fit_arima_universe(stock_df, price_column='Close', ticker_column='Stock Name',
+                       date_column='Date', n_workers=None, cache_dir=ARIMA_CACHE_DIR,
+                       search='stepwise', mp_context=None, **search_params):
+    ordered = stock_df.sort_values([ticker_column, date_column], kind='stable')
+    tasks = []
+    for ticker, group in ordered.groupby(ticker_column, observed=True, sort=True):
+        values = group[price_column].to_numpy(dtype=np.float64)
+        key = content_hash('arima', ticker, values, search, sorted(search_params.items()),
+                           statsmodels.__version__)
+        tasks.append((ticker_column, ticker, values, key, cache_dir, search, search_params))
+
+    # Largest series first so the pool is not left waiting on one long fit
+    tasks.sort(key=lambda task: -len(task[2]))
+    if n_workers == 1:
+        rows = list(map(_fit_ticker, tasks))
+    else:
+        with ProcessPoolExecutor(n_workers, mp_context=mp_context) as pool:
+            rows = list(pool.map(_fit_ticker, tasks))
+    return pd.DataFrame(rows).sort_values(ticker_column, ignore_index=True)
+
+
+def load_arima_model(model_key, cache_dir=ARIMA_CACHE_DIR):
+    return DiskCache(cache_dir).get(model_key)
@@ -0,0 +1,210 @@
+"""Walk-forward backtesting of the hybrid ARIMA + LSTM forecast.
+
+For every ticker an origin rolls through the history in steps of ``step``
+bars. At each origin the ARIMA model forecasts the next ``horizon`` closes,
+the LSTM adds its predicted residual to the first step, and RMSE/MAPE of
+both forecasts are recorded together with the fold's wall time.
+
+Nothing is retrained from scratch when the origin moves:
+
+* ARIMA results are extended with the new bars (``extend``, fixed
+  parameters, O(step) work) and re-estimated only every ``refit_every``
+  folds, warm-started from the previous parameters;
+* the MACD/Bollinger state is updated append-only with ``IndicatorState``
+  and its values (MACD histogram and Bollinger %B) are LSTM input features;
+* the LSTM is fine-tuned for a few epochs on the windows ending in the new
+  bars instead of being retrained.
+
+Tickers are independent and run in a process pool whose workers use one
+torch thread each.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from arima import fit_arima, select_arima
+from indicators import IndicatorState
+from instrumentation import instrument
+from lstm import WindowedDataset, configure_threads, predict_next, train_lstm
+
+DEFAULT_SETTINGS = {
+    'initial_train': 756,     # bars before the first origin (about three years)
+    'step': 21,               # bars the origin advances per fold
+    'horizon': 21,            # bars forecast at each origin
+    'refit_every': 12,        # full (warm-started) ARIMA refit every n folds
+    'order': None,            # fixed ARIMA order, or None to search on the first window
+    'use_lstm': True,
+    'window': 30,             # LSTM input window
+    'lstm_epochs': 3,         # epochs on the initial training window
+    'fine_tune_epochs': 1,    # epochs on the new windows at each fold
+    'seed': 0,
+}
+
+
+def rmse(actual, forecast):
+    return float(np.sqrt(np.mean((actual - forecast) ** 2)))
+
+
+def mape(actual, forecast):
+    return float(np.mean(np.abs((actual - forecast) / actual)))
+
+
+FEATURE_COLUMNS = ('residual', 'sentiment', 'macd_histogram', 'bollinger_b')
+
+
+def _residual_frame(residuals, sentiment, indicator_features, dates, scale):
+    return pd.DataFrame({'Date': dates, 'Stock Name': 0, 'residual': residuals / scale,
+                         'sentiment': sentiment, 'macd_histogram': indicator_features[:, 0],
+                         'bollinger_b': indicator_features[:, 1]})
+
+
+# Scale-free LSTM inputs from one bar's indicator values: the MACD histogram relative
+# to the close and the Bollinger %B centred on the middle band (0 before the band exists)
+def _indicator_features(values, close):
+    half_width = values['Upper Bollinger Band'] - values['Middle Bollinger Band']
+    position = (close - values['Middle Bollinger Band']) / half_width if half_width > 0 else 0.0
+    return (values['MACD'] - values['MACD Signal']) / close, position
+
+
+# Worker: run every fold of one ticker
+def _backtest_ticker(task):
+    ticker, dates, close, sentiment, settings = task
+    initial, step, horizon, window = (settings['initial_train'], settings['step'],
+                                      settings['horizon'], settings['window'])
+    if len(close) < initial + horizon:
+        return []
+
+    order = settings['order']
+    if order is None:
+        first, _ = select_arima(close[:initial])
+        if first is None:
+            return []
+        order = tuple(first.model.order)
+    result = fit_arima(close[:initial], order)
+    if result is None:
+        return []
+
+    residuals = np.zeros(len(close))
+    residuals[:initial] = result.resid
+    # The first d residuals are the undifferenced starting values
+    residuals[:order[1]] = 0.0
+    scale = residuals[:initial].std() or 1.0
+
+    # Indicator features of bar i only use closes up to i, so they are filled as the
+    # origin passes each bar and never see the forecast horizon
+    indicators = IndicatorState()
+    indicator_features = np.zeros((len(close), 2))
+    for i in range(initial):
+        indicator_values = indicators.update(close[i])
+        indicator_features[i] = _indicator_features(indicator_values, close[i])
+
+    model = None
+    if settings['use_lstm']:
+        dataset = WindowedDataset(_residual_frame(residuals[:initial], sentiment[:initial],
+                                                  indicator_features[:initial], dates[:initial], scale),
+                                  window, FEATURE_COLUMNS, normalize=False)
+        model, _ = train_lstm(dataset, epochs=settings['lstm_epochs'], seed=settings['seed'])
+
+    rows = []
+    origin, fold = initial, 0
+    while origin + horizon <= len(close):
+        start = time.perf_counter()
+        actual = close[origin:origin + horizon]
+        arima_forecast = np.asarray(result.forecast(horizon))
+        hybrid_forecast = arima_forecast.copy()
+        if model is not None:
+            features = np.column_stack((residuals[origin - window:origin] / scale,
+                                        sentiment[origin - window:origin],
+                                        indicator_features[origin - window:origin]))
+            hybrid_forecast[0] += predict_next(model, features) * scale
+
+        row = {'Stock Name': ticker, 'fold': fold, 'origin_date': dates[origin], 'order': order,
+               'rmse_arima': rmse(actual, arima_forecast), 'mape_arima': mape(actual, arima_forecast),
+               'rmse_hybrid': rmse(actual, hybrid_forecast),
+               'mape_hybrid': mape(actual, hybrid_forecast),
+               'MACD': indicator_values['MACD'], 'MACD Signal': indicator_values['MACD Signal']}
+
+        # Roll the origin forward with append-only updates
+        end = min(origin + step, len(close))
+        new_bars = close[origin:end]
+        for i in range(origin, end):
+            indicator_values = indicators.update(close[i])
+            indicator_features[i] = _indicator_features(indicator_values, close[i])
+        if (fold + 1) % settings['refit_every'] == 0:
+            refit = fit_arima(close[:end], order, start_params=result.params)
+            update = 'refit' if refit is not None else 'extend'
+        else:
+            refit, update = None, 'extend'
+        if refit is not None:
+            result = refit
+            residuals[:end] = result.resid
+            residuals[:order[1]] = 0.0
+        else:
+            result = result.extend(new_bars)
+            residuals[origin:end] = result.resid
+
+        if model is not None:
+            recent = slice(max(origin - window, 0), end)
+            dataset = WindowedDataset(_residual_frame(residuals[recent], sentiment[recent],
+                                                      indicator_features[recent], dates[recent],
+                                                      scale),
+                                      window, FEATURE_COLUMNS, normalize=False)
+            if len(dataset):
+                model, _ = train_lstm(dataset, model=model, epochs=settings['fine_tune_epochs'],
+                                      seed=settings['seed'] + fold)
+
+        row['model_update'] = update
+        row['wall_seconds'] = time.perf_counter() - start
+        rows.append(row)
+        origin, fold = end, fold + 1
+    return rows
+
+
+# Walk-forward backtest of every ticker in stock_df.
+# sentiment_df (optional) supplies per-row 'sentiment', averaged per ticker-day; days
+# without tweets count as neutral. Returns one row per (ticker, fold).
+@instrument
+def walk_forward_backtest(stock_df, sentiment_df=None, n_workers=None, price_column='Close',
+                          ticker_column='Stock Name', date_column='Date', **settings):
+    settings = {**DEFAULT_SETTINGS, **settings}
+    frame = stock_df[[ticker_column, date_column, price_column]].assign(
+        **{date_column: pd.to_datetime(stock_df[date_column])})
+    if sentiment_df is not None:
+        daily = sentiment_df.assign(**{date_column: pd.to_datetime(sentiment_df[date_column])}) \
+            .groupby([ticker_column, date_column], observed=True)['sentiment'].mean().rename('sentiment')
+        frame = frame.join(daily, on=[ticker_column, date_column])
+    else:
+        frame['sentiment'] = 0.0
+    frame['sentiment'] = frame['sentiment'].fillna(0.0)
+    frame = frame.sort_values([ticker_column, date_column], kind='stable')
+
+    tasks = [(ticker, group[date_column].to_numpy(), group[price_column].to_numpy(dtype=np.float64),
+              group['sentiment'].to_numpy(dtype=np.float64), settings)
+             for ticker, group in frame.groupby(ticker_column, observed=True, sort=True)]
+    tasks.sort(key=lambda task: -len(task[2]))
+
+    if n_workers == 1:
+        results = list(map(_backtest_ticker, tasks))
+    else:
+        # One torch thread per worker; the calling process keeps its own setting
+        with ProcessPoolExecutor(n_workers, initializer=configure_threads, initargs=(1,)) as pool:
+            results = list(pool.map(_backtest_ticker, tasks))
+
+    rows = [row for ticker_rows in results for row in ticker_rows]
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    return table.rename(columns={'Stock Name': ticker_column}) \
+        .sort_values([ticker_column, 'fold'], ignore_index=True)
+
+
+# Mean fold metrics and total wall time per ticker
+def summarize_backtest(results, ticker_column='Stock Name'):
+    return results.groupby(ticker_column).agg(
+        folds=('fold', 'count'),
+        rmse_arima=('rmse_arima', 'mean'), mape_arima=('mape_arima', 'mean'),
+        rmse_hybrid=('rmse_hybrid', 'mean'), mape_hybrid=('mape_hybrid', 'mean'),
+        wall_seconds=('wall_seconds', 'sum'))
@@ -0,0 +1,51 @@
+"""Benchmark CSV loading against the typed Parquet ingestion layer.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ingest --csv stocks_prediction.csv
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from ingest import STOCK_SCHEMA, ensure_parquet, load_dataset
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>32}: {elapsed * 1000:9.1f} ms  peak {peak / 2**20:8.1f} MiB  "
+          f"frame {df.memory_usage(deep=True).sum() / 2**20:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='stocks_prediction.csv')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as parquet_dir:
+        measure('pd.read_csv', lambda: pd.read_csv(args.csv))
+        start = time.perf_counter()
+        ensure_parquet(args.csv, STOCK_SCHEMA, parquet_dir)
+        print(f"{'first-run conversion':>32}: {(time.perf_counter() - start) * 1000:9.1f} ms")
+        measure('parquet, all columns',
+                lambda: load_dataset(args.csv, STOCK_SCHEMA, parquet_dir=parquet_dir))
+        measure('parquet, Date/Close/Stock Name',
+                lambda: load_dataset(args.csv, STOCK_SCHEMA, columns=['Date', 'Close', 'Stock Name'],
+                                     parquet_dir=parquet_dir))
+        ticker = pd.read_csv(args.csv, usecols=['Stock Name'], nrows=1)['Stock Name'][0]
+        measure(f'parquet, {ticker} since 2020',
+                lambda: load_dataset(args.csv, STOCK_SCHEMA, columns=['Date', 'Close'],
+                                     tickers=[ticker], start='2020-01-01', parquet_dir=parquet_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark LSTM residual training throughput and memory for several window sizes.
+
+Each window size runs in a fresh process so its peak RSS is measured on its own.
+Run from the repository root:
+
+    python -m benchmarks.bench_lstm --rows 200000 --tickers 50 --windows 30 60 120
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from lstm import WindowedDataset, configure_threads, train_lstm
+
+
+def synthetic_residuals(num_rows, num_tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    per_ticker = num_rows // num_tickers
+    return pd.DataFrame({
+        'Date': np.tile(pd.date_range('2000-01-03', periods=per_ticker, freq='B'), num_tickers),
+        'Stock Name': np.repeat([f'T{t:04d}' for t in range(num_tickers)], per_ticker),
+        'residual': rng.normal(0, 0.5, per_ticker * num_tickers),
+        'sentiment': rng.integers(-1, 2, per_ticker * num_tickers).astype(float),
+    })
+
+
+# Limit an epoch to the first num_samples shuffled samples of a dataset
+class _Subset:
+
+    def __init__(self, dataset, num_samples):
+        self.dataset = dataset
+        self.num_samples = num_samples
+        self.feature_columns = dataset.feature_columns
+
+    def batches(self, batch_size, shuffle=True, seed=None):
+        order = np.random.default_rng(seed).permutation(len(self.dataset))[:self.num_samples]
+        for start in range(0, len(order), batch_size):
+            yield self.dataset.gather(order[start:start + batch_size])
+
+
+def run(window, num_rows, num_tickers, batch_size, max_batches, num_threads):
+    configure_threads(num_threads)
+    frame = synthetic_residuals(num_rows, num_tickers)
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    dataset = WindowedDataset(frame, window)
+
+    samples = min(len(dataset), batch_size * max_batches)
+    subset = _Subset(dataset, samples)
+    start = time.perf_counter()
+    train_lstm(subset, epochs=1, batch_size=batch_size, seed=0)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return samples / elapsed, peak_rss / 1024, (peak_rss - start_rss) / 1024, len(dataset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--windows', type=int, nargs='+', default=[30, 60, 120])
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--max-batches', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    for window in args.windows:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            throughput, peak, growth, num_windows = pool.submit(
+                run, window, args.rows, args.tickers, args.batch_size, args.max_batches,
+                args.threads).result()
+        materialized = num_windows * window * 2 * 4 / 2**20
+        print(f"window={window:4d}  {throughput:9.0f} samples/s  peak RSS {peak:7.1f} MiB  "
+              f"(+{growth:6.1f} MiB; a materialised window tensor would be {materialized:7.1f} MiB)")
+
+
+if __name__ == '__main__':
+    main()
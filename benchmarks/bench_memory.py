@@ -0,0 +1,66 @@
+"""Benchmark the peak memory of the price stages as the history grows.
+
+A synthetic OHLCV history of --rows rows (see benchmarks/synthetic.py), in
+the wide dtypes of a plain read_csv, is scaled 1x, 10x and 100x and run
+through ``downcast_frame``, the float32 indicator stage, the per-ticker
+outlier analysis and the per-ticker return parameters. Each stage is
+measured with ``memory.MemoryTracker`` (tracemalloc peak and RSS); the run
+fails if any stage's traced peak exceeds --budget MiB.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory --rows 30000 --budget 512
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_stocks
+from blackswan_insights import stages
+from memory import MemoryTracker, downcast_frame
+from outliers import analyze_outliers
+from ticker_simulations import ticker_return_parameters
+
+SCALES = (1, 10, 100)
+
+
+def run_stages(tracker, history, label):
+    with tracker.stage(f'{label}/downcast'):
+        frame = downcast_frame(history, categorical_ratio=0.01)
+    with tracker.stage(f'{label}/indicators'):
+        with_indicators = stages.indicators(frame)
+    with tracker.stage(f'{label}/outliers'):
+        analysis = analyze_outliers(with_indicators, stages.NUMERICAL_COLUMNS, by='Stock Name')
+        analysis.counts()
+    with tracker.stage(f'{label}/return_parameters'):
+        ticker_return_parameters(with_indicators)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=30_000, help='rows at scale 1x')
+    parser.add_argument('--budget', type=float, default=512, help='per-stage traced peak in MiB')
+    args = parser.parse_args()
+
+    tracker = MemoryTracker(args.budget)
+    for scale in SCALES:
+        history = synthetic_stocks(args.rows * scale)
+        run_stages(tracker, history, f'{scale}x')
+        del history
+
+    report = tracker.report()
+    with pd.option_context('display.float_format', '{:.1f}'.format, 'display.width', 120):
+        print(report.to_string())
+    print(f"Budget: {args.budget:.0f} MiB per stage; largest traced peak "
+          f"{report['traced_peak_mib'].max():.1f} MiB at {SCALES[-1]}x ({args.rows * SCALES[-1]} rows)")
+    try:
+        tracker.check()
+    except MemoryError as error:
+        print(error)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark the vectorised Monte Carlo engine against the notebook loops.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_monte_carlo --simulations 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from monte_carlo import RETURN_MODELS, run_monte_carlo
+
+# Parameters for the models that have no defaults
+MODEL_PARAMS = {
+    'regime': {'regime_means': [-0.001, 0.0005, 0.001], 'regime_stds': [0.03, 0.02, 0.025],
+               'transition': [[0.2, 0.7, 0.1], [0.05, 0.9, 0.05], [0.1, 0.7, 0.2]]},
+}
+
+
+# The original nested-loop implementation from the notebook, kept for comparison
+def loop_monte_carlo(initial_price, mean_return, std_return, num_days, num_simulations, seed=None):
+    rng = np.random.default_rng(seed)
+    final_prices = np.zeros(num_simulations)
+    for i in range(num_simulations):
+        daily_returns = rng.normal(mean_return, std_return, num_days)
+        price_series = [initial_price]
+        for dr in daily_returns:
+            price_series.append(price_series[-1] * (1 + dr))
+        final_prices[i] = price_series[-1]
+    return final_prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--simulations', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=252)
+    parser.add_argument('--chunk-size', type=int, default=10_000)
+    parser.add_argument('--loop-simulations', type=int, default=10_000,
+                        help='paths timed for the loop version (extrapolated to --simulations)')
+    args = parser.parse_args()
+
+    initial_price, mean_return, std_return = 25.0, 0.0005, 0.02
+
+    start = time.perf_counter()
+    loop_monte_carlo(initial_price, mean_return, std_return, args.days, args.loop_simulations, seed=0)
+    loop_time = (time.perf_counter() - start) * args.simulations / args.loop_simulations
+
+    start = time.perf_counter()
+    summary, _ = run_monte_carlo(initial_price, mean_return, std_return, args.days,
+                                 args.simulations, chunk_size=args.chunk_size, seed=0)
+    vector_time = time.perf_counter() - start
+
+    print(f"Paths: {args.simulations}, days: {args.days}, chunk size: {args.chunk_size}")
+    print(f"Loop (extrapolated): {loop_time:8.2f} s")
+    print(f"Vectorised:          {vector_time:8.2f} s  ({loop_time / vector_time:.0f}x faster)")
+    print(f"Final price quantiles: {np.round(summary['quantiles'], 2)}")
+
+    # Black-swan return models relative to the Gaussian vectorised path
+    for model in RETURN_MODELS:
+        if model == 'gaussian':
+            continue
+        start = time.perf_counter()
+        summary, _ = run_monte_carlo(initial_price, mean_return, std_return, args.days,
+                                     args.simulations, chunk_size=args.chunk_size, seed=0,
+                                     model=model, model_params=MODEL_PARAMS.get(model))
+        model_time = time.perf_counter() - start
+        print(f"{model + ':':<21}{model_time:8.2f} s  ({model_time / vector_time:.2f}x Gaussian), "
+              f"quantiles {np.round(summary['quantiles'], 2)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark the off-screen report against drawing every point as the notebook does.
+
+Both sides render on the Agg canvas to PNG files, so the difference is the
+number of artists and points drawn: the notebook's Open vs Close scatter of
+every row, one line per simulated path and the full-resolution close series,
+against the thinned scatter, the percentile fan and the LTTB-downsampled line
+of ``plotting``.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_report --rows 300000 --simulations 1000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_stocks
+from monte_carlo import simulate_price_paths
+from plotting import (downsample, draw_fan, draw_lines, draw_scatter, path_bands, render_figures,
+                      thin_scatter_indices)
+
+
+def _draw_full_scatter(ax, df):
+    for ticker, group in df.groupby('Stock Name', sort=True):
+        ax.scatter(group['Open'], group['Close'], s=4, label=ticker)
+    ax.legend()
+
+
+def _draw_all_paths(ax, paths):
+    ax.plot(paths.T, color='gray', alpha=0.2)
+
+
+def _draw_full_line(ax, dates, close):
+    ax.plot(dates, close, label='Original')
+
+
+def full_charts(df, paths):
+    return {
+        'scatter': (_draw_full_scatter, {'df': df}),
+        'paths': (_draw_all_paths, {'paths': paths}),
+        'close': (_draw_full_line, {'dates': df['Date'].to_numpy(), 'close': df['Close'].to_numpy()}),
+    }
+
+
+def reduced_charts(df, paths):
+    names = df['Stock Name'].to_numpy()
+    open_prices, close = df['Open'].to_numpy(), df['Close'].to_numpy()
+    keep = thin_scatter_indices(open_prices, close, names)
+    groups = {ticker: (open_prices[keep][names[keep] == ticker], close[keep][names[keep] == ticker])
+              for ticker in np.unique(names)}
+    return {
+        'scatter': (draw_scatter, {'groups': groups}),
+        'paths': (draw_fan, {'bands': path_bands(paths)}),
+        'close': (draw_lines, {'lines': {'Original': downsample(df['Date'].to_numpy(), close)}}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=300_000)
+    parser.add_argument('--simulations', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=252)
+    parser.add_argument('--workers', type=int, help='report worker processes (default: all CPUs)')
+    args = parser.parse_args()
+
+    df = synthetic_stocks(args.rows)
+    paths = simulate_price_paths(float(df['Close'].iloc[-1]), 0.0005, 0.02, args.days - 1,
+                                 args.simulations, seed=0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        render_figures(full_charts(df, paths), os.path.join(directory, 'full'), n_workers=1)
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render_figures(reduced_charts(df, paths), os.path.join(directory, 'reduced'), args.workers)
+        reduced_time = time.perf_counter() - start
+
+    print(f"Rows: {args.rows}, simulated paths: {args.simulations} x {args.days} days")
+    print(f"Every point, in-process:        {full_time:7.2f} s")
+    print(f"Downsampled, worker pool:       {reduced_time:7.2f} s")
+    print(f"Speed-up: {full_time / reduced_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
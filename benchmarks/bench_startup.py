@@ -0,0 +1,67 @@
+"""Benchmark the cold start of the simulate stage.
+
+Each measurement is a fresh interpreter, so nothing is warm in sys.modules.
+Reports the import time of the package, the end-to-end time of a small
+``python -m blackswan_insights simulate`` run, and checks that none of the
+heavy libraries of the other stages were imported along the way.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+BUDGET_SECONDS = 1.0
+
+# Libraries only the clean, eda and model stages should load
+HEAVY_MODULES = ('spacy', 'nltk', 'wordcloud', 'seaborn', 'matplotlib', 'statsmodels', 'torch',
+                 'scipy.stats', 'google.colab')
+
+_PROBE = '''
+import json, sys
+from blackswan_insights.__main__ import main
+main(sys.argv[1:])
+print(json.dumps([name for name in {heavy!r} if name in sys.modules]), file=sys.stderr)
+'''
+
+
+def _run(args):
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--simulations', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Cache the Parquet copy of the data first; the benchmark measures warm-disk starts
+    _run(['-c', 'from blackswan_insights import ingest; ingest(sentiment=False)'])
+
+    interpreter = min(_run(['-c', 'pass'])[0] for _ in range(args.repeat))
+    package = min(_run(['-c', 'import blackswan_insights'])[0] for _ in range(args.repeat))
+    simulate_args = ['simulate', '--simulations', str(args.simulations), '--workers', '1',
+                     '--seed', '0']
+    runs = [_run(['-c', _PROBE.format(heavy=HEAVY_MODULES), *simulate_args])
+            for _ in range(args.repeat)]
+    simulate = min(elapsed for elapsed, _ in runs)
+    loaded = json.loads(runs[0][1].stderr.strip().splitlines()[-1])
+
+    print(f"Interpreter start:          {interpreter * 1000:7.0f} ms")
+    print(f"import blackswan_insights:  {package * 1000:7.0f} ms")
+    print(f"simulate ({args.simulations} paths/ticker): {simulate * 1000:7.0f} ms  "
+          f"(budget {BUDGET_SECONDS * 1000:.0f} ms)")
+    print(f"Heavy modules loaded:       {', '.join(loaded) or 'none'}")
+    if simulate > BUDGET_SECONDS or loaded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark tweet cleaning throughput for different batch sizes and process counts.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_text_cleaning --batch-sizes 100 1000 --processes 1 2 4
+"""
+
+import argparse
+import re
+import time
+
+import nltk
+import pandas as pd
+import spacy
+
+from text_cleaning import clean_texts
+
+
+# The original per-tweet implementation from the notebook, kept for comparison
+def notebook_clean_text(text, nlp):
+    cleaned_text = re.sub(r'http\S+', '', text)
+    cleaned_text = re.sub(r'[^a-zA-Z\s]', '', cleaned_text)
+    cleaned_text = ' '.join(cleaned_text.split())
+    words = nltk.word_tokenize(cleaned_text)
+    return ' '.join(token.lemma_ for token in nlp(' '.join(words)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default='stocks_sentiment_prediction.csv')
+    parser.add_argument('--model', default='en_core_web_sm')
+    parser.add_argument('--repeat', type=int, default=1, help='replicate the tweets this many times')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    nltk.download('punkt', quiet=True)
+    nlp = spacy.load(args.model, disable=['parser', 'ner'])
+    tweets = pd.read_csv(args.data)['tweets'].tolist() * args.repeat
+
+    start = time.perf_counter()
+    expected = [notebook_clean_text(tweet, nlp) for tweet in tweets]
+    elapsed = time.perf_counter() - start
+    print(f"{'per-tweet apply':>24}: {len(tweets) / elapsed:10.0f} tweets/s")
+
+    for n_process in args.processes:
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            cleaned = clean_texts(tweets, nlp, batch_size=batch_size, n_process=n_process)
+            elapsed = time.perf_counter() - start
+            label = f"batch={batch_size} procs={n_process}"
+            print(f"{label:>24}: {len(tweets) / elapsed:10.0f} tweets/s  "
+                  f"matches={cleaned == expected}")
+
+
+if __name__ == '__main__':
+    main()
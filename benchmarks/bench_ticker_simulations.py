@@ -0,0 +1,44 @@
+"""Benchmark how the per-ticker simulation runner scales with worker count.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ticker_simulations --simulations 200000
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from ticker_simulations import simulate_universe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default='stocks_prediction.csv')
+    parser.add_argument('--simulations', type=int, default=200_000)
+    parser.add_argument('--days', type=int, default=252)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    stock_df = pd.read_csv(args.data)
+    workers = sorted({1, *range(2, args.max_workers + 1, 2), args.max_workers})
+
+    baseline = None
+    reference = None
+    for n_workers in workers:
+        start = time.perf_counter()
+        results = simulate_universe(stock_df, num_steps=args.days, num_simulations=args.simulations,
+                                    seed=0, n_workers=n_workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        if reference is None:
+            reference = results
+        identical = results.equals(reference)
+        print(f"workers={n_workers:3d}  {elapsed:8.2f} s  speedup={baseline / elapsed:5.2f}x  "
+              f"identical={identical}")
+
+
+if __name__ == '__main__':
+    main()
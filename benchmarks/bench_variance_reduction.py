@@ -0,0 +1,66 @@
+"""Benchmark the paths and CPU time needed to reach a target precision per sampling scheme.
+
+Every sampling scheme of ``monte_carlo.SAMPLING_SCHEMES`` runs
+``run_monte_carlo_adaptive`` until the standard errors of the mean,
+standard deviation and 2.5/50/97.5 percentiles of the final price are at
+most --precision of their estimates. With the same precision the schemes
+give the same confidence-interval widths, so the paths and CPU time they
+took are directly comparable. The control variate is switched on for every
+scheme except the first row, plain pseudo-random sampling, which is the
+reference.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_variance_reduction --precision 0.002 --model garch
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_monte_carlo import MODEL_PARAMS
+from monte_carlo import RETURN_MODELS, SAMPLING_SCHEMES, run_monte_carlo_adaptive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--precision', type=float, default=0.002)
+    parser.add_argument('--days', type=int, default=252)
+    parser.add_argument('--max-simulations', type=int, default=5_000_000)
+    parser.add_argument('--batch-size', type=int, default=4096)
+    parser.add_argument('--model', choices=list(RETURN_MODELS), default='gaussian')
+    args = parser.parse_args()
+
+    initial_price, mean_return, std_return = 25.0, 0.0005, 0.02
+    runs = [('random', False)] + [(sampling, True) for sampling in SAMPLING_SCHEMES]
+
+    print(f"Target relative standard error: {args.precision:.2%}, model: {args.model}, "
+          f"days: {args.days}")
+    # Import scipy.stats.qmc and warm the caches outside the timings
+    for sampling in SAMPLING_SCHEMES:
+        run_monte_carlo_adaptive(initial_price, mean_return, std_return, args.days, 16,
+                                 precision=None, batch_size=8, sampling=sampling)
+
+    reference = None
+    for sampling, control_variate in runs:
+        start = time.process_time()
+        summary, errors = run_monte_carlo_adaptive(
+            initial_price, mean_return, std_return, args.days, args.max_simulations,
+            args.precision, args.batch_size, seed=0, sampling=sampling,
+            control_variate=control_variate, model=args.model,
+            model_params=MODEL_PARAMS.get(args.model))
+        cpu_time = time.process_time() - start
+        reference = reference or (summary['num_simulations'], cpu_time)
+        label = f"{sampling}{' + control' if control_variate else ''}"
+        print(f"{label:<22} {summary['num_simulations']:>9,} paths {cpu_time:7.2f} s CPU  "
+              f"({reference[0] / summary['num_simulations']:5.1f}x fewer paths, "
+              f"{reference[1] / cpu_time:5.1f}x less CPU)"
+              f"{'' if summary['converged'] else '  [not converged]'}")
+        print(f"{'':<22} p2.5/p50/p97.5 {np.round(summary['quantiles'], 3)} "
+              f"+- {np.round(errors['quantiles'], 3)}, mean {summary['mean_final_price']:.3f} "
+              f"+- {errors['mean_final_price']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
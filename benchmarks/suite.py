@@ -0,0 +1,441 @@
+"""Benchmark suite over synthetic data, with stored baselines and a regression check.
+
+Every case times one hot path on data from benchmarks/synthetic.py at the
+chosen scale: the Monte Carlo loops and return models, tweet cleaning, the
+MACD/Bollinger indicators, the outlier detectors, the sentiment feature
+assembly and CSV ingestion. Where the notebook's original implementation is
+kept for comparison it is timed too, on a capped number of rows. A case is
+run --repeat times and its best time is kept.
+
+Baselines are stored per scale in benchmarks/baselines.json together with
+the machine and library versions they were measured with and, when the
+text cleaning cases ran, the spaCy model they used ('blank' when
+en_core_web_sm is not installed and only tokenisation is measured). Case
+names do not depend on the environment. A case whose time
+exceeds its baseline by more than --threshold (a fraction) is reported as a
+regression and the run exits with status 1. Absolute times only compare on
+the same machine and library versions: when the environment differs from
+the baseline's, the ratios are printed but not checked.
+
+Case setups import everything their timed call needs, so first-call import
+costs (SciPy's quasi-random engines, for example) stay out of the timings.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --scale small                   # compare with the baseline
+    python -m benchmarks.suite --scale small --save-baseline   # store a new baseline
+    python -m benchmarks.suite --scale medium --only monte_carlo indicators --threshold 0.25
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_stocks, synthetic_tweets, write_csv
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+DEFAULT_THRESHOLD = 0.2
+
+# Data sizes per scale; the notebook loops run on at most loop_rows rows (or paths)
+SCALES = {
+    'small': {'bars': 30_000, 'tickers': 7, 'tweets': 5_000, 'simulations': 10_000,
+              'loop_rows': 2_000},
+    'medium': {'bars': 1_000_000, 'tickers': 200, 'tweets': 200_000, 'simulations': 100_000,
+               'loop_rows': 5_000},
+    'large': {'bars': 10_000_000, 'tickers': 2_000, 'tweets': 2_000_000, 'simulations': 1_000_000,
+              'loop_rows': 10_000},
+}
+
+NUM_DAYS = 252
+
+NUMERICAL_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+# The synthetic data of one scale, generated on first use and shared by the cases
+class Workload:
+
+    def __init__(self, scale, directory, seed=0):
+        self.scale = scale
+        self.sizes = SCALES[scale]
+        self.directory = directory
+        self.seed = seed
+        self.spacy_model = None
+
+    @cached_property
+    def stocks(self):
+        return synthetic_stocks(self.sizes['bars'], self.sizes['tickers'], seed=self.seed)
+
+    @cached_property
+    def tweets(self):
+        return synthetic_tweets(self.stocks, self.sizes['tweets'], seed=self.seed)
+
+    @cached_property
+    def stocks_csv(self):
+        return write_csv(self.stocks, os.path.join(self.directory, 'stocks.csv'))
+
+    @cached_property
+    def tweets_csv(self):
+        return write_csv(self.tweets, os.path.join(self.directory, 'tweets.csv'))
+
+    @cached_property
+    def nlp(self):
+        import spacy
+
+        try:
+            nlp = spacy.load('en_core_web_sm', disable=['parser', 'ner'])
+            self.spacy_model = 'en_core_web_sm'
+        except OSError:
+            # Without the model the cases measure tokenisation only; recorded with the results
+            nlp = spacy.blank('en')
+            self.spacy_model = 'blank'
+        return nlp
+
+
+# Benchmark cases: name -> setup(workload) returning (rows, run). Only run is timed.
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+@case('monte_carlo.notebook_loop')
+def _monte_carlo_loop(workload):
+    from benchmarks.bench_monte_carlo import loop_monte_carlo
+
+    num_paths = min(workload.sizes['simulations'], workload.sizes['loop_rows'])
+    return num_paths, lambda: loop_monte_carlo(100.0, 0.0005, 0.02, NUM_DAYS, num_paths, seed=0)
+
+
+def _monte_carlo_model(model):
+    def setup(workload):
+        from benchmarks.bench_monte_carlo import MODEL_PARAMS
+        from monte_carlo import run_monte_carlo
+
+        num_paths = workload.sizes['simulations']
+        return num_paths, lambda: run_monte_carlo(100.0, 0.0005, 0.02, NUM_DAYS, num_paths, seed=0,
+                                                  model=model, model_params=MODEL_PARAMS.get(model))
+    return setup
+
+
+for _model in ('gaussian', 'student_t', 'jump', 'garch', 'regime'):
+    case(f'monte_carlo.{_model}')(_monte_carlo_model(_model))
+
+
+# The quasi-random samplers import SciPy lazily on first use; load it before timing
+def _import_quasi_random():
+    for module in ('scipy.special', 'scipy.stats.qmc'):
+        importlib.import_module(module)
+
+
+def _monte_carlo_sampling(sampling):
+    def setup(workload):
+        from monte_carlo import run_monte_carlo
+
+        if sampling in ('sobol', 'halton'):
+            _import_quasi_random()
+        num_paths = workload.sizes['simulations']
+        return num_paths, lambda: run_monte_carlo(100.0, 0.0005, 0.02, NUM_DAYS, num_paths, seed=0,
+                                                  sampling=sampling)
+    return setup
+
+
+for _sampling in ('antithetic', 'sobol', 'halton'):
+    case(f'monte_carlo.sampling_{_sampling}')(_monte_carlo_sampling(_sampling))
+
+
+@case('monte_carlo.adaptive_sobol')
+def _monte_carlo_adaptive(workload):
+    from monte_carlo import run_monte_carlo_adaptive
+
+    _import_quasi_random()
+    num_paths = workload.sizes['simulations']
+    return num_paths, lambda: run_monte_carlo_adaptive(100.0, 0.0005, 0.02, NUM_DAYS, num_paths,
+                                                       precision=0.002, seed=0)
+
+
+@case('monte_carlo.universe')
+def _monte_carlo_universe(workload):
+    from ticker_simulations import simulate_universe
+
+    stocks = workload.stocks
+    num_paths = max(1_000, workload.sizes['simulations'] // workload.sizes['tickers'])
+    return (num_paths * workload.sizes['tickers'],
+            lambda: simulate_universe(stocks, NUM_DAYS, num_paths, seed=0, n_workers=1))
+
+
+@case('text_cleaning.normalize_text')
+def _normalize_text(workload):
+    from text_cleaning import normalize_text
+
+    tweets = workload.tweets['tweets'].tolist()
+    return len(tweets), lambda: [normalize_text(tweet) for tweet in tweets]
+
+
+@case('text_cleaning.notebook_clean_text')
+def _notebook_clean_text(workload):
+    import nltk
+
+    from benchmarks.bench_text_cleaning import notebook_clean_text
+
+    # word_tokenize needs punkt_tab on NLTK >= 3.8.2 and punkt before; nothing is downloaded
+    try:
+        nltk.word_tokenize('probe')
+    except LookupError:
+        raise ImportError("NLTK's punkt/punkt_tab tokenizer data is not installed") from None
+    nlp = workload.nlp
+    tweets = workload.tweets['tweets'].tolist()[:workload.sizes['loop_rows']]
+    return len(tweets), lambda: [notebook_clean_text(tweet, nlp) for tweet in tweets]
+
+
+@case('text_cleaning.clean_text')
+def _clean_text(workload):
+    from text_cleaning import clean_text
+
+    nlp = workload.nlp
+    tweets = workload.tweets['tweets'].tolist()[:workload.sizes['loop_rows']]
+    return len(tweets), lambda: [clean_text(tweet, nlp) for tweet in tweets]
+
+
+@case('text_cleaning.clean_texts')
+def _clean_texts(workload):
+    from text_cleaning import clean_texts
+
+    nlp = workload.nlp
+    tweets = workload.tweets['tweets'].tolist()
+    return len(tweets), lambda: clean_texts(tweets, nlp)
+
+
+@case('indicators.notebook_groupby')
+def _indicators_notebook(workload):
+    from benchmarks.bench_indicators import groupby_apply
+
+    stocks = workload.stocks
+    return len(stocks), lambda: groupby_apply(stocks)
+
+
+@case('indicators.add_indicators')
+def _indicators_engine(workload):
+    from indicators import add_indicators
+
+    stocks = workload.stocks
+    return len(stocks), lambda: add_indicators(stocks.copy(deep=False))
+
+
+@case('outliers.notebook_detectors')
+def _outliers_notebook(workload):
+    from outliers import detect_outliers_iqr, detect_outliers_zscore
+
+    stocks = workload.stocks
+
+    def run():
+        for column in NUMERICAL_COLUMNS:
+            detect_outliers_zscore(stocks[column])
+            detect_outliers_iqr(stocks[column])
+    return len(stocks), run
+
+
+@case('outliers.analyze_outliers')
+def _outliers_engine(workload):
+    from outliers import analyze_outliers
+
+    stocks = workload.stocks
+    return len(stocks), lambda: analyze_outliers(stocks, NUMERICAL_COLUMNS)
+
+
+@case('outliers.analyze_outliers_by_ticker')
+def _outliers_by_ticker(workload):
+    from outliers import analyze_outliers
+
+    stocks = workload.stocks
+    return len(stocks), lambda: analyze_outliers(stocks, NUMERICAL_COLUMNS, by='Stock Name')
+
+
+@case('features.sentiment_features')
+def _sentiment_features(workload):
+    from sentiment_features import sentiment_features
+
+    stocks, tweets = workload.stocks, workload.tweets
+    return len(stocks) + len(tweets), lambda: sentiment_features(stocks, tweets)
+
+
+@case('ingest.pandas_read_csv')
+def _read_csv(workload):
+    path = workload.stocks_csv
+    return workload.sizes['bars'], lambda: pd.read_csv(path)
+
+
+@case('ingest.read_csv_typed')
+def _read_csv_typed(workload):
+    from ingest import STOCK_SCHEMA, read_csv_typed
+
+    path = workload.stocks_csv
+    return workload.sizes['bars'], lambda: read_csv_typed(path, STOCK_SCHEMA)
+
+
+@case('ingest.csv_to_parquet')
+def _csv_to_parquet(workload):
+    from ingest import STOCK_SCHEMA, csv_to_parquet
+
+    path = workload.stocks_csv
+    dataset_dir = os.path.join(workload.directory, 'converted')
+    return workload.sizes['bars'], lambda: csv_to_parquet(path, dataset_dir, STOCK_SCHEMA)
+
+
+@case('ingest.load_parquet')
+def _load_parquet(workload):
+    from ingest import STOCK_SCHEMA, ensure_parquet, load_dataset
+
+    path = workload.stocks_csv
+    parquet_dir = os.path.join(workload.directory, 'parquet')
+    ensure_parquet(path, STOCK_SCHEMA, parquet_dir)
+    return workload.sizes['bars'], lambda: load_dataset(path, STOCK_SCHEMA, parquet_dir=parquet_dir)
+
+
+@case('ingest.sentiment_read_csv_typed')
+def _read_sentiment_csv(workload):
+    from ingest import SENTIMENT_SCHEMA, read_csv_typed
+
+    path = workload.tweets_csv
+    return workload.sizes['tweets'], lambda: read_csv_typed(path, SENTIMENT_SCHEMA)
+
+
+# Cases whose name starts with one of the prefixes (all cases without prefixes)
+def select_cases(prefixes=None):
+    if not prefixes:
+        return list(CASES)
+    return [name for name in CASES if any(name == prefix or name.startswith(f'{prefix}.')
+                                          for prefix in prefixes)]
+
+
+def environment():
+    import pyarrow
+
+    return {'machine': platform.machine(), 'processor': platform.processor(),
+            'cpus': os.cpu_count(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'pyarrow': pyarrow.__version__}
+
+
+# Time every case; cases whose setup needs a missing library are reported as skipped.
+# Returns the results and the spaCy model the text cleaning cases used (None when none ran).
+def run_suite(scale, names, repeat=3, seed=0):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        workload = Workload(scale, directory, seed)
+        for name in names:
+            try:
+                rows, run = CASES[name](workload)
+            except ImportError as error:
+                results[name] = {'status': 'skipped', 'reason': str(error)}
+                print(f'{name:<40} skipped ({error})', flush=True)
+                continue
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+            results[name] = {'status': 'ok', 'seconds': min(times), 'median_seconds': float(np.median(times)),
+                             'rows': rows, 'rows_per_second': rows / min(times)}
+            print(f'{name:<40} {min(times):9.4f} s  {rows / min(times):14,.0f} rows/s', flush=True)
+    return results, workload.spacy_model
+
+
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+# One row per case with the baseline time and the ratio to it; regression marks the
+# cases slower than the baseline by more than threshold
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    rows = []
+    for name, result in results.items():
+        base = baseline.get('cases', {}).get(name, {})
+        seconds, base_seconds = result.get('seconds'), base.get('seconds')
+        ratio = seconds / base_seconds if seconds and base_seconds else np.nan
+        rows.append({'case': name, 'seconds': seconds, 'baseline_seconds': base_seconds,
+                     'ratio': ratio, 'regression': bool(ratio > 1 + threshold)})
+    return pd.DataFrame(rows, columns=['case', 'seconds', 'baseline_seconds', 'ratio',
+                                       'regression']).set_index('case')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--only', nargs='+', help='case names or groups (e.g. monte_carlo ingest)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown over the baseline reported as a regression (0.2 = 20%%)')
+    parser.add_argument('--baselines', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store these results as the baseline of the scale')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    names = select_cases(args.only)
+    if not names:
+        parser.error(f'No benchmark case matches {args.only}')
+    results, spacy_model = run_suite(args.scale, names, args.repeat)
+    run = {'environment': environment(), 'sizes': SCALES[args.scale], 'cases': results}
+    if spacy_model is not None:
+        run['spacy_model'] = spacy_model
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    baselines = load_baselines(args.baselines)
+    if args.save_baseline:
+        baseline = baselines.setdefault(args.scale, {'cases': {}})
+        baseline['environment'] = run['environment']
+        baseline['sizes'] = run['sizes']
+        if spacy_model is not None:
+            baseline['spacy_model'] = spacy_model
+        baseline['cases'].update({name: result for name, result in results.items()
+                                  if result['status'] == 'ok'})
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline for scale {args.scale!r} written to {args.baselines}')
+        return
+
+    baseline = baselines.get(args.scale)
+    if baseline is None:
+        print(f'No baseline for scale {args.scale!r}; store one with --save-baseline')
+        return
+    same_environment = baseline.get('environment') == run['environment']
+    if not same_environment:
+        print('Note: the baseline was measured on a different machine or library versions:')
+        print(f"  {baseline.get('environment')}")
+    if spacy_model is not None and baseline.get('spacy_model', spacy_model) != spacy_model:
+        print(f"Note: the text cleaning baselines used spaCy model {baseline['spacy_model']!r}, "
+              f"this run {spacy_model!r}")
+    comparison = compare(results, baseline, args.threshold)
+    with pd.option_context('display.float_format', '{:.4f}'.format, 'display.width', 120):
+        print(comparison.to_string())
+    if not same_environment:
+        print('Regressions not checked; store a baseline on this machine with --save-baseline')
+        return
+    regressions = comparison.index[comparison['regression']]
+    if len(regressions):
+        print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f'No regressions over {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
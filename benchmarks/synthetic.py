@@ -0,0 +1,131 @@
+"""Synthetic data in the schemas of the bundled CSVs, at any scale.
+
+``synthetic_stocks`` produces the ``stocks_prediction.csv`` columns for any
+number of bars and tickers: per-ticker geometric random walks with
+occasional jumps (so the outlier detectors have something to find), Open,
+High and Low consistent with Close, and log-normal volumes. Rows are grouped
+by ticker and sorted by business day, like the bundled file.
+
+``synthetic_tweets`` attaches tweets to random rows of such a frame, in the
+``stocks_sentiment_prediction.csv`` columns. The words follow a Zipf
+distribution over a fixed vocabulary, and cashtags, mentions, URLs, numbers
+and punctuation appear at roughly the rates of the real tweets, so the
+cleaning regexes and the lemma cache see realistic input.
+
+Everything is seeded, so a benchmark run at a given scale always sees the
+same data.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+STOCK_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Stock Name']
+SENTIMENT_COLUMNS = STOCK_COLUMNS + ['tweets', 'sentiment', 'tweet_cleaned']
+
+VOCABULARY = (
+    'the to and a of is in it for on this i that be you are with stock just at buy have so '
+    'my but not market will all up like going today now what get out down price short go can '
+    'shares long time day think they was from more calls puts if sell one year about your '
+    'good back still why big know trade people money see been week over earnings news '
+    'company only sold bought bullish bearish holding selling buying dip rally run running '
+    'moving moved crashing crashed gains losses losing pumping dumped squeeze options '
+    'investors traders analysts expected expecting higher lower strong weak green red '
+    'volume close open support resistance target targets quarter quarters deliveries '
+    'demand growth cars factories profits revenue guidance reported reports fund funds '
+    'chart charts breaking broke holds held would could should really never always again '
+    'tomorrow yesterday morning love hate wrong right better best worst much many'
+).split()
+
+SENTIMENT_VALUES = np.array([-1.0, 0.0, 1.0], dtype=np.float32)
+SENTIMENT_SHARES = (0.25, 0.35, 0.4)
+
+
+def ticker_names(num_tickers):
+    return [f'T{ticker:04d}.SA' for ticker in range(num_tickers)]
+
+
+# num_bars rows of OHLCV bars spread evenly over num_tickers tickers
+def synthetic_stocks(num_bars, num_tickers=7, seed=0, start='2000-01-03'):
+    rng = np.random.default_rng(seed)
+    bars_per_ticker = -(-num_bars // num_tickers)
+    shape = (num_tickers, bars_per_ticker)
+
+    volatility = rng.uniform(0.01, 0.04, (num_tickers, 1))
+    log_returns = rng.normal(0.0003, 1.0, shape) * volatility
+    jumps = rng.random(shape) < 0.002
+    log_returns[jumps] += rng.normal(0.0, 0.15, int(jumps.sum()))
+    initial = rng.lognormal(np.log(20), 0.8, (num_tickers, 1))
+    close = initial * np.exp(np.cumsum(log_returns, axis=1))
+    previous = np.concatenate([initial, close[:, :-1]], axis=1)
+    open_ = previous * np.exp(rng.normal(0, 0.25, shape) * volatility)
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.5, shape)) * volatility)
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.5, shape)) * volatility)
+    volume = rng.lognormal(np.log(1e7), 1.0, shape).astype(np.int64)
+
+    dates = pd.bdate_range(start, periods=bars_per_ticker).to_numpy()
+
+    def column(values):
+        return np.maximum(np.round(values, 2), 0.01).ravel()[:num_bars]
+
+    return pd.DataFrame({
+        'Date': np.tile(dates, num_tickers)[:num_bars],
+        'Open': column(open_),
+        'High': column(high),
+        'Low': column(low),
+        'Close': column(close),
+        'Volume': volume.ravel()[:num_bars],
+        'Stock Name': np.repeat(np.array(ticker_names(num_tickers), dtype=object),
+                                bars_per_ticker)[:num_bars],
+    }, columns=STOCK_COLUMNS)
+
+
+# num_tweets tweets on random (ticker, day) rows of stocks, sorted like the bundled file
+def synthetic_tweets(stocks, num_tweets, seed=0, mean_words=14):
+    rng = np.random.default_rng(seed)
+    rows = stocks.iloc[np.sort(rng.integers(0, len(stocks), num_tweets))].reset_index(drop=True)
+
+    ranks = np.arange(1, len(VOCABULARY) + 1)
+    word_probabilities = ranks ** -1.1 / (ranks ** -1.1).sum()
+    lengths = rng.poisson(mean_words, num_tweets) + 3
+    words = np.array(VOCABULARY, dtype=object)[
+        rng.choice(len(VOCABULARY), lengths.sum(), p=word_probabilities)]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+
+    cashtags = rng.integers(0, lengths)
+    has_url = rng.random(num_tweets) < 0.3
+    has_mention = rng.random(num_tweets) < 0.2
+    numbers = rng.integers(1, 1000, num_tweets)
+    endings = np.array(['.', '!', '!!!', '?', ' lol', ' ...', ''], dtype=object)[
+        rng.integers(0, 7, num_tweets)]
+    url_ids = rng.integers(0, 36 ** 8, num_tweets)
+
+    tweets, cleaned = [], []
+    for i, ticker in enumerate(rows['Stock Name']):
+        tweet_words = list(words[bounds[i]:bounds[i + 1]])
+        cleaned.append(' '.join(tweet_words))
+        tweet_words[cashtags[i]] = f'${ticker}'
+        if has_mention[i]:
+            tweet_words.insert(0, f'@trader_{numbers[i]}')
+        tweet_words.append(f'{numbers[i]}%')
+        text = ' '.join(tweet_words) + endings[i]
+        text = text[0].upper() + text[1:]
+        if has_url[i]:
+            text += f' https://t.co/{np.base_repr(url_ids[i], 36).lower()}'
+        tweets.append(text)
+
+    return rows.assign(
+        tweets=tweets,
+        sentiment=SENTIMENT_VALUES[rng.choice(3, num_tweets, p=SENTIMENT_SHARES)],
+        tweet_cleaned=cleaned,
+    )[SENTIMENT_COLUMNS]
+
+
+# Write a synthetic frame as CSV in the format of the bundled files (plain YYYY-MM-DD dates)
+def write_csv(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    dates = table.column('Date').cast(pa.date32())
+    table = table.set_column(table.schema.get_field_index('Date'), 'Date', dates)
+    pa_csv.write_csv(table, path)
+    return path
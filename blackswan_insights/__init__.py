@@ -0,0 +1,11 @@
+"""Headless, importable version of the Blackswan-insights notebook.
+
+The stages (ingest, clean, indicators, eda, features, simulate, ...) are
+plain functions in ``blackswan_insights.stages`` and can be run from the
+command line with ``python -m blackswan_insights <stage>``. Heavy libraries
+are imported only by the stages that use them.
+"""
+
+from .stages import STAGES, clean, eda, features, indicators, ingest, simulate
+
+__all__ = ['STAGES', 'clean', 'eda', 'features', 'indicators', 'ingest', 'simulate']
@@ -0,0 +1,165 @@
+"""Run one pipeline stage from the command line.
+
+    python -m blackswan_insights simulate --simulations 10000 --seed 42
+    python -m blackswan_insights simulate --sampling sobol --precision 0.002 --simulations 1000000
+    python -m blackswan_insights indicators --tickers PETR4.SA --output macd.parquet
+    python -m blackswan_insights eda --figures-dir output/figures
+    python -m blackswan_insights features --lags 1 5 --windows 5 20 --output features.parquet
+    python -m blackswan_insights report --figures-dir output/figures --simulations 1000
+    python -m blackswan_insights pipeline --targets eda simulate text_eda
+
+Each stage first runs ingest (and indicators where it needs them). Tables
+are written to --output (.csv or .parquet) or printed. ``pipeline`` runs the
+checkpointed stage graph instead and prints the per-stage timings.
+--metrics writes the wall time, CPU time, rows and memory of every stage and
+instrumented function (see instrumentation.py) as JSON or, for a .prom
+file, in the Prometheus text format.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import instrumentation
+
+from . import stages
+
+
+def _write(table, path):
+    if path is None:
+        print(table.to_string() if len(table) <= 100 else table)
+    elif path.endswith('.parquet'):
+        table.to_parquet(path)
+    else:
+        table.to_csv(path, index=False)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='python -m blackswan_insights',
+                                     description='Run one stage of the Blackswan-insights pipeline.')
+    parser.add_argument('stage', choices=[*stages.STAGES, 'pipeline'])
+    parser.add_argument('--stocks-csv', help='price CSV (default: stocks_prediction.csv)')
+    parser.add_argument('--sentiment-csv', help='tweet CSV (default: stocks_sentiment_prediction.csv)')
+    parser.add_argument('--tickers', nargs='+', help='only these Stock Name values')
+    parser.add_argument('--start', help='first date, inclusive')
+    parser.add_argument('--end', help='last date, inclusive')
+    parser.add_argument('--output', help='write the result table to this .csv or .parquet file')
+
+    parser.add_argument('--spacy-model', default='en_core_web_sm', help='clean: spaCy model')
+    parser.add_argument('--n-process', type=int, default=1, help='clean: spaCy processes')
+    parser.add_argument('--figures-dir',
+                        help=f'eda, report: write charts here (e.g. {stages.DEFAULT_OUTPUT_DIR})')
+
+    parser.add_argument('--lags', type=int, nargs='*', default=[1, 2, 5],
+                        help='features: lags of the daily sentiment, in bars')
+    parser.add_argument('--windows', type=int, nargs='*', default=[5, 20],
+                        help='features: rolling sentiment windows, in bars')
+    parser.add_argument('--max-staleness',
+                        help='features: oldest tweet day used for last_sentiment (e.g. 10D)')
+
+    parser.add_argument('--days', type=int, default=252, help='simulate, report: days per path')
+    parser.add_argument('--simulations', type=int, default=10_000,
+                        help='simulate, report: paths per ticker')
+    parser.add_argument('--seed', type=int, help='simulate, report: random seed')
+    parser.add_argument('--workers', type=int,
+                        help='simulate, report: worker processes (default: all CPUs)')
+    parser.add_argument('--model', default='gaussian', help='simulate: return model')
+    parser.add_argument('--model-params', type=json.loads, help='simulate: model parameters as JSON')
+    parser.add_argument('--sampling', default='random',
+                        help='simulate: shock sampling (random, antithetic, sobol or halton)')
+    parser.add_argument('--precision', type=float,
+                        help='simulate: stop each ticker once its standard errors are this '
+                             'fraction of its statistics (--simulations is then the cap)')
+    parser.add_argument('--no-control-variate', dest='control_variate', action='store_false',
+                        help='simulate: with --precision, skip the analytic-mean control variate')
+
+    parser.add_argument('--targets', nargs='+', help='pipeline: stages to bring up to date')
+    parser.add_argument('--force', nargs='+', default=(), help='pipeline: stages to rerun')
+    parser.add_argument('--checkpoint-dir', help='pipeline: checkpoint directory')
+    parser.add_argument('--track-memory', action='store_true',
+                        help='pipeline: run stages one at a time and report their peak memory')
+    parser.add_argument('--memory-budget', type=float, help='pipeline: per-stage peak budget in MiB')
+    parser.add_argument('--metrics', help='write stage timings and memory to this .json or .prom file')
+    return parser
+
+
+def _run_pipeline(args):
+    from .pipeline import DEFAULT_CHECKPOINT_DIR, build_pipeline
+
+    simulate_params = {'num_steps': args.days, 'num_simulations': args.simulations,
+                       'seed': args.seed, 'n_workers': args.workers, 'model': args.model,
+                       'model_params': args.model_params, 'sampling': args.sampling,
+                       'precision': args.precision, 'control_variate': args.control_variate}
+    pipeline = build_pipeline(args.stocks_csv, args.sentiment_csv, args.figures_dir,
+                              simulate_params, args.spacy_model,
+                              args.checkpoint_dir or DEFAULT_CHECKPOINT_DIR)
+    report = pipeline.run(args.targets, args.force, args.track_memory, args.memory_budget)
+    columns = ['status', 'seconds', 'load_seconds', 'key']
+    if args.track_memory:
+        columns += [column for column in ('traced_peak_mib', 'peak_rss_mib', 'within_budget')
+                    if column in report]
+    print(report[columns].to_string())
+    print(f"Total wall time: {report.attrs['wall_seconds']:.2f} s")
+    if args.track_memory and 'within_budget' in report and not report['within_budget'].fillna(True).all():
+        return 1
+    return 0
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    from memory import enable_copy_on_write
+    enable_copy_on_write()
+
+    # The environment may already have switched instrumentation on, with a profiler
+    if args.metrics and not instrumentation.is_enabled():
+        instrumentation.enable()
+    try:
+        return _run(args)
+    finally:
+        if args.metrics:
+            instrumentation.RECORDER.export(args.metrics)
+
+
+def _run(args):
+    if args.stage == 'pipeline':
+        return _run_pipeline(args)
+
+    needs_sentiment = args.stage in ('clean', 'eda', 'text_eda', 'features')
+    stock_df, sentiment_df = stages.ingest(args.stocks_csv, args.sentiment_csv, args.tickers,
+                                           args.start, args.end, sentiment=needs_sentiment)
+
+    if args.stage == 'ingest':
+        _write(stock_df, args.output)
+    elif args.stage == 'clean':
+        _write(stages.clean(sentiment_df, args.spacy_model, n_process=args.n_process), args.output)
+    elif args.stage == 'indicators':
+        _write(stages.indicators(stock_df), args.output)
+    elif args.stage in ('eda', 'text_eda'):
+        if args.stage == 'eda':
+            results = stages.eda(stock_df, sentiment_df, figures_dir=args.figures_dir)
+        else:
+            results = stages.text_eda(sentiment_df, figures_dir=args.figures_dir)
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+        for name, table in results.items():
+            if args.output:
+                table.to_csv(os.path.join(args.output, f'{name}.csv'))
+            else:
+                print(f'\n== {name} ==')
+                print(table)
+    elif args.stage == 'features':
+        _write(stages.features(stock_df, sentiment_df, args.lags, args.windows, args.max_staleness),
+               args.output)
+    elif args.stage == 'simulate':
+        _write(stages.simulate(stock_df, args.days, args.simulations, args.seed, args.workers,
+                               args.model, args.model_params, args.sampling, args.precision,
+                               args.control_variate), args.output)
+    elif args.stage == 'report':
+        _write(stages.report(stages.indicators(stock_df), args.figures_dir, args.days,
+                             args.simulations, args.seed, n_workers=args.workers), args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
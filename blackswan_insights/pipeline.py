@@ -0,0 +1,325 @@
+"""Dependency-graph scheduler for the pipeline stages, with checkpoints.
+
+A ``Stage`` names a function, the stages whose outputs it receives as
+positional arguments, its keyword parameters and, for stages that read
+files, their paths. A stage's key hashes its name, version, the module,
+qualified name and source code of its function, parameters, the size and
+modification time of its source files and the keys of its inputs, so it
+changes whenever anything upstream changes without running anything. Only
+the stage function's own source is hashed: after changing code it calls,
+bump the stage's ``version``.
+
+Outputs are checkpointed under their key: DataFrames as Parquet, arrays as
+NPZ, dicts of DataFrames as a directory of Parquet files and anything else
+pickled. A stage with a checkpoint for its current key is skipped, and the
+checkpoint is only read when a stage downstream has to run. Stages whose
+inputs are ready run concurrently in a thread pool, so independent branches
+(the price indicators and the text EDA, for example) overlap; their heavy
+work happens in NumPy, pyarrow and spaCy, which release the GIL.
+
+Stages marked ``processes=True`` open process pools of their own. They are
+passed a ``spawn`` multiprocessing context, since forking a process that is
+running other threads can deadlock, and ``n_workers`` (unless set in their
+parameters) from one CPU budget split between the process stages that run.
+"""
+
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from disk_cache import DEFAULT_CACHE_DIR, content_hash
+from memory import MemoryTracker
+
+from . import stages
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(DEFAULT_CACHE_DIR, 'pipeline')
+
+
+class Stage:
+
+    def __init__(self, name, func, inputs=(), params=None, sources=(), version=1, processes=False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = params or {}
+        self.sources = tuple(sources)
+        self.version = version
+        self.processes = processes
+
+
+# Module, qualified name and source of a stage function (source omitted when unavailable)
+def _function_signature(func):
+    func = inspect.unwrap(func)
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = None
+    return func.__module__, func.__qualname__, source
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+# Write value under path (without extension) in the format matching its type
+def save_checkpoint(path, value):
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    if isinstance(value, pd.DataFrame):
+        extension = '.parquet'
+        value.to_parquet(temporary)
+    elif isinstance(value, np.ndarray) or (
+            isinstance(value, dict) and value and all(isinstance(v, np.ndarray) for v in value.values())):
+        extension = '.npz'
+        with open(temporary, 'wb') as f:
+            np.savez(f, **(value if isinstance(value, dict) else {'value': value}))
+    elif isinstance(value, dict) and value and all(isinstance(v, pd.DataFrame) for v in value.values()):
+        extension = '.tables'
+        os.makedirs(temporary)
+        for name, table in value.items():
+            table.to_parquet(os.path.join(temporary, f'{name}.parquet'))
+        with open(os.path.join(temporary, 'order.json'), 'w') as f:
+            json.dump(list(value), f)
+    else:
+        extension = '.pkl'
+        with open(temporary, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    if os.path.isdir(path + extension):
+        # A directory cannot be replaced in one step; drop the old one first
+        shutil.rmtree(path + extension)
+    os.replace(temporary, path + extension)
+    return path + extension
+
+
+# Path of the checkpoint written by save_checkpoint, or None
+def find_checkpoint(path):
+    for extension in ('.parquet', '.npz', '.tables', '.pkl'):
+        if os.path.exists(path + extension):
+            return path + extension
+    return None
+
+
+def load_checkpoint(checkpoint):
+    if checkpoint.endswith('.parquet'):
+        return pd.read_parquet(checkpoint)
+    if checkpoint.endswith('.npz'):
+        with np.load(checkpoint) as arrays:
+            value = {name: arrays[name] for name in arrays.files}
+        return value['value'] if list(value) == ['value'] else value
+    if checkpoint.endswith('.tables'):
+        with open(os.path.join(checkpoint, 'order.json')) as f:
+            names = json.load(f)
+        return {name: pd.read_parquet(os.path.join(checkpoint, f'{name}.parquet')) for name in names}
+    with open(checkpoint, 'rb') as f:
+        return pickle.load(f)
+
+
+class Pipeline:
+
+    def __init__(self, stages, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, max_workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.checkpoint_dir = checkpoint_dir
+        self.max_workers = max_workers
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, visiting, visited = [], set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f'Pipeline stages form a cycle through {name!r}')
+            if name not in self.stages:
+                raise ValueError(f'Unknown pipeline stage: {name!r}')
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # Key of every stage, computed from the graph alone
+    def keys(self):
+        keys = {}
+        for name in self.order:
+            stage = self.stages[name]
+            keys[name] = content_hash(
+                'stage', name, stage.version, _function_signature(stage.func),
+                json.dumps(stage.params, sort_keys=True, default=repr),
+                [_source_signature(path) for path in stage.sources],
+                [keys[dependency] for dependency in stage.inputs])
+        return keys
+
+    def checkpoint_path(self, name, key):
+        return os.path.join(self.checkpoint_dir, name, key[:24])
+
+    # Output of a stage read from its current checkpoint
+    def load(self, name):
+        checkpoint = find_checkpoint(self.checkpoint_path(name, self.keys()[name]))
+        if checkpoint is None:
+            raise KeyError(f'No checkpoint for stage {name!r}; run the pipeline first')
+        return load_checkpoint(checkpoint)
+
+    def _needed(self, targets):
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name].inputs)
+        return needed
+
+    # Run the targets (default: every stage) and whatever they depend on.
+    # Stages with an up-to-date checkpoint are skipped unless named in force.
+    # Returns one row per stage with its status, wall time and checkpoint. With
+    # track_memory the stages run one at a time so that the tracemalloc peak and RSS
+    # added to the report belong to one stage each; memory_budget_mib is checked
+    # against those peaks.
+    def run(self, targets=None, force=(), track_memory=False, memory_budget_mib=None):
+        targets = list(targets or self.order)
+        for name in (*targets, *force):
+            if name not in self.stages:
+                raise ValueError(f'Unknown pipeline stage: {name!r}')
+        needed = self._needed(targets)
+        keys = self.keys()
+        outputs = {}
+        lock = threading.Lock()
+        report = {}
+        tracker = MemoryTracker(memory_budget_mib) if track_memory else None
+
+        def input_value(name):
+            with lock:
+                if name in outputs:
+                    return outputs[name]
+            value = load_checkpoint(report[name]['checkpoint'])
+            with lock:
+                return outputs.setdefault(name, value)
+
+        def execute(name):
+            stage = self.stages[name]
+            start = time.perf_counter()
+            arguments = [input_value(dependency) for dependency in stage.inputs]
+            load_seconds = time.perf_counter() - start
+            params = dict(stage.params)
+            if stage.processes:
+                params['mp_context'] = multiprocessing.get_context('spawn')
+                if params.get('n_workers') is None:
+                    params['n_workers'] = workers_per_stage
+            if tracker is None:
+                value = stage.func(*arguments, **params)
+            else:
+                with tracker.stage(name):
+                    value = stage.func(*arguments, **params)
+            seconds = time.perf_counter() - start - load_seconds
+            path = self.checkpoint_path(name, keys[name])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            checkpoint = save_checkpoint(path, value)
+            self._remove_stale(name, checkpoint)
+            with lock:
+                outputs[name] = value
+            return {'status': 'ran', 'seconds': seconds, 'load_seconds': load_seconds,
+                    'checkpoint': checkpoint}
+
+        done = set()
+        for name in self.order:
+            if name not in needed:
+                continue
+            checkpoint = find_checkpoint(self.checkpoint_path(name, keys[name]))
+            if checkpoint is not None and name not in force:
+                report[name] = {'status': 'skipped', 'seconds': 0.0, 'load_seconds': 0.0,
+                                'checkpoint': checkpoint}
+                done.add(name)
+        # Process stages share the CPUs; run one at a time (track_memory) they get all of them
+        process_stages = sum(self.stages[name].processes for name in needed - done)
+        sharing = 1 if track_memory else max(process_stages, 1)
+        workers_per_stage = max(1, (os.cpu_count() or 1) // sharing)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(1 if track_memory else self.max_workers) as pool:
+            running = {}
+            while len(done) < len(needed):
+                for name in self.order:
+                    if (name in needed and name not in done and name not in running.values()
+                            and all(dependency in done for dependency in self.stages[name].inputs)):
+                        running[pool.submit(execute, name)] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    report[name] = future.result()
+                    done.add(name)
+
+        table = pd.DataFrame.from_dict(report, orient='index').reindex(
+            [name for name in self.order if name in needed])
+        table.index.name = 'stage'
+        table['key'] = [keys[name][:12] for name in table.index]
+        if tracker is not None:
+            memory = tracker.report().drop(columns='seconds')
+            table = table.join(memory)
+            table.attrs['peak_rss_mib'] = memory['peak_rss_mib'].max() if len(memory) else np.nan
+        table.attrs['wall_seconds'] = time.perf_counter() - started
+        return table
+
+    # Older checkpoints of a stage are dropped once a new one is written
+    def _remove_stale(self, name, checkpoint):
+        directory = os.path.join(self.checkpoint_dir, name)
+        for entry in os.listdir(directory):
+            path = os.path.join(directory, entry)
+            if path != checkpoint and not entry.endswith('.tmp'):
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+
+def _stocks(path):
+    from ingest import load_stocks
+
+    return load_stocks(path)
+
+
+def _sentiment(path):
+    from ingest import load_sentiment
+
+    return load_sentiment(path)
+
+
+# The notebook's stages as a graph. The price branch (indicators, EDA, simulation, report)
+# and the text branch (text EDA, cleaning) are independent and run side by side; the
+# sentiment features join the two inputs.
+def build_pipeline(stocks_csv=None, sentiment_csv=None, figures_dir=None, simulate_params=None,
+                   spacy_model='en_core_web_sm', checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
+                   max_workers=None):
+    from ingest import SENTIMENT_CSV, STOCKS_CSV
+
+    stocks_csv = stocks_csv or STOCKS_CSV
+    sentiment_csv = sentiment_csv or SENTIMENT_CSV
+    graph = [
+        Stage('stocks', _stocks, params={'path': stocks_csv}, sources=[stocks_csv]),
+        Stage('sentiment', _sentiment, params={'path': sentiment_csv}, sources=[sentiment_csv]),
+        Stage('indicators', stages.indicators, inputs=['stocks']),
+        Stage('eda', stages.eda, inputs=['indicators'], params={'figures_dir': figures_dir},
+              processes=True),
+        Stage('simulate', stages.simulate, inputs=['stocks'], params=simulate_params or {},
+              processes=True),
+        Stage('report', stages.report, inputs=['indicators'], params={'figures_dir': figures_dir},
+              processes=True),
+        Stage('text_eda', stages.text_eda, inputs=['sentiment'], params={'figures_dir': figures_dir}),
+        Stage('clean', stages.clean, inputs=['sentiment'], params={'spacy_model': spacy_model}),
+        Stage('features', stages.features, inputs=['stocks', 'sentiment']),
+    ]
+    return Pipeline(graph, checkpoint_dir, max_workers)
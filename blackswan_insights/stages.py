@@ -0,0 +1,295 @@
+"""The notebook's pipeline as stage functions.
+
+Every stage takes and returns DataFrames (or a dict of result tables) and
+imports the libraries it needs inside the function, so importing this module
+or running one stage never loads the dependencies of another: ``simulate``
+needs only NumPy and pandas, while spaCy, NLTK, wordcloud, matplotlib and
+statsmodels are loaded by the stages that use them. Charts are rendered
+straight to PNG files, so no display is needed, and nothing depends on Colab
+or Google Drive: data is read from the CSVs next to the code unless other
+paths are given.
+"""
+
+import os
+
+from instrumentation import instrument
+
+DEFAULT_OUTPUT_DIR = 'output'
+
+# Numerical columns checked for outliers and summarised in the EDA
+NUMERICAL_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+# Load the price data and, optionally, the tweets with their sentiment.
+# Returns (stock_df, sentiment_df); sentiment_df is None when sentiment is False.
+@instrument
+def ingest(stocks_csv=None, sentiment_csv=None, tickers=None, start=None, end=None,
+           sentiment=True, parquet_dir=None):
+    import ingest as ingest_module
+
+    options = {'tickers': tickers, 'start': start, 'end': end,
+               'parquet_dir': parquet_dir or ingest_module.DEFAULT_PARQUET_DIR}
+    stock_df = ingest_module.load_stocks(stocks_csv or ingest_module.STOCKS_CSV, **options)
+    sentiment_df = None
+    if sentiment:
+        sentiment_df = ingest_module.load_sentiment(sentiment_csv or ingest_module.SENTIMENT_CSV,
+                                                    **options)
+    return stock_df, sentiment_df
+
+
+# Add a 'tweets_cleaned' column of cleaned, lemmatized tweets (spaCy, with the lemma cache)
+@instrument
+def clean(sentiment_df, spacy_model='en_core_web_sm', batch_size=1000, n_process=1,
+          use_cache=True):
+    import spacy
+
+    from lemma_cache import LemmaCache, cache_namespace
+    from text_cleaning import DISABLED_PIPES, clean_texts
+
+    nlp = spacy.load(spacy_model, disable=list(DISABLED_PIPES))
+    if use_cache:
+        with LemmaCache(cache_namespace(nlp)) as cache:
+            cleaned = clean_texts(sentiment_df['tweets'], nlp, batch_size, n_process, cache=cache)
+    else:
+        cleaned = clean_texts(sentiment_df['tweets'], nlp, batch_size, n_process)
+    return sentiment_df.assign(tweets_cleaned=cleaned)
+
+
+# Per-ticker technical indicators as new float32 columns. The result is a shallow copy:
+# it shares the price columns with stock_df, which is left unchanged.
+@instrument
+def indicators(stock_df, names=('macd', 'bollinger'), params=None):
+    import numpy as np
+
+    from indicators import add_indicators
+
+    return add_indicators(stock_df.copy(deep=False), indicators=names, params=params,
+                          dtype=np.float32)
+
+
+def _ensure_punkt():
+    import nltk
+
+    for resource in ('tokenizers/punkt_tab', 'tokenizers/punkt'):
+        try:
+            nltk.data.find(resource)
+            return
+        except LookupError:
+            pass
+    nltk.download('punkt_tab', quiet=True)
+
+
+# Exploratory tables of the prices: outlier counts, indicator and correlation summaries
+# and, per ticker, ADF tests and the monthly decomposition of the close prices (see
+# stationarity.analyze_stationarity). With sentiment_df the text_eda tables are added.
+# With figures_dir the notebook's main charts are written there as PNG files. n_workers
+# and mp_context set the processes of the stationarity analysis.
+@instrument
+def eda(stock_df, sentiment_df=None, figures_dir=None, top_words=15, n_workers=None,
+        mp_context=None):
+    import pandas as pd
+
+    from outliers import analyze_outliers
+    from stationarity import analyze_stationarity
+
+    columns = [column for column in NUMERICAL_COLUMNS if column in stock_df]
+    if 'MACD' not in stock_df:
+        stock_df = indicators(stock_df)
+
+    results = {
+        'outlier_counts': analyze_outliers(stock_df, columns).counts(),
+        'indicator_summary': pd.DataFrame({'value': {
+            'Upper Bollinger Band Max': stock_df['Upper Bollinger Band'].max(),
+            'Lower Bollinger Band Min': stock_df['Lower Bollinger Band'].min(),
+            'Middle Bollinger Band Mean': stock_df['Middle Bollinger Band'].mean(),
+            'MACD Max': stock_df['MACD'].max(),
+            'MACD Min': stock_df['MACD'].min(),
+            'MACD Signal Mean': stock_df['MACD Signal'].mean(),
+        }}),
+        'correlation': stock_df.corr(numeric_only=True),
+        'stationarity': analyze_stationarity(stock_df, n_workers=n_workers, mp_context=mp_context),
+    }
+    if figures_dir:
+        _price_figures(stock_df, results, figures_dir)
+    if sentiment_df is not None:
+        results.update(text_eda(sentiment_df, figures_dir, top_words))
+    return results
+
+
+# Token counts of the raw tweets and the most common tokens; with figures_dir the word
+# cloud and the top-words bar chart are written there
+@instrument
+def text_eda(sentiment_df, figures_dir=None, top_words=15):
+    import pandas as pd
+
+    from token_stats import count_tokens
+
+    _ensure_punkt()
+    token_counts = count_tokens(sentiment_df['tweets'])
+    results = {
+        'top_words': pd.DataFrame(token_counts.most_common(top_words), columns=['word', 'count']),
+    }
+    if figures_dir:
+        _text_figures(token_counts, results, figures_dir)
+    return results
+
+
+# Figures are built with the object-oriented API rather than pyplot (see plotting.py), so
+# stages drawing charts can run in parallel threads without sharing a current figure
+def _price_figures(stock_df, results, figures_dir):
+    import numpy as np
+
+    from plotting import draw_heatmap, draw_histogram, render_figures
+
+    counts, edges = np.histogram(stock_df['Close'].to_numpy(dtype=float), bins=30)
+    correlation = results['correlation']
+    render_figures({
+        'close_histogram': (draw_histogram, {'counts': counts, 'edges': edges,
+                                             'title': 'Histogram of Close Prices',
+                                             'xlabel': 'Close Price'}),
+        'correlation': (draw_heatmap, {'matrix': correlation.to_numpy(),
+                                       'labels': list(correlation.columns),
+                                       'title': 'Correlation Matrix Heatmap'}),
+    }, figures_dir, n_workers=1)
+
+
+def _text_figures(token_counts, results, figures_dir):
+    from matplotlib.figure import Figure
+    from wordcloud import WordCloud
+
+    from token_stats import wordcloud_frequencies
+
+    os.makedirs(figures_dir, exist_ok=True)
+    wordcloud = WordCloud(width=800, height=400, max_words=100, background_color='white') \
+        .generate_from_frequencies(wordcloud_frequencies(token_counts))
+    wordcloud.to_file(os.path.join(figures_dir, 'tweets_wordcloud.png'))
+
+    top_words = results['top_words']
+    figure = Figure(figsize=(10, 6))
+    ax = figure.subplots()
+    ax.bar(top_words['word'], top_words['count'], color='blue')
+    ax.set_title(f'Most Common {len(top_words)} Words')
+    ax.tick_params(axis='x', labelrotation=45)
+    figure.tight_layout()
+    figure.savefig(os.path.join(figures_dir, 'top_words.png'))
+
+
+# The price bars with the tweet sentiment aligned to them and lagged and rolling sentiment
+# features per ticker, sorted by (ticker, date) (see sentiment_features)
+@instrument
+def features(stock_df, sentiment_df, lags=(1, 2, 5), windows=(5, 20), max_staleness=None):
+    from sentiment_features import sentiment_features
+
+    return sentiment_features(stock_df, sentiment_df, tuple(lags), tuple(windows), max_staleness)
+
+
+# Per-ticker Monte Carlo simulation of the final prices (see ticker_simulations).
+# sampling picks the shock sampling scheme ('random', 'antithetic', 'sobol', 'halton');
+# with precision each ticker stops once its standard errors are that fraction of its
+# statistics, and num_simulations is the most paths it may use.
+@instrument
+def simulate(stock_df, num_steps=252, num_simulations=10_000, seed=None, n_workers=None,
+             model='gaussian', model_params=None, sampling='random', precision=None,
+             control_variate=True, mp_context=None):
+    from ticker_simulations import simulate_universe
+
+    return simulate_universe(stock_df, num_steps=num_steps, num_simulations=num_simulations,
+                             seed=seed, n_workers=n_workers, model=model, model_params=model_params,
+                             sampling=sampling, precision=precision,
+                             control_variate=control_variate, mp_context=mp_context)
+
+
+# The price charts rendered off-screen to figures_dir by a process pool (see plotting.py):
+# the close price and its first difference per ticker, downsampled; Open vs Close thinned
+# to one point per pixel cell; the close histogram; the correlation heatmap; and a
+# Monte Carlo fan of per-day percentile bands for every ticker. Returns one row per
+# figure with its file and the number of points drawn out of the points given.
+@instrument
+def report(stock_df, figures_dir=None, num_steps=252, num_simulations=1000, seed=None,
+           max_points=None, n_workers=None, mp_context=None):
+    import numpy as np
+    import pandas as pd
+
+    from monte_carlo import run_monte_carlo_streaming
+    from plotting import (DEFAULT_MAX_POINTS, FAN_PERCENTILES, downsample, draw_fan,
+                          draw_heatmap, draw_histogram, draw_lines, draw_scatter, render_figures,
+                          thin_scatter_indices)
+    from ticker_simulations import ticker_return_parameters
+
+    figures_dir = figures_dir or os.path.join(DEFAULT_OUTPUT_DIR, 'figures')
+    max_points = max_points or DEFAULT_MAX_POINTS
+    ordered = stock_df.sort_values(['Stock Name', 'Date'], kind='stable')
+    tickers = ordered.groupby('Stock Name', observed=True, sort=True)
+    charts, points = {}, {}
+
+    closes, differences = {}, {}
+    for ticker, group in tickers:
+        dates, close = group['Date'].to_numpy(), group['Close'].to_numpy(dtype=float)
+        closes[ticker] = downsample(dates, close, max_points, 'lttb')
+        # Differences are spiky; min/max decimation keeps every extreme
+        differences[ticker] = downsample(dates[1:], np.diff(close), max_points, 'minmax')
+    charts['close_prices'] = (draw_lines, {'lines': closes, 'title': 'Close Price by Stock',
+                                           'xlabel': 'Date', 'ylabel': 'Close Price'}, (12, 6))
+    charts['close_first_difference'] = (draw_lines, {
+        'lines': differences, 'title': 'First Difference of Close Price', 'xlabel': 'Date',
+        'ylabel': 'Difference'}, (12, 6))
+    points['close_prices'] = sum(len(x) for x, _ in closes.values())
+    points['close_first_difference'] = sum(len(x) for x, _ in differences.values())
+
+    open_prices, close_prices = ordered['Open'].to_numpy(), ordered['Close'].to_numpy()
+    names = ordered['Stock Name'].to_numpy()
+    keep = thin_scatter_indices(open_prices, close_prices, names)
+    charts['open_close_scatter'] = (draw_scatter, {
+        'groups': {ticker: (open_prices[keep][names[keep] == ticker],
+                            close_prices[keep][names[keep] == ticker])
+                   for ticker in tickers.groups},
+        'title': 'Scatter Plot of Open vs. Close', 'xlabel': 'Open Price', 'ylabel': 'Close Price'})
+    points['open_close_scatter'] = len(keep)
+
+    counts, edges = np.histogram(close_prices.astype(float), bins=30)
+    charts['close_histogram'] = (draw_histogram, {'counts': counts, 'edges': edges,
+                                                  'title': 'Histogram of Close Prices',
+                                                  'xlabel': 'Close Price'})
+    points['close_histogram'] = len(counts)
+    correlation = stock_df.corr(numeric_only=True)
+    charts['correlation'] = (draw_heatmap, {'matrix': correlation.to_numpy(),
+                                            'labels': list(correlation.columns),
+                                            'title': 'Correlation Matrix Heatmap'})
+    points['correlation'] = correlation.size
+
+    params = ticker_return_parameters(stock_df)
+    params = params[params['num_observations'] > 1]
+    for (ticker, row), ticker_seed in zip(params.iterrows(),
+                                          np.random.SeedSequence(seed).spawn(len(params))):
+        _, accumulator = run_monte_carlo_streaming(
+            row['initial_price'], row['mean_return'], row['std_return'], num_steps,
+            num_simulations, seed=ticker_seed, fan_chart=True, max_stored_paths=0)
+        name = f'monte_carlo_{ticker}'
+        charts[name] = (draw_fan, {'bands': accumulator.fan_bands(FAN_PERCENTILES),
+                                   'title': f'Monte Carlo Simulation for {ticker} '
+                                            f'({num_simulations} paths)'})
+        points[name] = len(FAN_PERCENTILES) * (num_steps + 1)
+
+    source_points = {'close_prices': len(ordered), 'close_first_difference': len(ordered) - len(closes),
+                     'open_close_scatter': len(ordered), 'close_histogram': len(ordered),
+                     'correlation': correlation.size}
+    paths = render_figures(charts, figures_dir, n_workers, mp_context=mp_context)
+    return pd.DataFrame({
+        'figure': list(paths),
+        'path': list(paths.values()),
+        'points': [points[name] for name in paths],
+        'source_points': [source_points.get(name, num_simulations * (num_steps + 1))
+                          for name in paths],
+    })
+
+
+STAGES = {
+    'ingest': ingest,
+    'clean': clean,
+    'indicators': indicators,
+    'eda': eda,
+    'features': features,
+    'text_eda': text_eda,
+    'simulate': simulate,
+    'report': report,
+}
@@ -0,0 +1,3 @@
+# Repository root conftest: its presence puts the root on sys.path under pytest's default
+# import mode, so the top-level modules import the same way with `pytest` as with
+# `python -m pytest`.
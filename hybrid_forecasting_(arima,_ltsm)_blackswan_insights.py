@@ -7,8 +7,14 @@ Original file is located at
     https://colab.research.google.com/drive/1YjH2b1lfjg-7RFGzulbcGQOeQlAYu2AG
 """
 
-from google.colab import drive
-drive.mount('/content/drive')
+try:
+    from google.colab import drive
+    drive.mount('/content/drive')
+    IN_COLAB = True
+except ImportError:
+    # Outside Colab the CSVs next to the code are used (see blackswan_insights for
+    # the headless pipeline)
+    IN_COLAB = False
 
 """# Import necessary packages
 
@@ -20,12 +26,30 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-import re
 import nltk
 import spacy
 from wordcloud import WordCloud
 
-from scipy.stats import zscore, iqr
+from ingest import DATA_DIR as LOCAL_DATA_DIR, load_sentiment, load_stocks
+from indicators import add_indicators
+from outliers import analyze_outliers
+from arima import fit_arima_universe, load_arima_model
+from lstm import WindowedDataset, arima_residuals, residual_features, train_lstm
+from backtest import summarize_backtest, walk_forward_backtest
+from monte_carlo import (calibrate_jump_diffusion, run_monte_carlo, run_monte_carlo_adaptive,
+                         run_monte_carlo_streaming)
+from ticker_simulations import simulate_universe
+from sentiment_regimes import fit_sentiment_regimes
+from text_cleaning import clean_texts
+from lemma_cache import LemmaCache, cache_namespace
+from token_stats import count_tokens, wordcloud_frequencies
+from memory import enable_copy_on_write
+from plotting import downsample, draw_fan, draw_lines, path_bands, thin_scatter_indices
+from instrumentation import RECORDER, is_enabled as instrumentation_enabled
+
+# Column selections and shallow copies share memory until written (see memory.py),
+# so the frames below are not copied defensively
+enable_copy_on_write()
 
 # Tokenize using NLTK
 nltk.download('punkt')
@@ -40,9 +64,13 @@ warnings.simplefilter('ignore')
 """# Read Dataset
 
 ## Read csv from colab console
+
+The CSVs are loaded with an explicit schema and converted to a partitioned Parquet dataset on first use (see ingest.py); later runs read the Parquet copy.
 """
 
-stock_df = pd.read_csv("/content/drive/MyDrive/LJMU/Gaurav/stocks_prediction.csv")
+DATA_DIR = "/content/drive/MyDrive/LJMU/Gaurav" if IN_COLAB else LOCAL_DATA_DIR
+
+stock_df = load_stocks(f"{DATA_DIR}/stocks_prediction.csv")
 print(f'Shape of dataframe: {stock_df.shape}')
 stock_df.head()
 
@@ -66,50 +94,35 @@ stock_df.isnull().sum()
 duplicates = stock_df.duplicated()
 duplicates.sum()
 
-stock_df_orig = stock_df.copy()
+stock_df_orig = stock_df
 
 """### Check for outliers"""
 
 # Columns containing numerical data for outlier analysis
 numerical_columns = ['Open', 'High', 'Low', 'Close', 'Volume']
 
-# Function to detect outliers using z-score method
-def detect_outliers_zscore(data, threshold=3):
-    z_scores = np.abs(zscore(data))
-    return z_scores > threshold
-
-# Function to detect outliers using IQR method
-def detect_outliers_iqr(data, factor=1.5):
-    Q1 = data.quantile(0.25)
-    Q3 = data.quantile(0.75)
-    IQR = Q3 - Q1
-    lower_bound = Q1 - factor * IQR
-    upper_bound = Q3 + factor * IQR
-    return (data < lower_bound) | (data > upper_bound)
-
-# Loop through numerical columns and add outlier flags to the dataset
-for col in numerical_columns:
-    stock_df[f'{col}_outlier_zscore'] = detect_outliers_zscore(stock_df[col])
-    stock_df[f'{col}_outlier_iqr'] = detect_outliers_iqr(stock_df[col])
-
-stock_df.sample(5)
+# Detect outliers with the z-score and IQR methods for all columns in one pass
+# (see outliers.py); the flags and bounds are reused below without adding
+# flag columns to the dataset
+outliers = analyze_outliers(stock_df, numerical_columns, z_threshold=3, iqr_factor=1.5)
 
 # Determine if there are outliers in the entire DataFrame using both methods
-has_outliers_zscore = any(detect_outliers_zscore(stock_df[col]).any() for col in numerical_columns)
-has_outliers_iqr = any(detect_outliers_iqr(stock_df[col]).any() for col in numerical_columns)
+has_outliers_zscore = outliers.has_outliers('zscore')
+has_outliers_iqr = outliers.has_outliers('iqr')
 
 print("Outliers detected using z-score:", has_outliers_zscore)
 print("Outliers detected using IQR:", has_outliers_iqr)
+print(outliers.counts())
 
 # Create a figure and axis for the box plot
 plt.figure(figsize=(12, 6))
 ax = plt.gca()
 
 # Loop through numerical columns and plot box plots
-for col in numerical_columns:
-    outliers_iqr = detect_outliers_iqr(stock_df[col])
-    ax.boxplot(stock_df[col], vert=False, positions=[numerical_columns.index(col)], showfliers=False)
-    ax.plot(stock_df[col][outliers_iqr], [numerical_columns.index(col)] * sum(outliers_iqr), 'ro', alpha=0.5)
+for position, col in enumerate(numerical_columns):
+    outliers_iqr = outliers.flags('iqr', col)
+    ax.boxplot(stock_df[col], vert=False, positions=[position], showfliers=False)
+    ax.plot(stock_df[col][outliers_iqr], [position] * outliers_iqr.sum(), 'ro', alpha=0.5)
 
 
 # Set labels, title, and layout
@@ -124,29 +137,13 @@ plt.show()
 
 """### Statistical Summary"""
 
-data = stock_df_orig.copy()
+# Shallow copy: the indicator columns are added to data only
+data = stock_df_orig.copy(deep=False)
 
-# Calculate MACD (Moving Average Convergence Divergence)
-def calculate_macd(data, short_window=12, long_window=26, signal_window=9):
-    close_prices = data['Close'].values
-    short_ema = pd.Series(close_prices).ewm(span=short_window, min_periods=1, adjust=False).mean()
-    long_ema = pd.Series(close_prices).ewm(span=long_window, min_periods=1, adjust=False).mean()
-    macd = short_ema - long_ema
-    signal = macd.ewm(span=signal_window, min_periods=1, adjust=False).mean()
-    return macd, signal
-
-data['MACD'], data['MACD Signal'] = calculate_macd(data)
-
-# Calculate Bollinger Bands
-def calculate_bollinger_bands(data, window=20):
-    close_prices = data['Close'].values
-    rolling_mean = pd.Series(close_prices).rolling(window=window, min_periods=1).mean()
-    rolling_std = pd.Series(close_prices).rolling(window=window, min_periods=1).std()
-    upper_band = rolling_mean + 2 * rolling_std
-    lower_band = rolling_mean - 2 * rolling_std
-    return upper_band, rolling_mean, lower_band
-
-data['Upper Bollinger Band'], data['Middle Bollinger Band'], data['Lower Bollinger Band'] = calculate_bollinger_bands(data)
+# Calculate MACD (Moving Average Convergence Divergence) and Bollinger Bands
+# separately for every stock, so the EMAs and rolling windows do not run across
+# tickers (see indicators.py)
+add_indicators(data, indicators=('macd', 'bollinger'))
 
 # Print the modified dataset
 print(data.shape)
@@ -201,7 +198,7 @@ The MACD values indicate periods of both bullish and bearish momentum, with rela
 #### Visualisation
 """
 
-data = stock_df_orig.copy()
+data = stock_df_orig
 
 # Set the style for the plots (optional)
 sns.set(style="whitegrid")
@@ -214,9 +211,11 @@ plt.xlabel('Close Price')
 plt.ylabel('Frequency')
 plt.show()
 
-# Creating a scatter plot of 'Open' vs. 'Close'
+# Creating a scatter plot of 'Open' vs. 'Close', keeping one point per pixel cell and
+# stock (see plotting.py) instead of drawing all rows
 plt.figure(figsize=(10, 6))
-sns.scatterplot(data=data, x='Open', y='Close', hue='Stock Name')
+scatter_points = data.iloc[thin_scatter_indices(data['Open'], data['Close'], data['Stock Name'])]
+sns.scatterplot(data=scatter_points, x='Open', y='Close', hue='Stock Name', s=8)
 plt.title('Scatter Plot of Open vs. Close')
 plt.xlabel('Open Price')
 plt.ylabel('Close Price')
@@ -233,7 +232,7 @@ plt.xticks(rotation=45)
 plt.show()
 
 # Creating a correlation matrix heatmap
-correlation_matrix = data.corr()
+correlation_matrix = data.corr(numeric_only=True)
 plt.figure(figsize=(10, 6))
 sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0)
 plt.title('Correlation Matrix Heatmap')
@@ -241,46 +240,37 @@ plt.show()
 
 """#### Analyze the stationarity, trends, and seasonality in data"""
 
-from statsmodels.tsa.seasonal import seasonal_decompose
-from statsmodels.tsa.stattools import adfuller
-
-# load data into the 'df' DataFrame
-df = stock_df_orig.copy()
+from stationarity import analyze_stationarity, load_decomposition
 
-# Make sure 'Date' column is in datetime format and set it as index
-df['Date'] = pd.to_datetime(df['Date'])
-df.set_index('Date', inplace=True)
+# Per-stock close series in date order ('Date' is already parsed as datetime by ingest.py).
+# Every line below is reduced per stock to the points the figure can show (see plotting.py):
+# LTTB for prices and moving averages, min/max decimation for the spiky differences.
+ordered_stocks = stock_df_orig.sort_values(['Stock Name', 'Date'], kind='stable')
+close_by_stock = {ticker: group.set_index('Date')['Close']
+                  for ticker, group in ordered_stocks.groupby('Stock Name', observed=True, sort=True)}
 
-# Select the 'Close' column for analysis
-close_series = df['Close']
-
-# Function to perform Augmented Dickey-Fuller test for stationarity
-def adf_test(timeseries):
-    result = adfuller(timeseries, autolag='AIC')
-    print('ADF Statistic:', result[0])
-    print('p-value:', result[1])
-    print('Critical Values:', result[4])
-
-# Plot the original time series
+# Plot the original time series of every stock
 plt.figure(figsize=(12, 6))
-plt.plot(close_series, label='Original')
-plt.title('Original Time Series')
-plt.xlabel('Date')
-plt.ylabel('Close Price')
-plt.legend()
+draw_lines(plt.gca(), {ticker: downsample(close.index, close.to_numpy())
+                       for ticker, close in close_by_stock.items()},
+           title='Original Time Series', xlabel='Date', ylabel='Close Price')
 plt.xticks(rotation=45)
-plt.grid(True)
 plt.show()
 
-# Perform Augmented Dickey-Fuller test for stationarity
-print('Results of Augmented Dickey-Fuller Test:')
-adf_test(close_series)
+# Augmented Dickey-Fuller tests of the levels and the first difference and the monthly
+# decomposition, run separately for every stock across a process pool and cached by
+# series (see stationarity.py), rather than on one series mixing all stocks
+stationarity_df = analyze_stationarity(stock_df_orig)
+stationarity_df[['Stock Name', 'level_adf_statistic', 'level_p_value', 'diff_adf_statistic',
+                 'diff_p_value', 'level_stationary', 'diff_stationary']]
 
-# Calculate moving average and plot
-rolling_mean = close_series.rolling(window=12).mean()
+# Calculate moving average per stock and plot
 plt.figure(figsize=(12, 6))
-plt.plot(close_series, label='Original')
-plt.plot(rolling_mean, label='Rolling Mean')
+for ticker, close in close_by_stock.items():
+    rolling_mean = close.rolling(window=12).mean()
+    plt.plot(*downsample(close.index, close.to_numpy()), linewidth=1, label=ticker)
+    plt.plot(*downsample(rolling_mean.index, rolling_mean.to_numpy()), linewidth=1,
+             linestyle='--', label=f'{ticker} rolling mean')
 plt.title('Original Time Series with Moving Average')
 plt.xlabel('Date')
 plt.ylabel('Price')
@@ -289,30 +279,23 @@ plt.xticks(rotation=45)
 plt.grid(True)
 plt.show()
 
-# Calculate first difference and plot
-diff_1 = close_series.diff(1)
+# Calculate first difference per stock and plot
 plt.figure(figsize=(12, 6))
-plt.plot(diff_1, label='First Difference')
-plt.title('First Difference of Time Series')
-plt.xlabel('Date')
-plt.ylabel('Difference')
-plt.legend()
+draw_lines(plt.gca(), {ticker: downsample(close.index, close.diff(1).to_numpy(), method='minmax')
+                       for ticker, close in close_by_stock.items()},
+           title='First Difference of Time Series', xlabel='Date', ylabel='Difference')
 plt.xticks(rotation=45)
-plt.grid(True)
 plt.show()
 
-# Perform Augmented Dickey-Fuller test for differenced series
-print('Results of Augmented Dickey-Fuller Test for First Difference:')
-adf_test(diff_1.dropna())
-
-# Resample the data to monthly frequency
-resampled_df = df.resample('M').mean()
-
-# Select the 'Close' column for analysis
-close_series = resampled_df['Close']
+# Strength of the trend and seasonality of every stock's monthly close
+stationarity_df[['Stock Name', 'num_months', 'trend_strength', 'seasonal_strength',
+                 'seasonal_amplitude', 'seasonal_peak_month']]
 
-# Time series decomposition
-result = seasonal_decompose(close_series, model='additive')
+# Time series decomposition of the monthly mean close of one stock
+decomposed_stock = 'PETR4.SA'
+result = load_decomposition(
+    stationarity_df.loc[stationarity_df['Stock Name'] == decomposed_stock, 'result_key'].iloc[0])
+close_series = result['observed']
 plt.figure(figsize=(12, 12))
 plt.subplot(4, 1, 1)
 plt.plot(close_series, label='Original')
@@ -351,21 +334,29 @@ plt.show()
 
 """### Feature Selection (Correlation)"""
 
-stock_selected_features_df = stock_df_orig[['Date','Close','Volume','Stock Name']].copy()
+stock_selected_features_df = stock_df_orig[['Date','Close','Volume','Stock Name']]
+
+"""### ARIMA models per stock
+
+The differencing order comes from the ADF test and (p, q) from a stepwise AIC search, fitted for every stock in parallel (see arima.py). Fitted models are cached on disk, so unchanged stocks are not refitted on the next run.
+"""
+
+arima_results = fit_arima_universe(stock_selected_features_df, price_column='Close')
+arima_results
 
 """## Integrated sentiment texts for stocks dataframe"""
 
-stocks_sentiment_df = pd.read_csv("/content/drive/MyDrive/LJMU/Gaurav/stocks_sentiment_prediction.csv")
+stocks_sentiment_df = load_sentiment(f"{DATA_DIR}/stocks_sentiment_prediction.csv")
 print(f'Shape of dataframe: {stocks_sentiment_df.shape}')
 stocks_sentiment_df.head()
 
-# Combine the texts from 'tweets' and 'tweet_cleaned' columns
-combined_tweets_text = ' '.join(stocks_sentiment_df['tweets'])
+# Tokenize the 'tweets' column once; the counts are reused for every word cloud and chart
+tweet_token_counts = count_tokens(stocks_sentiment_df['tweets'])
 
 # Create a WordCloud object
 wordcloud = WordCloud(width=800, height=800,
                       background_color='white',
-                      min_font_size=10).generate(combined_tweets_text)
+                      min_font_size=10).generate_from_frequencies(wordcloud_frequencies(tweet_token_counts))
 
 # Display the WordCloud using matplotlib
 plt.figure(figsize=(8, 8), facecolor=None)
@@ -378,21 +369,14 @@ plt.tight_layout(pad=0)
 
 plt.show()
 
-# Function to clean text using NLTK and SpaCy
-def clean_text(text):
-    # Remove URLs, special characters, and extra spaces
-    cleaned_text = re.sub(r'http\S+', '', text)
-    cleaned_text = re.sub(r'[^a-zA-Z\s]', '', cleaned_text)
-    cleaned_text = ' '.join(cleaned_text.split())
-
-    words = nltk.word_tokenize(cleaned_text)
-
-    lemmatized_words = [token.lemma_ for token in spacy_nlp(' '.join(words))]
-
-    return ' '.join(lemmatized_words)
-
-# Clean the 'tweets' column
-stocks_sentiment_df['tweets_cleaned'] = stocks_sentiment_df['tweets'].apply(clean_text)
+# Clean the 'tweets' column: strip URLs and special characters, then lemmatize
+# with SpaCy in batches (see text_cleaning.py). Tweets cleaned on a previous run
+# with the same model and rules are read back from the on-disk cache.
+with LemmaCache(cache_namespace(spacy_nlp)) as lemma_cache:
+    stocks_sentiment_df['tweets_cleaned'] = clean_texts(stocks_sentiment_df['tweets'], spacy_nlp,
+                                                        batch_size=1000, n_process=1,
+                                                        cache=lemma_cache)
+    print(lemma_cache.stats())
 
 """### EDA on text data
 
@@ -400,14 +384,8 @@ stocks_sentiment_df['tweets_cleaned'] = stocks_sentiment_df['tweets'].apply(clea
 Tokenization involves splitting text into individual words or tokens. Count the frequency of each token to understand the most common words in your text data.
 """
 
-from nltk.tokenize import word_tokenize
-from collections import Counter
-
-# Tokenize the text
-tokens = [word for tweet in stocks_sentiment_df['tweets'] for word in word_tokenize(tweet)]
-
-# Count the frequency of tokens
-token_counts = Counter(tokens)
+# Token frequencies of the raw tweets, counted once above
+token_counts = tweet_token_counts
 
 # Print the most common words
 print(token_counts.most_common(15))
@@ -440,11 +418,9 @@ plt.xticks(rotation=45, ha='right')
 plt.tight_layout()
 plt.show()
 
-# Tokenize the text
-tokens = [word for tweet in stocks_sentiment_df['tweets_cleaned'] for word in word_tokenize(tweet)]
-
-# Count the frequency of tokens
-token_counts = Counter(tokens)
+# Tokenize the cleaned text once and count the frequency of tokens
+cleaned_token_counts = count_tokens(stocks_sentiment_df['tweets_cleaned'])
+token_counts = cleaned_token_counts
 
 wordcloud = WordCloud(width=800, height=400, max_words=100, background_color='white').generate_from_frequencies(token_counts)
 
@@ -470,13 +446,10 @@ plt.xticks(rotation=45, ha='right')
 plt.tight_layout()
 plt.show()
 
-# Combine the cleaned texts
-combined_cleaned_text = ' '.join(stocks_sentiment_df['tweets_cleaned'])
-
-# Create a WordCloud object
+# Create a WordCloud object from the cleaned token counts
 wordcloud = WordCloud(width=800, height=800,
                       background_color='white',
-                      min_font_size=10).generate(combined_cleaned_text)
+                      min_font_size=10).generate_from_frequencies(wordcloud_frequencies(cleaned_token_counts))
 
 # Display the WordCloud using matplotlib
 plt.figure(figsize=(8, 8), facecolor=None)
@@ -505,9 +478,30 @@ plt.ylabel('Frequency')
 plt.title('Distribution of Text Length')
 plt.show()
 
-stocks_sentiment_features_df = stocks_sentiment_df[['Date','Close','Volume','Stock Name','tweets_cleaned','sentiment']].copy()
+stocks_sentiment_features_df = stocks_sentiment_df[['Date','Close','Volume','Stock Name','tweets_cleaned','sentiment']]
 stocks_sentiment_features_df.head()
 
+"""### LSTM on ARIMA residuals
+
+The LSTM half of the hybrid learns what the per-stock ARIMA models miss: it sees a 30-day window of ARIMA residuals, the sentiment of the tweets since the previous bar and its 20-day rolling mean and tweet count, and predicts the next residual (see lstm.py and sentiment_features.py).
+"""
+
+residual_df = arima_residuals(stock_selected_features_df, arima_results, load_arima_model)
+lstm_features = residual_features(residual_df, stocks_sentiment_features_df, windows=(20,))
+lstm_dataset = WindowedDataset(lstm_features, window=30,
+                               feature_columns=('residual', 'sentiment', 'sentiment_mean_20',
+                                                'tweet_count_sum_20'))
+lstm_model, lstm_history = train_lstm(lstm_dataset, epochs=5, batch_size=256, seed=42)
+print("Training loss per epoch:", lstm_history)
+
+"""### Walk-forward backtest
+
+Rolls the forecast origin forward a month at a time, extending the ARIMA models and fine-tuning the LSTM with each new month instead of refitting from scratch (see backtest.py).
+"""
+
+backtest_results = walk_forward_backtest(stock_selected_features_df, stocks_sentiment_features_df)
+summarize_backtest(backtest_results)
+
 """## Question: •	How could Monte Carlo simulations assist in developing more accurate and robust hybrid models?"""
 
 # Extract relevant data
@@ -524,29 +518,18 @@ std_dev_return = stock_data['Returns'].std()
 num_simulations = 1000
 num_days = 252  # Number of trading days in a year
 
-# Initialize arrays to store simulation results
-simulated_prices = np.zeros((num_days, num_simulations))
-final_returns = np.zeros(num_simulations)
-
-# Perform Monte Carlo simulations
-for i in range(num_simulations):
-    daily_returns = np.random.normal(mean_return, std_dev_return, num_days)
-    price_series = np.zeros(num_days)
-    price_series[0] = stock_data['Close'].iloc[-1]  # Starting price
+# Perform Monte Carlo simulations (vectorised, see monte_carlo.py)
+# The path starts at the latest close, so num_days prices span num_days - 1 steps
+summary, paths = run_monte_carlo(stock_data['Close'].iloc[-1], mean_return, std_dev_return,
+                                 num_steps=num_days - 1, num_simulations=num_simulations,
+                                 seed=42, keep_paths=True)
 
-    for day in range(1, num_days):
-        price_series[day] = price_series[day - 1] * (1 + daily_returns[day])
+# Quantiles for simulation results
+quantiles = summary['quantiles']
 
-    simulated_prices[:, i] = price_series
-    final_returns[i] = (price_series[-1] - price_series[0]) / price_series[0]
-
-# Calculate quantiles for simulation results
-quantiles = np.percentile(simulated_prices[-1, :], [2.5, 50, 97.5])
-
-# Plot simulation results
+# Plot simulation results as per-day percentile bands rather than one line per path
 plt.figure(figsize=(10, 6))
-plt.plot(simulated_prices, color='gray', alpha=0.2)
-plt.plot(simulated_prices[:, -1], color='blue', label='Simulated Price Path')
+draw_fan(plt.gca(), path_bands(paths))
 plt.axhline(y=quantiles[0], color='red', linestyle='--', label='2.5th Percentile')
 plt.axhline(y=quantiles[1], color='green', linestyle='--', label='Median (50th Percentile)')
 plt.axhline(y=quantiles[2], color='orange', linestyle='--', label='97.5th Percentile')
@@ -561,8 +544,45 @@ print("Simulated Price Statistics:")
 print("2.5th Percentile: ${:.2f}".format(quantiles[0]))
 print("Median (50th Percentile): ${:.2f}".format(quantiles[1]))
 print("97.5th Percentile: ${:.2f}".format(quantiles[2]))
-print("\nMean Final Return: {:.2%}".format(final_returns.mean()))
-print("Standard Deviation of Final Returns: {:.2%}".format(final_returns.std()))
+print("\nMean Final Return: {:.2%}".format(summary['mean_final_return']))
+print("Standard Deviation of Final Returns: {:.2%}".format(summary['std_final_return']))
+
+"""### Variance reduction
+
+With 1000 plain pseudo-random paths the 2.5th and 97.5th percentiles above move noticeably from one seed to the next. Scrambled Sobol points with a Brownian-bridge ordering, plus a control variate against the analytic mean `S0 * (1 + mean_return) ** num_days`, reach the same precision with far fewer paths. The simulation stops as soon as every statistic's standard error is below 0.2% of its value (see monte_carlo.py).
+"""
+
+vr_summary, vr_errors = run_monte_carlo_adaptive(stock_data['Close'].iloc[-1], mean_return,
+                                                 std_dev_return, num_steps=num_days - 1,
+                                                 precision=0.002, seed=42, sampling='sobol')
+print(f"Paths used: {vr_summary['num_simulations']} (converged: {vr_summary['converged']})")
+for q, value, error in zip(['2.5th', '50th', '97.5th'], vr_summary['quantiles'], vr_errors['quantiles']):
+    print(f"{q} percentile: ${value:.2f} +- {error:.2f}")
+print(f"Mean final price: ${vr_summary['mean_final_price']:.2f} +- {vr_errors['mean_final_price']:.4f}")
+
+"""### Sentiment-regime simulation
+
+The return parameters above ignore `sentiment`. Here each trading day gets a sentiment regime (-1, 0 or 1, days without tweets neutral), every regime has its own return mean and volatility, and regimes follow a Markov chain fitted from consecutive days (see sentiment_regimes.py). The simulation starts in the regime of the latest tweets.
+"""
+
+regimes = fit_sentiment_regimes(stock_selected_features_df, stocks_sentiment_features_df)
+print(regimes.table())
+print(regimes.transition_table())
+
+latest_regime = int(np.clip(np.rint(stock_data['sentiment'].iloc[-1]), -1, 1))
+regime_summary, _ = run_monte_carlo(stock_data['Close'].iloc[-1], mean_return, std_dev_return,
+                                    num_steps=num_days - 1, num_simulations=num_simulations,
+                                    seed=42, model='regime',
+                                    model_params=regimes.model_params(latest_regime))
+print("Sentiment-regime 2.5th / 50th / 97.5th percentiles:", np.round(regime_summary['quantiles'], 2))
+
+"""### Per-ticker simulations
+
+The series above mixes every `Stock Name`, so its returns also include jumps between tickers. Simulate each ticker of the full price dataset separately instead, spread over a process pool.
+"""
+
+universe_results = simulate_universe(stock_df_orig, num_steps=252, num_simulations=10000, seed=42)
+universe_results
 
 """## Question: What parameters and assumptions should be included in Monte Carlo simulations, such as stock price distribution, market volatility, and Black Dawn events?"""
 
@@ -576,33 +596,53 @@ num_days = 30  # Number of days to forecast into the future
 average_daily_return = np.mean(stocks_sentiment_features_df['Close'].pct_change())
 daily_volatility = np.std(stocks_sentiment_features_df['Close'].pct_change())
 
-# Perform Monte Carlo simulations
-results = []
-
-for _ in range(num_simulations):
-    daily_returns = np.random.normal(average_daily_return, daily_volatility, num_days)
-    price_series = [initial_price]
-
-    for dr in daily_returns:
-        price_series.append(price_series[-1] * (1 + dr))
-
-    results.append(price_series)
-
-# Convert results to DataFrame
-simulations_df = pd.DataFrame(results).T
-simulations_df.columns = [f"Simulation_{i+1}" for i in range(num_simulations)]
+# Perform Monte Carlo simulations in streaming mode: only online statistics of the
+# final prices are kept, so num_simulations can grow without growing memory
+summary, _ = run_monte_carlo_streaming(initial_price, average_daily_return, daily_volatility,
+                                       num_steps=num_days, num_simulations=num_simulations,
+                                       seed=42)
 
 # Calculate statistics on simulated prices
-simulated_final_prices = simulations_df.iloc[-1, :]
-mean_price = simulated_final_prices.mean()
-median_price = simulated_final_prices.median()
-std_dev = simulated_final_prices.std()
-lower_bound = simulated_final_prices.quantile(0.025)
-upper_bound = simulated_final_prices.quantile(0.975)
+mean_price = summary['mean_final_price']
+median_price = summary['median_final_price']
+std_dev = summary['std_final_price']
+lower_bound, _, upper_bound = summary['quantiles']
 
 # Print the results
 print("Simulation Results:")
 print(f"Mean Final Price: {mean_price:.2f}")
 print(f"Median Final Price: {median_price:.2f}")
 print(f"Standard Deviation of Final Prices: {std_dev:.2f}")
-print(f"95% Confidence Interval of Final Prices: [{lower_bound:.2f}, {upper_bound:.2f}]")
\ No newline at end of file
+print(f"95% Confidence Interval of Final Prices: [{lower_bound:.2f}, {upper_bound:.2f}]")
+
+"""### Black Dawn events: fat tails and jumps
+
+Gaussian daily returns understate tail risk. Re-run the simulation with Student-t returns, GARCH volatility clustering and Merton jumps; the jump frequency and size are calibrated from the days the z-score detector flags as outliers.
+"""
+
+daily_returns = stocks_sentiment_features_df['Close'].pct_change().dropna()
+diffusion_mean, diffusion_std, jump_params = calibrate_jump_diffusion(daily_returns, threshold=3)
+print("Calibrated jump parameters:", jump_params)
+
+scenarios = {
+    'gaussian': (average_daily_return, daily_volatility, None),
+    'student_t': (average_daily_return, daily_volatility, {'df': 4}),
+    'garch': (average_daily_return, daily_volatility, None),
+    'jump': (diffusion_mean, diffusion_std, jump_params),
+}
+tail_results = {}
+for model, (mean_return, std_return, model_params) in scenarios.items():
+    model_summary, _ = run_monte_carlo(initial_price, mean_return, std_return, num_steps=num_days,
+                                       num_simulations=num_simulations, seed=42, model=model,
+                                       model_params=model_params)
+    tail_results[model] = dict(zip(['2.5%', '50%', '97.5%'], model_summary['quantiles']),
+                               mean=model_summary['mean_final_price'])
+pd.DataFrame(tail_results).T
+
+"""## Where the time went
+
+Wall and CPU time, rows processed and peak memory of every instrumented step of this run. Recording is off by default; set `BLACKSWAN_INSTRUMENT=1` (or `memory` for the tracemalloc peak) before starting the runtime to switch it on, and `BLACKSWAN_PROFILE=cprofile` to also write a cProfile capture of each top-level step (see instrumentation.py).
+"""
+
+if instrumentation_enabled():
+    RECORDER.summary()
@@ -0,0 +1,291 @@
+"""Technical indicators computed per ticker.
+
+``calculate_macd`` and ``calculate_bollinger_bands`` are the notebook's
+single-series functions. ``add_indicators`` computes the same indicators for
+every ``Stock Name`` at once: rows are put in (ticker, date) order, each
+ticker is a contiguous slice, and NumPy/SciPy kernels write the results for
+that slice straight into preallocated output arrays, so EMAs and rolling
+windows never run across ticker boundaries.
+
+New indicators are added by registering a kernel in ``INDICATORS``; RSI and
+ATR are included alongside MACD and Bollinger bands.
+
+``IndicatorState`` updates MACD and Bollinger bands one bar at a time for live
+ingestion, holding only the last EMA values and a ring buffer of the
+Bollinger window, and can be snapshotted to and restored from disk.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+from instrumentation import instrument
+
+
+# Calculate MACD (Moving Average Convergence Divergence) for a single series
+def calculate_macd(data, short_window=12, long_window=26, signal_window=9):
+    close_prices = pd.Series(data['Close'].values)
+    short_ema = close_prices.ewm(span=short_window, min_periods=1, adjust=False).mean()
+    long_ema = close_prices.ewm(span=long_window, min_periods=1, adjust=False).mean()
+    macd = short_ema - long_ema
+    signal = macd.ewm(span=signal_window, min_periods=1, adjust=False).mean()
+    return macd, signal
+
+
+# Calculate Bollinger Bands for a single series
+def calculate_bollinger_bands(data, window=20, num_std=2):
+    close_prices = pd.Series(data['Close'].values)
+    rolling = close_prices.rolling(window=window, min_periods=1)
+    rolling_mean = rolling.mean()
+    rolling_std = rolling.std()
+    upper_band = rolling_mean + num_std * rolling_std
+    lower_band = rolling_mean - num_std * rolling_std
+    return upper_band, rolling_mean, lower_band
+
+
+# Exponential moving average with adjust=False, seeded with the first value
+def ema(values, alpha):
+    if len(values) == 0:
+        return np.empty(0)
+    smoothed, _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * values[0]])
+    return smoothed
+
+
+def _span_alpha(span):
+    return 2.0 / (span + 1.0)
+
+
+# Rolling mean and sample std (min_periods=1) of one contiguous slice.
+# Full windows are evaluated on a strided view in blocks of rows; the partial
+# windows at the start of the slice use cumulative sums.
+def rolling_mean_std(values, window, mean_out, std_out, block_size=65536):
+    n = len(values)
+    head = min(window - 1, n)
+    if head:
+        centred = values[:head] - values[0]
+        count = np.arange(1, head + 1)
+        sums = np.cumsum(centred)
+        squares = np.cumsum(centred * centred)
+        mean_out[:head] = sums / count + values[0]
+        std_out[0] = np.nan
+        std_out[1:head] = np.sqrt(np.maximum(
+            (squares[1:] - sums[1:] * sums[1:] / count[1:]) / (count[1:] - 1), 0.0))
+    if n < window:
+        return
+
+    windows = sliding_window_view(values, window)
+    for start in range(0, len(windows), block_size):
+        block = windows[start:start + block_size]
+        rows = slice(head + start, head + start + len(block))
+        mean = block.mean(axis=1)
+        mean_out[rows] = mean
+        deviations = block - mean[:, None]
+        np.sqrt(np.einsum('ij,ij->i', deviations, deviations) / (window - 1), out=std_out[rows])
+
+
+# MACD line and signal line
+def _macd_kernel(close, out, short_window=12, long_window=26, signal_window=9):
+    macd, signal = out
+    np.subtract(ema(close, _span_alpha(short_window)), ema(close, _span_alpha(long_window)), out=macd)
+    signal[:] = ema(macd, _span_alpha(signal_window))
+
+
+# Upper, middle and lower Bollinger bands
+def _bollinger_kernel(close, out, window=20, num_std=2):
+    upper, middle, lower = out
+    rolling_mean_std(close, window, middle, upper)
+    np.multiply(upper, num_std, out=lower)
+    np.subtract(middle, lower, out=lower)
+    np.multiply(upper, num_std, out=upper)
+    upper += middle
+
+
+# Relative Strength Index with Wilder smoothing
+def _rsi_kernel(close, out, window=14):
+    (rsi,) = out
+    delta = np.diff(close, prepend=close[:1])
+    average_gain = ema(np.maximum(delta, 0.0), 1.0 / window)
+    average_loss = ema(np.maximum(-delta, 0.0), 1.0 / window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi[:] = 100.0 - 100.0 / (1.0 + average_gain / average_loss)
+    rsi[average_loss == 0] = 100.0
+
+
+# Average True Range with Wilder smoothing
+def _atr_kernel(high, low, close, out, window=14):
+    (atr,) = out
+    previous_close = np.concatenate((close[:1], close[:-1]))
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - previous_close),
+                                                   np.abs(low - previous_close)))
+    atr[:] = ema(true_range, 1.0 / window)
+
+
+# name -> (input columns, output columns, kernel)
+# A kernel receives one contiguous float64 slice per input column plus a tuple of
+# output slices to fill in place, and keyword parameters.
+INDICATORS = {
+    'macd': (('Close',), ('MACD', 'MACD Signal'), _macd_kernel),
+    'bollinger': (('Close',), ('Upper Bollinger Band', 'Middle Bollinger Band',
+                               'Lower Bollinger Band'), _bollinger_kernel),
+    'rsi': (('Close',), ('RSI',), _rsi_kernel),
+    'atr': (('High', 'Low', 'Close'), ('ATR',), _atr_kernel),
+}
+
+
+# Row order that groups tickers together in date order, plus the slice boundaries.
+# order is None when df is already sorted that way.
+def ticker_slices(df, ticker_column='Stock Name', date_column='Date'):
+    codes = pd.Series(df[ticker_column]).astype('category').cat.codes.to_numpy()
+    dates = df[date_column].to_numpy()
+    if len(df) and np.all(codes[1:] >= codes[:-1]) and np.all(
+            (codes[1:] != codes[:-1]) | (dates[1:] >= dates[:-1])):
+        order = None
+        sorted_codes = codes
+    else:
+        order = np.lexsort((dates, codes))
+        sorted_codes = codes[order]
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(df)]))
+    return order, list(zip(starts, ends))
+
+
+# Add indicator columns to df in place, computed separately for every ticker.
+# params maps an indicator name to keyword arguments for its kernel. Kernels always
+# run in float64; dtype (e.g. np.float32) only sets the stored column type.
+@instrument
+def add_indicators(df, indicators=('macd', 'bollinger'), ticker_column='Stock Name',
+                   date_column='Date', params=None, dtype=np.float64):
+    params = params or {}
+    order, slices = ticker_slices(df, ticker_column, date_column)
+    n = len(df)
+
+    for name in indicators:
+        input_columns, output_columns, kernel = INDICATORS[name]
+        inputs = []
+        for column in input_columns:
+            values = df[column].to_numpy(dtype=np.float64)
+            inputs.append(values if order is None else values[order])
+        outputs = [np.empty(n) for _ in output_columns]
+
+        for start, end in slices:
+            kernel(*(values[start:end] for values in inputs),
+                   out=tuple(values[start:end] for values in outputs), **params.get(name, {}))
+
+        for column, values in zip(output_columns, outputs):
+            if order is not None:
+                unsorted = np.empty(n, dtype=dtype)
+                unsorted[order] = values
+                values = unsorted
+            df[column] = values.astype(dtype, copy=False)
+    return df
+
+
+# Incremental MACD and Bollinger bands for one ticker.
+# Each update is O(1) in the history length: the EMAs carry their last value and the
+# Bollinger window is a fixed-size ring buffer. Outputs match calculate_macd and
+# calculate_bollinger_bands over the same bars.
+class IndicatorState:
+
+    def __init__(self, short_window=12, long_window=26, signal_window=9, bollinger_window=20,
+                 num_std=2):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.signal_window = signal_window
+        self.bollinger_window = bollinger_window
+        self.num_std = num_std
+        self.short_ema = None
+        self.long_ema = None
+        self.signal = None
+        self._window = np.full(bollinger_window, np.nan)
+        self._position = 0
+        self.count = 0
+
+    @staticmethod
+    def _step(previous, value, span):
+        if previous is None:
+            return value
+        alpha = _span_alpha(span)
+        return alpha * value + (1.0 - alpha) * previous
+
+    # Add one close and return the indicator values for that bar
+    def update(self, close):
+        close = float(close)
+        self.short_ema = self._step(self.short_ema, close, self.short_window)
+        self.long_ema = self._step(self.long_ema, close, self.long_window)
+        macd = self.short_ema - self.long_ema
+        self.signal = self._step(self.signal, macd, self.signal_window)
+
+        self._window[self._position] = close
+        self._position = (self._position + 1) % self.bollinger_window
+        self.count += 1
+        window = self._window[:min(self.count, self.bollinger_window)]
+        middle = window.mean()
+        std = window.std(ddof=1) if len(window) > 1 else np.nan
+
+        return {
+            'MACD': macd,
+            'MACD Signal': self.signal,
+            'Upper Bollinger Band': middle + self.num_std * std,
+            'Middle Bollinger Band': middle,
+            'Lower Bollinger Band': middle - self.num_std * std,
+        }
+
+    # Add several closes in order; returns a DataFrame with one row per bar
+    def update_many(self, closes):
+        return pd.DataFrame([self.update(close) for close in closes])
+
+    def to_dict(self):
+        return {
+            'short_window': self.short_window,
+            'long_window': self.long_window,
+            'signal_window': self.signal_window,
+            'bollinger_window': self.bollinger_window,
+            'num_std': self.num_std,
+            'short_ema': self.short_ema,
+            'long_ema': self.long_ema,
+            'signal': self.signal,
+            'window': self._window.tolist(),
+            'position': self._position,
+            'count': self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, snapshot):
+        state = cls(snapshot['short_window'], snapshot['long_window'], snapshot['signal_window'],
+                    snapshot['bollinger_window'], snapshot['num_std'])
+        state.short_ema = snapshot['short_ema']
+        state.long_ema = snapshot['long_ema']
+        state.signal = snapshot['signal']
+        state._window = np.array(snapshot['window'], dtype=float)
+        state._position = snapshot['position']
+        state.count = snapshot['count']
+        return state
+
+
+# Snapshot {ticker: IndicatorState} to a JSON file
+def save_indicator_states(states, path):
+    with open(path, 'w') as f:
+        json.dump({ticker: state.to_dict() for ticker, state in states.items()}, f)
+
+
+# Restore {ticker: IndicatorState} written by save_indicator_states
+def load_indicator_states(path):
+    with open(path) as f:
+        return {ticker: IndicatorState.from_dict(snapshot) for ticker, snapshot in json.load(f).items()}
+
+
+# Feed a frame of new bars (any mix of tickers, in date order per ticker) into the
+# per-ticker states, creating states for unseen tickers. Returns the indicator
+# columns aligned with bars.
+def update_indicator_states(states, bars, ticker_column='Stock Name', price_column='Close',
+                            **state_params):
+    rows = []
+    for ticker, close in zip(bars[ticker_column], bars[price_column]):
+        if ticker not in states:
+            states[ticker] = IndicatorState(**state_params)
+        rows.append(states[ticker].update(close))
+    return pd.DataFrame(rows, index=bars.index)
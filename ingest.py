@@ -0,0 +1,163 @@
+"""Typed, columnar loading of the stock and sentiment datasets.
+
+The CSVs are read with an explicit schema (categorical ticker, datetime
+date, float32 prices, int64 volume). On first use each CSV is converted into
+a Parquet dataset partitioned by ``Stock Name`` and sorted by date; later
+loads read that dataset through memory-mapped files, projecting only the
+requested columns and pushing ticker/date filters down to the partitions and
+row-group statistics. The Parquet copy is rebuilt whenever the source CSV
+changes.
+"""
+
+import json
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from instrumentation import instrument
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+STOCKS_CSV = os.path.join(DATA_DIR, 'stocks_prediction.csv')
+SENTIMENT_CSV = os.path.join(DATA_DIR, 'stocks_sentiment_prediction.csv')
+DEFAULT_PARQUET_DIR = os.path.join('cache', 'parquet')
+
+TICKER_COLUMN = 'Stock Name'
+DATE_COLUMN = 'Date'
+
+STOCK_SCHEMA = pa.schema([
+    (DATE_COLUMN, pa.timestamp('ns')),
+    ('Open', pa.float32()),
+    ('High', pa.float32()),
+    ('Low', pa.float32()),
+    ('Close', pa.float32()),
+    ('Volume', pa.int64()),
+    (TICKER_COLUMN, pa.string()),
+])
+
+SENTIMENT_SCHEMA = pa.schema(list(STOCK_SCHEMA) + [
+    ('tweets', pa.string()),
+    ('sentiment', pa.float32()),
+    ('tweet_cleaned', pa.string()),
+])
+
+# Parquet row groups; smaller groups give finer date pruning
+ROW_GROUP_SIZE = 64 * 1024
+
+_MARKER = '_source.json'
+
+
+# The pandas dtypes corresponding to an arrow schema
+def pandas_dtypes(schema):
+    dtypes = {}
+    for field in schema:
+        if field.name == TICKER_COLUMN:
+            dtypes[field.name] = 'category'
+        elif pa.types.is_timestamp(field.type):
+            dtypes[field.name] = 'datetime64[ns]'
+        elif pa.types.is_string(field.type):
+            dtypes[field.name] = 'string'
+        else:
+            dtypes[field.name] = field.type.to_pandas_dtype()
+    return dtypes
+
+
+# Read a CSV straight into a typed DataFrame (no Parquet cache)
+def read_csv_typed(path, schema=STOCK_SCHEMA, columns=None):
+    dtypes = pandas_dtypes(schema)
+    names = columns or schema.names
+    df = pd.read_csv(path, usecols=names,
+                     dtype={name: dtype for name, dtype in dtypes.items()
+                            if name in names and name != DATE_COLUMN and dtype != 'int64'},
+                     parse_dates=[DATE_COLUMN] if DATE_COLUMN in names else False)
+    # Integer columns may be written as floats ("340.0") in the CSV
+    for name in names:
+        if dtypes[name] == 'int64':
+            df[name] = df[name].astype('int64')
+    if DATE_COLUMN in names:
+        df[DATE_COLUMN] = df[DATE_COLUMN].astype('datetime64[ns]')
+    return df[names]
+
+
+def _source_signature(csv_path, schema):
+    stat = os.stat(csv_path)
+    return {'csv': os.path.abspath(csv_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'schema': schema.to_string()}
+
+
+def _dataset_dir(csv_path, parquet_dir):
+    return os.path.join(parquet_dir, os.path.splitext(os.path.basename(csv_path))[0])
+
+
+# Convert a CSV into a Parquet dataset partitioned by ticker and sorted by date
+def csv_to_parquet(csv_path, dataset_dir, schema=STOCK_SCHEMA):
+    # Integer columns may be written as floats, so read them as float64 and cast afterwards
+    read_types = {field.name: pa.float64() if pa.types.is_integer(field.type) else field.type
+                  for field in schema}
+    reader = pa_csv.open_csv(csv_path, convert_options=pa_csv.ConvertOptions(
+        column_types=read_types, include_columns=schema.names))
+    table = pa.Table.from_batches(list(reader), reader.schema).cast(schema)
+    table = table.sort_by([(TICKER_COLUMN, 'ascending'), (DATE_COLUMN, 'ascending')])
+
+    if os.path.exists(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    ds.write_dataset(table, dataset_dir, format='parquet',
+                     partitioning=ds.partitioning(pa.schema([(TICKER_COLUMN, pa.string())]),
+                                                  flavor='hive'),
+                     max_rows_per_group=ROW_GROUP_SIZE, min_rows_per_group=ROW_GROUP_SIZE // 4)
+    with open(os.path.join(dataset_dir, _MARKER), 'w') as marker:
+        json.dump(_source_signature(csv_path, schema), marker)
+
+
+# Return the Parquet dataset directory for a CSV, converting it if missing or stale
+def ensure_parquet(csv_path, schema=STOCK_SCHEMA, parquet_dir=DEFAULT_PARQUET_DIR):
+    dataset_dir = _dataset_dir(csv_path, parquet_dir)
+    marker = os.path.join(dataset_dir, _MARKER)
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if json.load(f) == _source_signature(csv_path, schema):
+                return dataset_dir
+    csv_to_parquet(csv_path, dataset_dir, schema)
+    return dataset_dir
+
+
+# Load a dataset with column projection and ticker/date predicate pushdown.
+# start/end are inclusive dates; tickers is an iterable of Stock Name values.
+@instrument(rows='return')
+def load_dataset(csv_path, schema=STOCK_SCHEMA, columns=None, tickers=None, start=None, end=None,
+                 parquet_dir=DEFAULT_PARQUET_DIR):
+    dataset_dir = ensure_parquet(csv_path, schema, parquet_dir)
+    dataset = ds.dataset(dataset_dir, format='parquet', filesystem=fs.LocalFileSystem(use_mmap=True),
+                         partitioning=ds.partitioning(pa.schema([(TICKER_COLUMN, pa.string())]),
+                                                      flavor='hive'),
+                         exclude_invalid_files=True)
+
+    conditions = []
+    if tickers is not None:
+        conditions.append(ds.field(TICKER_COLUMN).isin(list(tickers)))
+    if start is not None:
+        conditions.append(ds.field(DATE_COLUMN) >= pa.scalar(pd.Timestamp(start), pa.timestamp('ns')))
+    if end is not None:
+        conditions.append(ds.field(DATE_COLUMN) <= pa.scalar(pd.Timestamp(end), pa.timestamp('ns')))
+    predicate = None
+    for condition in conditions:
+        predicate = condition if predicate is None else predicate & condition
+
+    names = columns or schema.names
+    table = dataset.to_table(columns=names, filter=predicate)
+    df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype()}.get)
+    if TICKER_COLUMN in df:
+        df[TICKER_COLUMN] = df[TICKER_COLUMN].astype('category')
+    return df
+
+
+def load_stocks(path=STOCKS_CSV, **kwargs):
+    return load_dataset(path, STOCK_SCHEMA, **kwargs)
+
+
+def load_sentiment(path=SENTIMENT_CSV, **kwargs):
+    return load_dataset(path, SENTIMENT_SCHEMA, **kwargs)
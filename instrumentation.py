@@ -0,0 +1,348 @@
+"""Lightweight instrumentation of the pipeline stages and hot paths.
+
+``instrument`` decorates a function and ``measure`` wraps a block of code;
+both record, for every call, the wall time, the CPU time of the process,
+the rows processed and the memory into ``RECORDER``. Recording is off until
+``enable()`` is called or the environment switches it on, and while it is
+off a decorated function costs one flag check per call.
+
+Environment variables, read at import:
+
+    BLACKSWAN_INSTRUMENT=1         wall and CPU time, rows and RSS
+    BLACKSWAN_INSTRUMENT=memory    adds the tracemalloc peak (slows allocation-heavy code)
+    BLACKSWAN_PROFILE=cprofile     profile every outermost measured call with cProfile
+                                   (or pyinstrument, if installed) into BLACKSWAN_PROFILE_DIR
+    BLACKSWAN_METRICS=metrics.json export the records when the process exits (.json or .prom)
+
+An unknown BLACKSWAN_PROFILE value leaves recording off with a warning.
+
+CPU time is that of the whole process, so it includes NumPy and pyarrow
+helper threads and overlaps between stages running concurrently. Calls made
+inside process-pool workers are recorded in the worker and not collected.
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import warnings
+
+ENV_INSTRUMENT = 'BLACKSWAN_INSTRUMENT'
+ENV_PROFILE = 'BLACKSWAN_PROFILE'
+ENV_PROFILE_DIR = 'BLACKSWAN_PROFILE_DIR'
+ENV_METRICS = 'BLACKSWAN_METRICS'
+
+DEFAULT_PROFILE_DIR = os.path.join('output', 'profiles')
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+_MIB = 2 ** 20
+
+
+class _Settings:
+    enabled = False
+    trace_memory = False
+    profiler = None
+    profile_dir = DEFAULT_PROFILE_DIR
+
+
+_settings = _Settings()
+_local = threading.local()
+# cProfile and pyinstrument cannot profile two overlapping calls; concurrent stages
+# beyond the first are measured without a profile
+_profile_lock = threading.Lock()
+_profile_counter = iter(range(1, 2 ** 63))
+
+
+def enable(trace_memory=False, profiler=None, profile_dir=None):
+    if profiler is not None and profiler not in PROFILERS:
+        raise ValueError(f'Unknown profiler {profiler!r}; use one of {", ".join(PROFILERS)}')
+    _settings.enabled = True
+    _settings.trace_memory = trace_memory
+    _settings.profiler = profiler
+    _settings.profile_dir = profile_dir or DEFAULT_PROFILE_DIR
+
+
+def disable():
+    _settings.enabled = False
+
+
+def is_enabled():
+    return _settings.enabled
+
+
+# Per-call measurements, appended from any thread
+class Recorder:
+
+    def __init__(self):
+        self.records = []
+
+    def add(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records = []
+
+    # Totals per name: calls, wall and CPU seconds, rows and the largest memory peaks
+    def totals(self):
+        totals = {}
+        for record in list(self.records):
+            total = totals.setdefault(record['name'], {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0,
+                'peak_rss_mib': None, 'traced_peak_mib': None})
+            total['calls'] += 1
+            total['wall_seconds'] += record['wall_seconds']
+            total['cpu_seconds'] += record['cpu_seconds']
+            total['rows'] += record['rows'] or 0
+            for key in ('peak_rss_mib', 'traced_peak_mib'):
+                if record[key] is not None:
+                    total[key] = max(total[key] or 0.0, record[key])
+        return totals
+
+    # One row per name, slowest first
+    def summary(self):
+        import pandas as pd
+
+        table = pd.DataFrame.from_dict(self.totals(), orient='index')
+        if table.empty:
+            return table
+        table.index.name = 'name'
+        table['rows_per_second'] = table['rows'] / table['wall_seconds']
+        return table.sort_values('wall_seconds', ascending=False)
+
+    def to_json(self):
+        return json.dumps({'records': list(self.records), 'totals': self.totals()}, indent=2)
+
+    # Prometheus text exposition format, one sample per name and metric
+    def to_prometheus(self, prefix='blackswan'):
+        metrics = (
+            ('calls_total', 'counter', 'Calls of the instrumented function or block.', 'calls', 1),
+            ('wall_seconds_total', 'counter', 'Wall time spent in the call.', 'wall_seconds', 1),
+            ('cpu_seconds_total', 'counter', 'Process CPU time spent during the call.',
+             'cpu_seconds', 1),
+            ('rows_total', 'counter', 'Rows processed.', 'rows', 1),
+            ('peak_rss_bytes', 'gauge', 'Largest resident set size seen after a call.',
+             'peak_rss_mib', _MIB),
+            ('traced_peak_bytes', 'gauge', 'Largest tracemalloc peak above the start of a call.',
+             'traced_peak_mib', _MIB),
+        )
+        totals = self.totals()
+        lines = []
+        for metric, kind, description, key, scale in metrics:
+            samples = [(name, total[key]) for name, total in totals.items() if total[key] is not None]
+            if not samples:
+                continue
+            lines.append(f'# HELP {prefix}_{metric} {description}')
+            lines.append(f'# TYPE {prefix}_{metric} {kind}')
+            for name, value in samples:
+                lines.append(f'{prefix}_{metric}{{name="{_escape_label(name)}"}} {value * scale:g}')
+        return '\n'.join(lines) + '\n'
+
+    # Write the records as JSON or, for a .prom file, in the Prometheus text format
+    def export(self, path):
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+RECORDER = Recorder()
+
+
+# Measures one call or block and adds its record to RECORDER on exit.
+# Set .rows inside the block to report the rows it processed.
+class _Measurement:
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        from memory import current_rss
+
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+
+        self.profiler = self.profile_path = None
+        if _settings.profiler and self.parent is None and _profile_lock.acquire(blocking=False):
+            self.profiler = _start_profiler(_settings.profiler)
+        if _settings.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # The peak is reset for this block; the parent keeps what it had reached so far
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent.traced_peak = max(self.parent.traced_peak, peak)
+            tracemalloc.reset_peak()
+            self.traced_start, self.traced_peak = current, current
+        self.rss_start = current_rss()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        from memory import current_rss, peak_rss
+
+        wall_seconds = time.perf_counter() - self.wall_start
+        cpu_seconds = time.process_time() - self.cpu_start
+        traced_peak_mib = None
+        if _settings.trace_memory and tracemalloc.is_tracing():
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+            traced_peak_mib = (self.traced_peak - self.traced_start) / _MIB
+            if self.parent is not None:
+                self.parent.traced_peak = max(self.parent.traced_peak, self.traced_peak)
+        if self.profiler is not None:
+            self.profile_path = _stop_profiler(self.profiler, self.name)
+            _profile_lock.release()
+        _local.stack.pop()
+
+        RECORDER.add({
+            'name': self.name,
+            'parent': None if self.parent is None else self.parent.name,
+            'started': time.time() - wall_seconds,
+            'wall_seconds': wall_seconds,
+            'cpu_seconds': cpu_seconds,
+            'rows': self.rows,
+            'rows_per_second': self.rows / wall_seconds if self.rows and wall_seconds else None,
+            'rss_delta_mib': (current_rss() - self.rss_start) / _MIB,
+            'peak_rss_mib': peak_rss() / _MIB,
+            'traced_peak_mib': traced_peak_mib,
+            'profile': self.profile_path,
+            'failed': exc_info[0] is not None,
+        })
+        return False
+
+
+class _NullMeasurement:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_MEASUREMENT = _NullMeasurement()
+
+
+# Context manager measuring the enclosed block under name:
+#     with measure('lstm.train', rows=len(dataset)) as measurement: ...
+def measure(name, rows=None):
+    if not _settings.enabled:
+        return _NULL_MEASUREMENT
+    return _Measurement(name, rows)
+
+
+# Rows of a value: an int as is, the length of anything sized but a string (such as a
+# path), otherwise None
+def _count_rows(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, (str, bytes)):
+        return None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+# Decorator recording every call of the function, named after its module and qualified
+# name unless name is given. rows names the argument whose length (or integer value)
+# counts the rows processed, or 'return' for the length of the result; by default the
+# first positional argument is used when it has a length.
+def instrument(name=None, rows=None):
+    if callable(name):
+        return instrument()(name)
+
+    def decorate(func):
+        label = name or f'{func.__module__}.{func.__qualname__}'
+        signature = []
+
+        def argument(args, kwargs):
+            import inspect
+
+            if not signature:
+                signature.append(inspect.signature(func))
+            bound = signature[0].bind(*args, **kwargs)
+            bound.apply_defaults()
+            return bound.arguments[rows]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _settings.enabled:
+                return func(*args, **kwargs)
+            with _Measurement(label) as measurement:
+                result = func(*args, **kwargs)
+                if rows == 'return':
+                    measurement.rows = _count_rows(result)
+                elif rows is not None:
+                    measurement.rows = _count_rows(argument(args, kwargs))
+                elif args:
+                    measurement.rows = _count_rows(args[0])
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def _start_profiler(kind):
+    if kind == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+# Stop the profiler and write its output: pstats data for cProfile, HTML for pyinstrument
+def _stop_profiler(profiler, name):
+    os.makedirs(_settings.profile_dir, exist_ok=True)
+    stem = os.path.join(_settings.profile_dir, f'{name}-{os.getpid()}-{next(_profile_counter)}')
+    if _settings.profiler == 'pyinstrument':
+        profiler.stop()
+        with open(f'{stem}.html', 'w') as f:
+            f.write(profiler.output_html())
+        return f'{stem}.html'
+    profiler.disable()
+    profiler.dump_stats(f'{stem}.prof')
+    return f'{stem}.prof'
+
+
+def _configure_from_environment():
+    mode = os.environ.get(ENV_INSTRUMENT, '').strip().lower()
+    profiler = os.environ.get(ENV_PROFILE, '').strip().lower() or None
+    if mode in ('', '0', 'false', 'off') and profiler is None:
+        return
+    if profiler is not None and profiler not in PROFILERS:
+        # Raising here would break every module that imports instrument
+        warnings.warn(f'Ignoring instrumentation settings: unknown {ENV_PROFILE}={profiler!r}; '
+                      f'use one of {", ".join(PROFILERS)}', RuntimeWarning, stacklevel=2)
+        return
+    enable(trace_memory=mode == 'memory', profiler=profiler,
+           profile_dir=os.environ.get(ENV_PROFILE_DIR))
+    metrics_path = os.environ.get(ENV_METRICS)
+    if metrics_path:
+        atexit.register(RECORDER.export, metrics_path)
+
+
+_configure_from_environment()
@@ -0,0 +1,124 @@
+"""Persistent SQLite cache of cleaned and lemmatized tweets.
+
+Entries are keyed by a hash of the raw tweet together with a namespace that
+covers the spaCy model name/version, its active pipeline and the cleaning
+regexes. Changing any of these gives a new namespace, so stale lemmas are
+never returned; entries of other namespaces can be purged when the cache is
+opened. The store is bounded to ``max_entries`` rows with least-recently-used
+eviction, and counts hits and misses.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+import spacy
+
+from text_cleaning import DISABLED_PIPES, FUSED_WORDS_RE, NON_LETTER_RE, URL_RE
+
+DEFAULT_PATH = os.path.join('cache', 'lemmas.sqlite')
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+# Everything that can change the cleaned output of a tweet, hashed into one string
+def cache_namespace(nlp, **options):
+    description = {
+        'model': nlp.meta.get('name'),
+        'model_version': nlp.meta.get('version'),
+        'spacy_version': spacy.__version__,
+        'pipeline': [name for name in nlp.pipe_names if name not in DISABLED_PIPES],
+        'patterns': [URL_RE.pattern, NON_LETTER_RE.pattern, FUSED_WORDS_RE.pattern],
+        'options': options,
+    }
+    encoded = json.dumps(description, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class LemmaCache:
+
+    def __init__(self, namespace, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 purge_stale=True):
+        self.namespace = namespace
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS lemmas ('
+            'key BLOB PRIMARY KEY, namespace TEXT NOT NULL, cleaned TEXT NOT NULL, '
+            'last_used INTEGER NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS lemmas_last_used ON lemmas (last_used)')
+        if purge_stale:
+            with self._connection:
+                self._connection.execute('DELETE FROM lemmas WHERE namespace != ?', (namespace,))
+        self._clock = self._connection.execute(
+            'SELECT COALESCE(MAX(last_used), 0) FROM lemmas').fetchone()[0]
+
+    def key(self, text):
+        return hashlib.sha256(f'{self.namespace}\0{text}'.encode()).digest()
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM lemmas').fetchone()[0]
+
+    # Look up many texts at once; returns {text: cleaned} for the ones cached
+    def get_many(self, texts):
+        keys = {self.key(text): text for text in texts}
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), _QUERY_CHUNK):
+            chunk = key_list[start:start + _QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._connection.execute(
+                f'SELECT key, cleaned FROM lemmas WHERE key IN ({placeholders})', chunk)
+            found.update((keys[key], cleaned) for key, cleaned in rows)
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        if found:
+            self._clock += 1
+            with self._connection:
+                self._connection.executemany(
+                    'UPDATE lemmas SET last_used = ? WHERE key = ?',
+                    ((self._clock, self.key(text)) for text in found))
+        return found
+
+    # Store {text: cleaned} pairs and evict the least recently used rows over max_entries
+    def put_many(self, cleaned_by_text):
+        self._clock += 1
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO lemmas (key, namespace, cleaned, last_used) '
+                'VALUES (?, ?, ?, ?)',
+                ((self.key(text), self.namespace, cleaned, self._clock)
+                 for text, cleaned in cleaned_by_text.items()))
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    'DELETE FROM lemmas WHERE key IN '
+                    '(SELECT key FROM lemmas ORDER BY last_used LIMIT ?)', (excess,))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
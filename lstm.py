@@ -0,0 +1,185 @@
+"""LSTM stage of the hybrid model: learns the ARIMA residuals.
+
+The network sees a window of past (residual, sentiment) values for a ticker
+and predicts the next residual, which is added to the ARIMA forecast.
+
+Windows are never materialised as one 3-D array. ``WindowedDataset`` keeps
+one 2-D feature array per ticker and a ``sliding_window_view`` over it, so a
+window is a zero-copy view; only the rows of the current batch are gathered
+into a tensor. Batches mix windows from all tickers. Training is tuned for
+CPU-only machines through ``configure_threads``.
+"""
+
+import numpy as np
+import torch
+from numpy.lib.stride_tricks import sliding_window_view
+from torch import nn
+
+from sentiment_features import sentiment_features
+
+FEATURE_COLUMNS = ('residual', 'sentiment')
+TARGET_COLUMN = 'residual'
+
+
+# Set intra-op (and, if not yet fixed, inter-op) thread counts for torch on CPU
+def configure_threads(num_threads=None, num_interop_threads=None):
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work has started
+            pass
+    return torch.get_num_threads()
+
+
+# Residuals of the fitted per-ticker ARIMA models, aligned with the (ticker, date)
+# ordered rows of stock_df. arima_results is the table from fit_arima_universe.
+def arima_residuals(stock_df, arima_results, load_model, ticker_column='Stock Name',
+                    date_column='Date'):
+    ordered = stock_df.sort_values([ticker_column, date_column], kind='stable')
+    residuals = np.full(len(ordered), np.nan)
+    positions = ordered.groupby(ticker_column, observed=True).indices
+    for ticker, model_key in zip(arima_results[ticker_column], arima_results['model_key']):
+        model = load_model(model_key)
+        if model is not None and ticker in positions:
+            residuals[positions[ticker]] = np.asarray(model.resid)
+    return ordered.assign(residual=residuals)
+
+
+# Per-ticker windows over a feature table, built lazily
+class WindowedDataset:
+
+    def __init__(self, frame, window, feature_columns=FEATURE_COLUMNS, target_column=TARGET_COLUMN,
+                 ticker_column='Stock Name', date_column='Date', normalize=True):
+        self.window = window
+        self.feature_columns = list(feature_columns)
+        self.tickers = []
+        self.scales = {}
+        self._windows = []
+        self._targets = []
+
+        ordered = frame.sort_values([ticker_column, date_column], kind='stable')
+        for ticker, group in ordered.groupby(ticker_column, observed=True, sort=True):
+            features = group[self.feature_columns].to_numpy(dtype=np.float32)
+            target = group[target_column].to_numpy(dtype=np.float32)
+            if len(group) <= window:
+                continue
+            if normalize:
+                mean = np.nanmean(features, axis=0)
+                std = np.nanstd(features, axis=0)
+                std[std == 0] = 1.0
+                features = (features - mean) / std
+                target_index = self.feature_columns.index(target_column)
+                target = (target - mean[target_index]) / std[target_index]
+                self.scales[ticker] = (mean[target_index], std[target_index])
+            if np.isnan(features).any():
+                features = np.nan_to_num(features)
+            if np.isnan(target).any():
+                target = np.nan_to_num(target)
+            # (num_windows, num_features, window) view; sample i predicts target[i + window]
+            self._windows.append(sliding_window_view(features, window, axis=0))
+            self._targets.append(target)
+            self.tickers.append(ticker)
+
+        counts = [len(target) - window for target in self._targets]
+        self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    # Gather samples by global index into (x, y) tensors of shape (B, window, F) and (B,)
+    def gather(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        x = np.empty((len(indices), self.window, len(self.feature_columns)), dtype=np.float32)
+        y = np.empty(len(indices), dtype=np.float32)
+        series = np.searchsorted(self._offsets, indices, side='right') - 1
+        for s in np.unique(series):
+            rows = np.flatnonzero(series == s)
+            starts = indices[rows] - self._offsets[s]
+            x[rows] = self._windows[s][starts].transpose(0, 2, 1)
+            y[rows] = self._targets[s][starts + self.window]
+        return torch.from_numpy(x), torch.from_numpy(y)
+
+    # Stream (x, y) batches; shuffled batches mix windows of all tickers
+    def batches(self, batch_size=256, shuffle=True, seed=None):
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        for start in range(0, len(order), batch_size):
+            yield self.gather(order[start:start + batch_size])
+
+
+class ResidualLSTM(nn.Module):
+
+    def __init__(self, num_features=len(FEATURE_COLUMNS), hidden_size=32, num_layers=1, dropout=0.0):
+        super().__init__()
+        self.lstm = nn.LSTM(num_features, hidden_size, num_layers=num_layers, batch_first=True,
+                            dropout=dropout if num_layers > 1 else 0.0)
+        self.head = nn.Linear(hidden_size, 1)
+
+    def forward(self, x):
+        output, _ = self.lstm(x)
+        return self.head(output[:, -1]).squeeze(-1)
+
+
+# Train (or continue training) a ResidualLSTM; returns the model and per-epoch losses
+def train_lstm(dataset, model=None, epochs=5, batch_size=256, learning_rate=1e-3, hidden_size=32,
+               num_threads=None, seed=None):
+    configure_threads(num_threads)
+    if seed is not None:
+        torch.manual_seed(seed)
+    model = model or ResidualLSTM(len(dataset.feature_columns), hidden_size)
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+    loss_fn = nn.MSELoss()
+
+    history = []
+    model.train()
+    for epoch in range(epochs):
+        total, count = 0.0, 0
+        batch_seed = None if seed is None else seed + epoch
+        for x, y in dataset.batches(batch_size, shuffle=True, seed=batch_seed):
+            optimizer.zero_grad()
+            loss = loss_fn(model(x), y)
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(y)
+            count += len(y)
+        history.append(total / max(count, 1))
+    return model, history
+
+
+# Predict the next (unscaled) residual for samples of the dataset
+@torch.no_grad()
+def predict_residuals(model, dataset, indices, batch_size=1024):
+    model.eval()
+    indices = np.asarray(indices, dtype=np.int64)
+    predictions = np.empty(len(indices), dtype=np.float32)
+    for start in range(0, len(indices), batch_size):
+        x, _ = dataset.gather(indices[start:start + batch_size])
+        predictions[start:start + batch_size] = model(x).numpy()
+    if dataset.scales:
+        series = np.searchsorted(dataset._offsets, indices, side='right') - 1
+        mean = np.array([dataset.scales[dataset.tickers[s]][0] for s in series])
+        std = np.array([dataset.scales[dataset.tickers[s]][1] for s in series])
+        predictions = predictions * std + mean
+    return predictions
+
+
+# Predict the next target from one (window, num_features) array of model inputs
+@torch.no_grad()
+def predict_next(model, features):
+    model.eval()
+    x = torch.from_numpy(np.ascontiguousarray(features, dtype=np.float32)[None])
+    return float(model(x)[0])
+
+
+# Combine per-ticker ARIMA residuals with the tweet sentiment aligned to their bars (see
+# sentiment_features): the mean sentiment of the tweets since the previous bar, neutral (0)
+# on bars without tweets, plus the lagged and rolling sentiment columns for lags and windows.
+def residual_features(residual_df, sentiment_df, lags=(), windows=(), ticker_column='Stock Name',
+                      date_column='Date'):
+    frame = residual_df.drop(columns='sentiment', errors='ignore')
+    return sentiment_features(frame, sentiment_df, lags, windows, ticker_column=ticker_column,
+                              date_column=date_column)
@@ -0,0 +1,118 @@
+"""Memory helpers for the DataFrame flow.
+
+``enable_copy_on_write`` switches pandas to copy-on-write (always on from
+pandas 3): column projections and shallow copies share their buffers until
+one side is written, so the defensive ``.copy()`` calls are not needed.
+``downcast_frame`` narrows wide numeric columns and turns repetitive strings
+into categoricals.
+
+``MemoryTracker`` records per stage the wall time, the tracemalloc peak
+(Python and NumPy allocations made during the stage) and the process RSS,
+and checks the peaks against a fixed budget.
+"""
+
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+_MIB = 2 ** 20
+
+
+def enable_copy_on_write():
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+
+# Narrow float columns to float_dtype, integers to the smallest type holding their range
+# and string columns with few distinct values to categoricals. Returns a new frame
+# sharing every column that was left alone.
+def downcast_frame(df, float_dtype=np.float32, categorical_ratio=0.5):
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_float_dtype(values.dtype):
+            if values.dtype.itemsize > np.dtype(float_dtype).itemsize:
+                columns[column] = values.astype(float_dtype)
+        elif pd.api.types.is_integer_dtype(values.dtype) and isinstance(values.dtype, np.dtype):
+            narrowed = pd.to_numeric(values, downcast='integer')
+            if narrowed.dtype != values.dtype:
+                columns[column] = narrowed
+        elif pd.api.types.is_string_dtype(values.dtype) and len(values):
+            if values.nunique() <= categorical_ratio * len(values):
+                columns[column] = values.astype('category')
+    return df.assign(**columns) if columns else df
+
+
+# Resident set size of this process in bytes
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_rss()
+
+
+# High-water mark of the resident set size in bytes
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryTracker:
+
+    def __init__(self, budget_mib=None, trace=True):
+        self.budget_mib = budget_mib
+        self.trace = trace
+        self.records = []
+
+    # Measure the enclosed block as one stage. tracemalloc slows allocation-heavy
+    # Python code down; trace=False keeps only the RSS numbers.
+    @contextmanager
+    def stage(self, name):
+        started_tracing = self.trace and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace:
+            tracemalloc.reset_peak()
+        rss_before = current_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            traced_peak = tracemalloc.get_traced_memory()[1] / _MIB if self.trace else np.nan
+            if started_tracing:
+                tracemalloc.stop()
+            self.records.append({
+                'stage': name,
+                'seconds': seconds,
+                'traced_peak_mib': traced_peak,
+                'rss_before_mib': rss_before / _MIB,
+                'rss_after_mib': current_rss() / _MIB,
+                'peak_rss_mib': peak_rss() / _MIB,
+            })
+
+    def report(self):
+        table = pd.DataFrame(self.records, columns=['stage', 'seconds', 'traced_peak_mib',
+                                                    'rss_before_mib', 'rss_after_mib',
+                                                    'peak_rss_mib']).set_index('stage')
+        if self.budget_mib is not None:
+            table['within_budget'] = ~(table['traced_peak_mib'] > self.budget_mib)
+        return table
+
+    # Raise MemoryError naming the stages whose traced peak exceeded the budget
+    def check(self):
+        if self.budget_mib is None:
+            return
+        report = self.report()
+        over = report.index[~report['within_budget']]
+        if len(over):
+            raise MemoryError(f'Stages over the {self.budget_mib} MiB budget: {", ".join(over)}')
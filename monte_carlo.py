@@ -0,0 +1,640 @@
+"""Vectorised Monte Carlo price-path engine.
+
+Draws every daily return of a block of simulations as one array and turns
+them into price paths with a cumulative product, instead of looping over
+simulations and days in Python. Paths are produced in chunks so the memory
+used per step is bounded by ``chunk_size * num_steps`` no matter how many
+simulations are requested.
+
+Besides Gaussian returns, ``model`` selects a fat-tailed return model for
+black-swan scenarios: Student-t returns, Merton jump-diffusion (Poisson jump
+counts drawn for the whole block at once) and GARCH(1, 1) volatility, whose
+variance recursion is solved with cumulative products over blocks of days
+rather than a loop over days. ``calibrate_jump_diffusion`` estimates the jump
+parameters from the days flagged by ``detect_outliers_zscore``. The ``regime``
+model switches the return mean and volatility with a Markov chain of regimes,
+such as the sentiment regimes fitted in ``sentiment_regimes``.
+
+``sampling`` selects how the daily shocks of every model are drawn: plain
+pseudo-random normals, antithetic pairs, or scrambled Sobol or Halton points
+mapped to normals through a Brownian bridge, which puts each path's total
+shock in the first quasi-random dimension. ``run_monte_carlo_adaptive``
+combines them with a control variate and simulates batches of paths until
+the standard errors of the reported statistics reach a target precision.
+The control is the Gaussian path driven by the same shocks, whose mean
+``S0 * (1 + mean_return) ** num_steps`` is known exactly.
+"""
+
+import functools
+import warnings
+from collections import deque
+
+import numpy as np
+
+from instrumentation import instrument
+from streaming_stats import QuantileSketch, RunningMoments
+
+# Percentiles reported for the simulated final prices
+DEFAULT_QUANTILES = (2.5, 50, 97.5)
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Full paths kept by the streaming accumulator for plotting
+DEFAULT_MAX_STORED_PATHS = 100
+
+
+# Return a numpy Generator from a seed, SeedSequence or existing Generator
+def make_rng(seed=None):
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+# Gaussian daily returns, written into growth as 1 + return
+def _gaussian_growth(growth, mean_return, std_return, rng):
+    rng.standard_normal(out=growth)
+    growth *= std_return
+    growth += 1.0 + mean_return
+
+
+# Student-t daily returns with df degrees of freedom, scaled to std_return.
+# t = z / sqrt(g / (df / 2)) with g ~ Gamma(df / 2), drawn straight into growth.
+def _student_t_growth(growth, mean_return, std_return, rng, df=4.0):
+    if df <= 2.0:
+        raise ValueError('Student-t returns need df > 2 for a finite variance')
+    rng.standard_normal(out=growth)
+    scale = rng.standard_gamma(df / 2.0, growth.shape)
+    np.sqrt(scale, out=scale)
+    growth /= scale
+    growth *= std_return * np.sqrt((df - 2.0) / 2.0)
+    growth += 1.0 + mean_return
+
+
+# Merton jump-diffusion: Gaussian diffusion plus a Poisson number of log-normal jumps
+# per day. mean_return and std_return describe the diffusion only; jump_intensity is
+# the expected number of jumps per day and jump_mean/jump_std the log jump size.
+def _jump_growth(growth, mean_return, std_return, rng, jump_intensity=0.01, jump_mean=0.0,
+                 jump_std=0.05):
+    _gaussian_growth(growth, mean_return, std_return, rng)
+    counts = rng.poisson(jump_intensity, growth.shape)
+    jumps = np.flatnonzero(counts)
+    if len(jumps):
+        num_jumps = counts.ravel()[jumps]
+        # The sum of k normal jumps is normal with k times the mean and variance
+        log_jumps = rng.standard_normal(len(jumps))
+        log_jumps *= jump_std * np.sqrt(num_jumps)
+        log_jumps += jump_mean * num_jumps
+        growth.ravel()[jumps] *= np.exp(log_jumps)
+
+
+# GARCH(1, 1) variance of every day given the standardised shocks z:
+#   variance[t] = omega + (alpha * z[t - 1] ** 2 + beta) * variance[t - 1]
+# The recursion is linear in the variance, so within a block of days it has the closed
+# form variance[t] = P[t] * (variance[start] + omega * sum(1 / P[1..t])) with P the
+# cumulative product of the factors; blocks keep P well inside floating-point range.
+def garch_variance(shocks, initial_variance, omega, alpha, beta, block_size=64):
+    num_paths, num_steps = shocks.shape
+    variance = np.empty((num_paths, num_steps))
+    if num_steps == 0:
+        return variance
+    variance[:, 0] = initial_variance
+    factors = np.square(shocks[:, :-1])
+    factors *= alpha
+    factors += beta
+    for start in range(1, num_steps, block_size):
+        block = slice(start, min(start + block_size, num_steps))
+        products = np.cumprod(factors[:, start - 1:block.stop - 1], axis=1)
+        sums = np.cumsum(np.reciprocal(products), axis=1)
+        sums *= omega
+        sums += variance[:, start - 1:start]
+        np.multiply(products, sums, out=variance[:, block])
+    return variance
+
+
+# GARCH(1, 1) daily returns whose long-run volatility is std_return
+def _garch_growth(growth, mean_return, std_return, rng, alpha=0.08, beta=0.9):
+    if alpha + beta >= 1.0:
+        raise ValueError('GARCH parameters must satisfy alpha + beta < 1')
+    rng.standard_normal(out=growth)
+    long_run = std_return ** 2
+    volatility = np.sqrt(garch_variance(growth, long_run, long_run * (1.0 - alpha - beta),
+                                        alpha, beta))
+    growth *= volatility
+    growth += 1.0 + mean_return
+
+
+# Markov-chain regime index of every path and day, shape (num_paths, num_steps).
+# transition[i, j] is the probability of moving from regime i to regime j and
+# initial_regimes the regime before the first step (one value or one per path).
+# Days are stepped in order but each step advances all paths at once, comparing one
+# uniform draw per path with the cumulative transition row of its current regime.
+def sample_regimes(transition, initial_regimes, num_paths, num_steps, rng):
+    transition = np.asarray(transition, dtype=float)
+    thresholds = np.cumsum(transition, axis=1)[:, :-1].T.copy()
+    dtype = np.int8 if len(transition) <= np.iinfo(np.int8).max else np.intp
+    state = np.broadcast_to(np.asarray(initial_regimes, dtype=dtype), (num_paths,)).copy()
+    uniforms = rng.random((num_steps, num_paths))
+    regimes = np.empty((num_steps, num_paths), dtype=dtype)
+    row_threshold = np.empty(num_paths)
+    above = np.empty(num_paths, dtype=bool)
+    for step in range(num_steps):
+        next_state = regimes[step]
+        next_state[:] = 0
+        for threshold in thresholds:
+            np.take(threshold, state, out=row_threshold)
+            np.greater(uniforms[step], row_threshold, out=above)
+            next_state += above
+        state = next_state
+    return regimes.T
+
+
+# Regime-switching daily returns: a Markov chain over regimes picks each day's mean and
+# volatility from regime_means/regime_stds, which replace mean_return and std_return.
+# initial_regime=None draws each path's starting regime from the chain's stationary
+# distribution.
+def _regime_growth(growth, mean_return, std_return, rng, regime_means, regime_stds, transition,
+                   initial_regime=None):
+    transition = np.asarray(transition, dtype=float)
+    num_paths, num_steps = growth.shape
+    if initial_regime is None:
+        initial_regime = rng.choice(len(transition), num_paths, p=stationary_distribution(transition))
+    regimes = sample_regimes(transition, initial_regime, num_paths, num_steps, rng)
+    rng.standard_normal(out=growth)
+    growth *= np.take(np.asarray(regime_stds, dtype=float), regimes)
+    growth += np.take(1.0 + np.asarray(regime_means, dtype=float), regimes)
+
+
+# Stationary distribution of a transition matrix (left eigenvector for eigenvalue 1)
+def stationary_distribution(transition):
+    values, vectors = np.linalg.eig(np.asarray(transition, dtype=float).T)
+    distribution = np.abs(np.real(vectors[:, np.argmin(np.abs(values - 1.0))]))
+    return distribution / distribution.sum()
+
+
+# Daily return models: name -> function filling a (num_paths, num_steps) array with
+# 1 + return in place. Model parameters are passed as keyword arguments.
+RETURN_MODELS = {
+    'gaussian': _gaussian_growth,
+    'student_t': _student_t_growth,
+    'jump': _jump_growth,
+    'garch': _garch_growth,
+    'regime': _regime_growth,
+}
+
+
+# Jump-diffusion parameters calibrated from a series of daily returns.
+# Days flagged by detect_outliers_zscore count as jumps: their frequency is the jump
+# intensity and their log returns give the jump size, while the remaining days give the
+# diffusion. Returns (mean_return, std_return, model_params) for model='jump'.
+def calibrate_jump_diffusion(returns, threshold=3):
+    # Imported here so that simulating does not load scipy.stats
+    from outliers import detect_outliers_zscore
+
+    returns = np.asarray(returns, dtype=float)
+    returns = returns[~np.isnan(returns)]
+    is_jump = np.asarray(detect_outliers_zscore(returns, threshold), dtype=bool)
+    diffusion = returns[~is_jump]
+    log_jumps = np.log1p(returns[is_jump])
+    model_params = {
+        'jump_intensity': float(is_jump.mean()),
+        'jump_mean': float(log_jumps.mean()) if len(log_jumps) else 0.0,
+        'jump_std': float(log_jumps.std(ddof=1)) if len(log_jumps) > 1 else 0.0,
+    }
+    return float(diffusion.mean()), float(diffusion.std(ddof=1)), model_params
+
+
+# Uniforms are kept this far inside (0, 1) before the inverse normal CDF
+_UNIFORM_MARGIN = 1e-12
+
+
+# Standard normal shocks of a block of paths, written into out (num_paths, num_steps)
+def _random_normals(out, rng):
+    rng.standard_normal(out=out)
+
+
+# Antithetic pairs: the second half of the paths uses the negated shocks of the first
+def _antithetic_normals(out, rng):
+    half = -(-len(out) // 2)
+    rng.standard_normal(out=out[:half])
+    np.negative(out[:len(out) - half], out=out[half:])
+
+
+# Randomised quasi-Monte Carlo: one freshly scrambled point set per block, so blocks are
+# independent replicates, turned into daily shocks by a Brownian bridge
+def _quasi_normals(out, rng, engine):
+    from scipy.special import ndtri
+
+    num_paths, num_steps = out.shape
+    if num_steps == 0:
+        return
+    sampler = engine(num_steps, scramble=True, rng=rng)
+    with warnings.catch_warnings():
+        # Sobol points are best balanced in powers of two; other counts remain unbiased
+        warnings.simplefilter('ignore', UserWarning)
+        uniforms = sampler.random(num_paths)
+    np.clip(uniforms, _UNIFORM_MARGIN, 1.0 - _UNIFORM_MARGIN, out=uniforms)
+    out[:] = brownian_bridge(ndtri(uniforms))
+
+
+def _sobol_normals(out, rng):
+    from scipy.stats import qmc
+
+    _quasi_normals(out, rng, qmc.Sobol)
+
+
+def _halton_normals(out, rng):
+    from scipy.stats import qmc
+
+    _quasi_normals(out, rng, qmc.Halton)
+
+
+# Shock sampling schemes: name -> function filling (num_paths, num_steps) standard normals
+SAMPLING_SCHEMES = {
+    'random': _random_normals,
+    'antithetic': _antithetic_normals,
+    'sobol': _sobol_normals,
+    'halton': _halton_normals,
+}
+
+
+# Order in which a Brownian bridge fixes the points W[1..num_steps] of a walk (W[0] = 0):
+# the end point first, then the midpoints of the known intervals, breadth first. Every
+# point is interpolated between its known neighbours plus a conditional normal term.
+@functools.lru_cache(maxsize=16)
+def _bridge_plan(num_steps):
+    plan = [(num_steps, 0, 0, 0.0, 0.0, np.sqrt(num_steps))]
+    intervals = deque([(0, num_steps)])
+    while intervals:
+        left, right = intervals.popleft()
+        if right - left < 2:
+            continue
+        middle = (left + right) // 2
+        plan.append((middle, left, right, (right - middle) / (right - left),
+                     (middle - left) / (right - left),
+                     np.sqrt((middle - left) * (right - middle) / (right - left))))
+        intervals.extend([(left, middle), (middle, right)])
+    return tuple(plan)
+
+
+# Daily shocks (num_paths, num_steps) of random walks built by a Brownian bridge from
+# normals (num_paths, num_steps) whose first columns matter most, as quasi-random points'
+# do. For independent normals the shocks are independent standard normals too.
+def brownian_bridge(normals):
+    num_paths, num_steps = normals.shape
+    walk = np.zeros((num_steps + 1, num_paths))
+    columns = np.ascontiguousarray(normals.T)
+    for k, (point, left, right, left_weight, right_weight, std) in enumerate(_bridge_plan(num_steps)):
+        row = walk[point]
+        np.multiply(columns[k], std, out=row)
+        if left_weight:
+            row += left_weight * walk[left]
+        if right_weight:
+            row += right_weight * walk[right]
+    return np.diff(walk, axis=0).T
+
+
+# Stand-in for the Generator handed to a return model. The model's daily shocks, its first
+# block of standard normals, come from the sampling scheme; every other draw (jump counts,
+# gamma scales, regime switches) goes to rng. With control set, the final growth of the
+# Gaussian path driven by the same shocks is kept in control_growth.
+class _ShockSource:
+
+    def __init__(self, rng, sampling, mean_return, std_return, control=False):
+        self._rng = rng
+        self._fill = SAMPLING_SCHEMES[sampling]
+        self._mean_return = mean_return
+        self._std_return = std_return
+        self._control = control
+        self._drawn = False
+        self.control_growth = None
+
+    def standard_normal(self, size=None, dtype=np.float64, out=None):
+        if self._drawn or out is None or out.ndim != 2:
+            return self._rng.standard_normal(size, dtype, out)
+        self._drawn = True
+        self._fill(out, self._rng)
+        if self._control:
+            gaussian = out * self._std_return
+            gaussian += 1.0 + self._mean_return
+            self.control_growth = np.prod(gaussian, axis=1)
+        return out
+
+    def __getattr__(self, name):
+        return getattr(self._rng, name)
+
+
+# Mean final price of Gaussian paths: daily growth factors are independent with mean
+# 1 + mean_return, so E[price[num_steps]] = initial_price * (1 + mean_return) ** num_steps
+def analytic_mean_price(initial_price, mean_return, num_steps):
+    return initial_price * (1.0 + mean_return) ** num_steps
+
+
+def _check_sampling(model, sampling):
+    if model not in RETURN_MODELS:
+        raise ValueError(f'Unknown return model: {model}')
+    if sampling not in SAMPLING_SCHEMES:
+        raise ValueError(f'Unknown sampling scheme {sampling!r}; use one of '
+                         f'{", ".join(SAMPLING_SCHEMES)}')
+
+
+# Price paths of one block and, with control set, the final prices of the matching
+# Gaussian control paths (None otherwise)
+def _simulate_paths(initial_price, mean_return, std_return, num_steps, num_paths, rng, model,
+                    model_params, sampling, control=False):
+    _check_sampling(model, sampling)
+    source = rng
+    if sampling != 'random' or control:
+        source = _ShockSource(rng, sampling, mean_return, std_return, control)
+    growth = np.empty((num_paths, num_steps))
+    RETURN_MODELS[model](growth, mean_return, std_return, source, **(model_params or {}))
+
+    paths = np.empty((num_paths, num_steps + 1))
+    paths[:, 0] = initial_price
+    np.cumprod(growth, axis=1, out=paths[:, 1:])
+    paths[:, 1:] *= initial_price
+    if not control:
+        return paths, None
+    if source.control_growth is None:
+        # A model that drew no shock block has no control path; its control is constant
+        return paths, np.full(num_paths, analytic_mean_price(initial_price, mean_return, num_steps))
+    return paths, initial_price * source.control_growth
+
+
+# Simulate one block of price paths.
+# Returns an array of shape (num_paths, num_steps + 1) whose first column is the
+# starting price, i.e. price[t] = price[t - 1] * (1 + return[t]). model names an entry
+# of RETURN_MODELS and model_params holds its keyword parameters; sampling names an
+# entry of SAMPLING_SCHEMES for the daily shocks.
+@instrument(rows='num_paths')
+def simulate_chunk(initial_price, mean_return, std_return, num_steps, num_paths, rng,
+                   model='gaussian', model_params=None, sampling='random'):
+    return _simulate_paths(initial_price, mean_return, std_return, num_steps, num_paths, rng,
+                           model, model_params, sampling)[0]
+
+
+# Yield blocks of at most chunk_size simulated paths until num_simulations are done.
+# Antithetic pairs and quasi-random point sets are formed within each block.
+def iter_price_paths(initial_price, mean_return, std_return, num_steps, num_simulations,
+                     chunk_size=DEFAULT_CHUNK_SIZE, seed=None, model='gaussian', model_params=None,
+                     sampling='random'):
+    rng = make_rng(seed)
+    for start in range(0, num_simulations, chunk_size):
+        num_paths = min(chunk_size, num_simulations - start)
+        yield simulate_chunk(initial_price, mean_return, std_return, num_steps, num_paths, rng,
+                             model, model_params, sampling)
+
+
+# Simulate all paths and return them as one (num_simulations, num_steps + 1) array
+def simulate_price_paths(initial_price, mean_return, std_return, num_steps, num_simulations,
+                         chunk_size=DEFAULT_CHUNK_SIZE, seed=None, model='gaussian',
+                         model_params=None, sampling='random'):
+    paths = np.empty((num_simulations, num_steps + 1))
+    start = 0
+    for chunk in iter_price_paths(initial_price, mean_return, std_return, num_steps,
+                                  num_simulations, chunk_size, seed, model, model_params,
+                                  sampling):
+        paths[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    return paths
+
+
+# Summary statistics of the simulated final prices, as reported in the notebook
+def summarize_final_prices(final_prices, initial_price, quantiles=DEFAULT_QUANTILES):
+    final_prices = np.asarray(final_prices, dtype=float)
+    final_returns = (final_prices - initial_price) / initial_price
+    return {
+        'quantiles': np.percentile(final_prices, quantiles),
+        'mean_final_price': final_prices.mean(),
+        'median_final_price': np.median(final_prices),
+        'std_final_price': final_prices.std(ddof=1),
+        'mean_final_return': final_returns.mean(),
+        'std_final_return': final_returns.std(),
+    }
+
+
+# Run a full simulation and summarise it.
+# Only the final price of each path is kept unless keep_paths is set, in which
+# case the complete (num_simulations, num_steps + 1) path matrix is returned too.
+@instrument(rows='num_simulations')
+def run_monte_carlo(initial_price, mean_return, std_return, num_steps, num_simulations,
+                    chunk_size=DEFAULT_CHUNK_SIZE, seed=None, quantiles=DEFAULT_QUANTILES,
+                    keep_paths=False, model='gaussian', model_params=None, sampling='random'):
+    if keep_paths:
+        paths = simulate_price_paths(initial_price, mean_return, std_return, num_steps,
+                                     num_simulations, chunk_size, seed, model, model_params,
+                                     sampling)
+        final_prices = paths[:, -1]
+    else:
+        paths = None
+        final_prices = np.empty(num_simulations)
+        start = 0
+        for chunk in iter_price_paths(initial_price, mean_return, std_return, num_steps,
+                                      num_simulations, chunk_size, seed, model, model_params,
+                                      sampling):
+            final_prices[start:start + len(chunk)] = chunk[:, -1]
+            start += len(chunk)
+
+    summary = summarize_final_prices(final_prices, initial_price, quantiles)
+    return summary, paths
+
+
+# Streaming summary of simulated paths.
+# Consumes chunks from iter_price_paths and keeps only online statistics of the final
+# prices (Welford moments plus a quantile sketch), optional per-day fan-chart sketches
+# and at most max_stored_paths full paths, so memory does not grow with the number of
+# simulations. Accumulators from separate runs can be merged.
+class MonteCarloAccumulator:
+
+    def __init__(self, initial_price, quantiles=DEFAULT_QUANTILES, fan_chart=False,
+                 max_stored_paths=DEFAULT_MAX_STORED_PATHS, relative_accuracy=0.001):
+        self.initial_price = initial_price
+        self.quantiles = quantiles
+        self.fan_chart = fan_chart
+        self.max_stored_paths = max_stored_paths
+        self.relative_accuracy = relative_accuracy
+        self.final_moments = RunningMoments()
+        self.final_sketch = QuantileSketch(relative_accuracy)
+        self.daily_moments = None
+        self.daily_sketch = None
+        self._stored = []
+        self._num_stored = 0
+
+    @property
+    def count(self):
+        return self.final_moments.count
+
+    def update(self, paths):
+        final_prices = paths[:, -1]
+        self.final_moments.update(final_prices)
+        self.final_sketch.update(final_prices)
+
+        if self.fan_chart:
+            if self.daily_sketch is None:
+                self.daily_moments = RunningMoments(paths.shape[1])
+                self.daily_sketch = QuantileSketch(self.relative_accuracy, paths.shape[1])
+            self.daily_moments.update(paths)
+            self.daily_sketch.update(paths)
+
+        self._store(paths)
+        return self
+
+    def merge(self, other):
+        self.final_moments.merge(other.final_moments)
+        self.final_sketch.merge(other.final_sketch)
+        if other.daily_sketch is not None:
+            if self.daily_sketch is None:
+                self.daily_moments = RunningMoments(len(other.daily_moments.mean))
+                self.daily_sketch = QuantileSketch(self.relative_accuracy, other.daily_sketch.num_columns)
+            self.daily_moments.merge(other.daily_moments)
+            self.daily_sketch.merge(other.daily_sketch)
+        for paths in other._stored:
+            self._store(paths)
+        return self
+
+    def _store(self, paths):
+        keep = min(self.max_stored_paths - self._num_stored, len(paths))
+        if keep > 0:
+            self._stored.append(paths[:keep].copy())
+            self._num_stored += keep
+
+    # Sample of at most max_stored_paths full paths, shape (n, num_steps + 1)
+    @property
+    def paths(self):
+        if not self._stored:
+            return np.empty((0, 0))
+        return np.concatenate(self._stored)
+
+    # Same keys as summarize_final_prices; quantiles and median come from the sketch
+    def summary(self):
+        mean_price = float(self.final_moments.mean)
+        quantiles = self.final_sketch.percentile(self.quantiles)
+        return {
+            'quantiles': quantiles,
+            'mean_final_price': mean_price,
+            'median_final_price': float(self.final_sketch.percentile(50)[0]),
+            'std_final_price': float(self.final_moments.std(ddof=1)),
+            'mean_final_return': (mean_price - self.initial_price) / self.initial_price,
+            'std_final_return': float(self.final_moments.std()) / self.initial_price,
+        }
+
+    # Per-day percentile bands, shape (len(percentiles), num_steps + 1)
+    def fan_bands(self, percentiles=DEFAULT_QUANTILES):
+        if self.daily_sketch is None:
+            raise ValueError('Fan-chart bands were not collected; pass fan_chart=True')
+        return self.daily_sketch.percentile(percentiles)
+
+
+# Run a simulation in streaming mode and return (summary, accumulator).
+# Suitable for path counts whose full matrix would not fit in memory.
+@instrument(rows='num_simulations')
+def run_monte_carlo_streaming(initial_price, mean_return, std_return, num_steps, num_simulations,
+                              chunk_size=DEFAULT_CHUNK_SIZE, seed=None, quantiles=DEFAULT_QUANTILES,
+                              fan_chart=False, max_stored_paths=DEFAULT_MAX_STORED_PATHS,
+                              model='gaussian', model_params=None, sampling='random'):
+    accumulator = MonteCarloAccumulator(initial_price, quantiles, fan_chart, max_stored_paths)
+    for chunk in iter_price_paths(initial_price, mean_return, std_return, num_steps,
+                                  num_simulations, chunk_size, seed, model, model_params,
+                                  sampling):
+        accumulator.update(chunk)
+    return accumulator.summary(), accumulator
+
+
+# Relative standard error aimed at by run_monte_carlo_adaptive
+DEFAULT_PRECISION = 0.005
+
+# Paths per batch of run_monte_carlo_adaptive; a power of two suits Sobol points
+DEFAULT_BATCH_SIZE = 4096
+
+# Batches simulated before the standard errors are trusted
+DEFAULT_MIN_BATCHES = 8
+
+
+# Estimates and standard errors from per-batch statistics. Every batch is an independent
+# replicate (antithetic pairs and quasi-random point sets never span two batches), so the
+# spread of the batch estimates gives the standard error for every sampling scheme.
+# Columns of batch_stats: mean final price, mean control, std, median, quantiles.
+def _batch_errors(batch_stats, beta, expected_control):
+    batch_stats = np.asarray(batch_stats)
+    estimates = batch_stats.copy()
+    estimates[:, 0] -= beta * (batch_stats[:, 1] - expected_control)
+    errors = estimates.std(axis=0, ddof=1) / np.sqrt(len(estimates))
+    return estimates.mean(axis=0), errors
+
+
+# Control-variate coefficient cov(Y, X) / var(X) from running sums
+def _control_beta(sums, count):
+    sum_y, sum_x, sum_xx, sum_xy = sums
+    variance = sum_xx / count - (sum_x / count) ** 2
+    if variance <= 0:
+        return 0.0
+    return (sum_xy / count - sum_x * sum_y / count ** 2) / variance
+
+
+# Simulate batches of batch_size paths until the standard error of every reported
+# statistic (mean, standard deviation and quantiles of the final price) is at most
+# precision times its estimate, or num_simulations paths are done; precision=None always
+# runs num_simulations paths. sampling names an entry of SAMPLING_SCHEMES. With
+# control_variate the mean final price is corrected by the Gaussian control paths driven
+# by the same shocks (see analytic_mean_price); for model='gaussian' it is then exact.
+# Returns (summary, standard_errors): summary has the keys of summarize_final_prices
+# plus 'num_simulations' and 'converged'; standard_errors has the same statistic keys.
+@instrument(rows='num_simulations')
+def run_monte_carlo_adaptive(initial_price, mean_return, std_return, num_steps,
+                             num_simulations=1_000_000, precision=DEFAULT_PRECISION,
+                             batch_size=DEFAULT_BATCH_SIZE, min_batches=DEFAULT_MIN_BATCHES,
+                             seed=None, quantiles=DEFAULT_QUANTILES, sampling='sobol',
+                             control_variate=True, model='gaussian', model_params=None):
+    _check_sampling(model, sampling)
+    if sampling == 'sobol':
+        batch_size = 1 << max(batch_size - 1, 1).bit_length()
+    rng = make_rng(seed)
+    expected_control = analytic_mean_price(initial_price, mean_return, num_steps)
+    percentiles = [50, *quantiles]
+
+    final_batches, batch_stats = [], []
+    sums, beta = np.zeros(4), 0.0
+    done, converged = 0, False
+    while done < num_simulations and not converged:
+        num_paths = min(batch_size, num_simulations - done)
+        paths, control = _simulate_paths(initial_price, mean_return, std_return, num_steps,
+                                         num_paths, rng, model, model_params, sampling,
+                                         control=control_variate)
+        final_prices = paths[:, -1].copy()
+        del paths
+        if control is None:
+            control = np.full(num_paths, expected_control)
+        final_batches.append(final_prices)
+        batch_stats.append([final_prices.mean(), control.mean(), final_prices.std(ddof=1),
+                            *np.percentile(final_prices, percentiles)])
+        sums += [final_prices.sum(), control.sum(), control @ control, control @ final_prices]
+        done += num_paths
+
+        if control_variate:
+            beta = _control_beta(sums, done)
+        if precision is not None and len(batch_stats) >= min_batches:
+            estimates, errors = _batch_errors(batch_stats, beta, expected_control)
+            tracked = [0, 2, *range(4, len(estimates))]
+            converged = bool(np.all(errors[tracked] <= precision * np.abs(estimates[tracked])))
+
+    final_prices = np.concatenate(final_batches)
+    summary = summarize_final_prices(final_prices, initial_price, quantiles)
+    sum_y, sum_x = sums[:2]
+    mean_price = (sum_y - beta * (sum_x - done * expected_control)) / done
+    summary['mean_final_price'] = mean_price
+    summary['mean_final_return'] = (mean_price - initial_price) / initial_price
+    summary['num_simulations'] = done
+    summary['converged'] = converged
+
+    if len(batch_stats) > 1:
+        errors = _batch_errors(batch_stats, beta, expected_control)[1]
+    else:
+        errors = np.full(len(batch_stats[0]), np.nan)
+    standard_errors = {
+        'quantiles': errors[4:],
+        'mean_final_price': errors[0],
+        'median_final_price': errors[3],
+        'std_final_price': errors[2],
+        'mean_final_return': errors[0] / initial_price,
+        'std_final_return': errors[2] / initial_price,
+    }
+    return summary, standard_errors
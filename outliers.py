@@ -0,0 +1,132 @@
+"""Outlier detection for the numerical price columns.
+
+``detect_outliers_zscore`` and ``detect_outliers_iqr`` are the notebook's
+single-column detectors. ``analyze_outliers`` runs both methods over all
+columns in one vectorised pass: both reduce to a lower and an upper bound per
+column (mean -/+ threshold * std, Q1 -/+ factor * IQR), which are computed
+once, optionally per ticker, and compared against the 2-D value array. The
+result holds a compact bitmask with one bit per (method, column) plus the
+bounds, so the summary and the box plot reuse it without materialising one
+boolean column per (method, column).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import zscore
+
+from instrumentation import instrument
+
+METHODS = ('zscore', 'iqr')
+
+
+# Function to detect outliers using z-score method
+def detect_outliers_zscore(data, threshold=3):
+    z_scores = np.abs(zscore(data))
+    return z_scores > threshold
+
+
+# Function to detect outliers using IQR method
+def detect_outliers_iqr(data, factor=1.5):
+    Q1 = data.quantile(0.25)
+    Q3 = data.quantile(0.75)
+    IQR = Q3 - Q1
+    lower_bound = Q1 - factor * IQR
+    upper_bound = Q3 + factor * IQR
+    return (data < lower_bound) | (data > upper_bound)
+
+
+def _mask_dtype(num_bits):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if num_bits <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f'Too many outlier flags for one bitmask: {num_bits}')
+
+
+# Result of analyze_outliers.
+# mask has one integer per row; bit METHODS.index(method) * len(columns) + column index
+# is set when that column is an outlier under that method. bounds has one row per
+# column (or per (group, column) when grouped) with the statistics and both bounds.
+class OutlierAnalysis:
+
+    def __init__(self, index, columns, mask, bounds):
+        self.index = index
+        self.columns = list(columns)
+        self.mask = mask
+        self.bounds = bounds
+
+    def _bit(self, method, column):
+        return METHODS.index(method) * len(self.columns) + self.columns.index(column)
+
+    # Boolean flags of one column under one method
+    def flags(self, method, column):
+        return (self.mask >> self._bit(method, column)) & 1 == 1
+
+    # Number of outliers per column and method
+    def counts(self):
+        return pd.DataFrame({method: [int(self.flags(method, column).sum()) for column in self.columns]
+                             for method in METHODS}, index=self.columns)
+
+    # Whether any column has an outlier under the method
+    def has_outliers(self, method):
+        start = METHODS.index(method) * len(self.columns)
+        method_bits = ((1 << len(self.columns)) - 1) << start
+        return bool(int(np.bitwise_or.reduce(self.mask)) & method_bits)
+
+
+# Column statistics and z-score/IQR bounds for a 2-D array (rows are observations)
+def _bounds(values, z_threshold, iqr_factor):
+    mean = values.mean(axis=0)
+    std = values.std(axis=0)
+    q1, q3 = np.quantile(values, [0.25, 0.75], axis=0)
+    spread = q3 - q1
+    return {
+        'mean': mean, 'std': std, 'q1': q1, 'q3': q3,
+        'zscore_lower': mean - z_threshold * std, 'zscore_upper': mean + z_threshold * std,
+        'iqr_lower': q1 - iqr_factor * spread, 'iqr_upper': q3 + iqr_factor * spread,
+    }
+
+
+# Bitmask of the rows of values falling outside the bounds in stats
+def _flag_mask(values, stats, dtype):
+    num_columns = values.shape[1]
+    mask = np.zeros(len(values), dtype=dtype)
+    for m, method in enumerate(METHODS):
+        flagged = (values < stats[f'{method}_lower']) | (values > stats[f'{method}_upper'])
+        weights = (1 << (m * num_columns + np.arange(num_columns))).astype(dtype)
+        mask |= (flagged.astype(dtype) * weights).sum(axis=1, dtype=dtype)
+    return mask
+
+
+# Flag z-score and IQR outliers for all columns at once.
+# by names a column to compute the statistics per group (e.g. 'Stock Name').
+@instrument
+def analyze_outliers(df, columns, z_threshold=3, iqr_factor=1.5, by=None):
+    columns = list(columns)
+    values = df[columns].to_numpy(dtype=np.float64)
+    dtype = _mask_dtype(len(METHODS) * len(columns))
+
+    if by is None:
+        stats = _bounds(values, z_threshold, iqr_factor)
+        bounds = pd.DataFrame(stats, index=pd.Index(columns, name='column'))
+        mask = _flag_mask(values, stats, dtype)
+    else:
+        codes, groups = pd.factorize(df[by], sort=True)
+        order = np.argsort(codes, kind='stable')
+        splits = np.searchsorted(codes[order], np.arange(1, len(groups)))
+        # Each group is compared against its own bounds on its sorted slice, so no
+        # bound array the size of values is ever built
+        sorted_values = values[order]
+        del values
+        per_group = []
+        sorted_mask = np.empty(len(order), dtype=dtype)
+        for start, stop in zip(np.r_[0, splits], np.r_[splits, len(order)]):
+            stats = _bounds(sorted_values[start:stop], z_threshold, iqr_factor)
+            sorted_mask[start:stop] = _flag_mask(sorted_values[start:stop], stats, dtype)
+            per_group.append(stats)
+        mask = np.empty_like(sorted_mask)
+        mask[order] = sorted_mask
+        bounds = pd.concat(
+            {group: pd.DataFrame(stats, index=pd.Index(columns, name='column'))
+             for group, stats in zip(groups, per_group)}, names=[by])
+
+    return OutlierAnalysis(df.index, columns, mask, bounds)
@@ -0,0 +1,217 @@
+"""Off-screen chart rendering with downsampling for long series.
+
+Charts are described as a draw function plus the (already reduced) data it
+needs, and ``render_figures`` draws them with the Agg canvas straight to PNG
+files, spread over a process pool: drawing is pure Python and holds the GIL,
+so processes rather than threads overlap it. Nothing is shown on screen.
+
+The data is reduced before it reaches a worker, so no figure draws more
+points than its pixels can show:
+
+* long lines keep the points chosen by Largest-Triangle-Three-Buckets
+  (``lttb_indices``) or the minimum and maximum of every bin
+  (``minmax_indices``), which preserves the peaks a line has to show;
+* scatter plots keep one point per occupied pixel cell and group
+  (``thin_scatter_indices``), so isolated outliers survive while the dense
+  middle is thinned;
+* Monte Carlo simulations are drawn as percentile bands per day
+  (``path_bands`` or ``MonteCarloAccumulator.fan_bands``) rather than one
+  line per path.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from instrumentation import instrument
+
+# Points kept per line; a 10-inch figure at 100 dpi is 1000 pixels wide
+DEFAULT_MAX_POINTS = 2000
+
+# Pixel cells used to thin scatter plots (width, height)
+DEFAULT_SCATTER_GRID = (1000, 600)
+
+# Percentile bands of a Monte Carlo fan, paired from the outside in around the median
+FAN_PERCENTILES = (2.5, 10, 25, 50, 75, 90, 97.5)
+
+DEFAULT_FIGSIZE = (10, 6)
+
+
+# Datetimes and other numeric arrays as float64 for the geometry of the downsamplers
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64) or np.issubdtype(values.dtype, np.timedelta64):
+        return values.astype('int64').astype(np.float64)
+    return values.astype(np.float64, copy=False)
+
+
+# Indices of num_points points chosen by Largest-Triangle-Three-Buckets (Steinarsson, 2013).
+# The first and last points are kept; every bucket in between contributes the point forming
+# the largest triangle with the point chosen before it and the mean of the next bucket.
+def lttb_indices(x, y, num_points):
+    x, y = _as_float(x), _as_float(y)
+    n = len(y)
+    if num_points >= n or num_points < 3:
+        return np.arange(n)
+
+    # Bucket j covers [edges[j], edges[j + 1]); the last bucket is the final point alone
+    edges = np.append(np.linspace(1, n - 1, num_points - 1).astype(np.intp), n)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x, edges[:-1]) / sizes
+    mean_y = np.add.reduceat(y, edges[:-1]) / sizes
+
+    selected = np.empty(num_points, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(num_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        areas = np.abs((ax - mean_x[bucket + 1]) * (y[start:stop] - ay)
+                       - (ax - x[start:stop]) * (mean_y[bucket + 1] - ay))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+# Indices of the minimum and maximum of y in each of num_bins consecutive bins, in order
+def minmax_indices(y, num_bins):
+    y = _as_float(y)
+    n = len(y)
+    if 2 * num_bins >= n:
+        return np.arange(n)
+    bins = np.arange(n) * num_bins // n
+    order = np.lexsort((y, bins))
+    starts = np.searchsorted(bins, np.arange(num_bins))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+# (x, y) reduced to at most max_points points with method 'lttb' or 'minmax'.
+# Non-finite values are dropped first.
+def downsample(x, y, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    x, y = np.asarray(x), np.asarray(y)
+    finite = np.isfinite(_as_float(y))
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    if method == 'lttb':
+        keep = lttb_indices(x, y, max_points)
+    elif method == 'minmax':
+        keep = minmax_indices(y, max_points // 2)
+    else:
+        raise ValueError(f"Unknown downsampling method {method!r}; use 'lttb' or 'minmax'")
+    return x[keep], y[keep]
+
+
+# Indices of the first point of every (group, pixel cell) pair, in their original order.
+# grid is the number of cells across and up the data range of x and y.
+def thin_scatter_indices(x, y, groups=None, grid=DEFAULT_SCATTER_GRID):
+    x, y = _as_float(x), _as_float(y)
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    x, y = x[finite], y[finite]
+    if not len(finite):
+        return finite
+
+    cells = np.zeros(len(finite), dtype=np.int64)
+    for values, size in ((y, grid[1]), (x, grid[0])):
+        low, high = values.min(), values.max()
+        scale = (size - 1) / (high - low) if high > low else 0.0
+        cells = cells * size + np.rint((values - low) * scale).astype(np.int64)
+    if groups is not None:
+        codes = np.unique(np.asarray(groups)[finite], return_inverse=True)[1]
+        cells += codes.astype(np.int64) * grid[0] * grid[1]
+    return finite[np.sort(np.unique(cells, return_index=True)[1])]
+
+
+# Per-step percentiles of a (num_paths, num_steps + 1) path matrix,
+# shape (len(percentiles), num_steps + 1)
+def path_bands(paths, percentiles=FAN_PERCENTILES):
+    return np.percentile(paths, percentiles, axis=0)
+
+
+# Draw functions: each receives a matplotlib Axes and the reduced data. They live at
+# module level so they can be sent to the worker processes.
+
+def draw_lines(ax, lines, title=None, xlabel=None, ylabel=None, legend=True):
+    for label, (x, y) in lines.items():
+        ax.plot(x, y, label=label, linewidth=1)
+    _decorate(ax, title, xlabel, ylabel, legend and len(lines) > 1)
+
+
+def draw_scatter(ax, groups, title=None, xlabel=None, ylabel=None, legend=True):
+    for label, (x, y) in groups.items():
+        ax.scatter(x, y, s=4, label=label, rasterized=True)
+    _decorate(ax, title, xlabel, ylabel, legend and len(groups) > 1)
+
+
+# Fan chart: bands (len(percentiles), num_steps + 1) are filled pairwise from the outside
+# in, darker towards the median, which is drawn as a line
+def draw_fan(ax, bands, percentiles=FAN_PERCENTILES, title=None, xlabel='Days', ylabel='Price',
+             color='tab:blue'):
+    steps = np.arange(bands.shape[1])
+    num_pairs = len(percentiles) // 2
+    for i in range(num_pairs):
+        ax.fill_between(steps, bands[i], bands[-1 - i], color=color, alpha=0.15 + 0.15 * i,
+                        linewidth=0, label=f'{percentiles[i]:g}-{percentiles[-1 - i]:g}th percentile')
+    if len(percentiles) % 2:
+        ax.plot(steps, bands[num_pairs], color=color, linewidth=1.5,
+                label=f'{percentiles[num_pairs]:g}th percentile')
+    _decorate(ax, title, xlabel, ylabel, True)
+
+
+# Histogram from precomputed counts and bin edges
+def draw_histogram(ax, counts, edges, title=None, xlabel=None, ylabel='Frequency'):
+    ax.stairs(counts, edges, fill=True)
+    _decorate(ax, title, xlabel, ylabel, False)
+
+
+def draw_heatmap(ax, matrix, labels, title=None):
+    image = ax.imshow(matrix, cmap='coolwarm', vmin=-1, vmax=1)
+    ax.figure.colorbar(image, ax=ax)
+    ax.set_xticks(range(len(labels)), labels, rotation=45, ha='right')
+    ax.set_yticks(range(len(labels)), labels)
+    ax.set_title(title)
+
+
+def _decorate(ax, title, xlabel, ylabel, legend):
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True, alpha=0.3)
+    if legend:
+        ax.legend()
+
+
+# Worker: draw one figure on the Agg canvas and write it to path
+def _render(task):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    path, draw, kwargs, figsize, dpi = task
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    draw(figure.subplots(), **kwargs)
+    figure.tight_layout()
+    figure.savefig(path, dpi=dpi)
+    return path
+
+
+# Render charts to PNG files in figures_dir.
+# charts maps a file name (without extension) to (draw, kwargs) or (draw, kwargs, figsize).
+# n_workers=1 renders in-process; None uses one worker per CPU. mp_context (a
+# multiprocessing context) sets how the workers are started. Returns name -> path.
+@instrument
+def render_figures(charts, figures_dir, n_workers=None, dpi=100, mp_context=None):
+    os.makedirs(figures_dir, exist_ok=True)
+    tasks = []
+    for name, (draw, kwargs, *figsize) in charts.items():
+        tasks.append((os.path.join(figures_dir, f'{name}.png'), draw, kwargs,
+                      figsize[0] if figsize else DEFAULT_FIGSIZE, dpi))
+
+    if n_workers == 1 or len(tasks) < 2:
+        paths = list(map(_render, tasks))
+    else:
+        with ProcessPoolExecutor(min(n_workers or os.cpu_count(), len(tasks)),
+                                 mp_context=mp_context) as pool:
+            paths = list(pool.map(_render, tasks))
+    return dict(zip(charts, paths))
@@ -0,0 +1,278 @@
+"""Tweet sentiment aligned with the price bars of many tickers.
+
+The tweets CSV holds one tweet per row, and a ticker can have many tweets a
+day or none at all. ``TickerDateIndex`` sorts the rows of either table by
+(ticker, date) once. It then answers as-of lookups for all rows in one
+``searchsorted``. Ticker codes and dense date ranks are combined into a
+single sorted integer key, so there is no loop over tickers or rows.
+
+Features are assembled in three steps:
+
+* ``daily_sentiment`` aggregates the tweets per ticker-day (count, sum,
+  mean, positive and negative shares) with ``np.add.reduceat`` over the
+  sorted rows;
+* ``align_sentiment`` assigns every ticker-day to the first bar on or after
+  it, so tweets of weekends and holidays count towards the next session. It
+  also adds the last known daily sentiment and its age, which lets a bar
+  without tweets see how stale the latest sentiment is;
+* ``add_lag_features`` and ``add_rolling_features`` shift and window the
+  per-bar values within each ticker from cumulative sums. They match
+  ``groupby(...).shift`` and ``groupby(...).rolling`` without a per-group
+  Python call.
+
+A bar's own ``sentiment`` includes the tweets of its date. Use the lagged
+columns when predicting that day's return.
+"""
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrument
+
+DEFAULT_LAGS = (1, 2, 5)
+DEFAULT_WINDOWS = (5, 20)
+
+ROLLING_STATS = ('mean', 'sum', 'std')
+
+_NS_PER_DAY = 86_400 * 10 ** 9
+
+
+# Dates of any pandas-readable form as datetime64[ns]
+def _as_datetime(dates):
+    return np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]')
+
+
+# Rows of a table sorted by (ticker, date). order maps the sorted positions back to the
+# rows given; rows whose ticker is not among categories are left out.
+class TickerDateIndex:
+
+    def __init__(self, tickers, dates, categories=None):
+        tickers = pd.Categorical(tickers, categories=categories)
+        codes = tickers.codes.astype(np.int64)
+        dates = _as_datetime(dates)
+        order = np.lexsort((dates, codes))
+        order = order[codes[order] >= 0]
+
+        self.categories = tickers.categories
+        self.order = order
+        self.codes = codes[order]
+        self.dates = dates[order]
+        # Rows of ticker code c are offsets[c]:offsets[c + 1]
+        self.offsets = np.searchsorted(self.codes, np.arange(len(self.categories) + 1))
+
+    @classmethod
+    def from_frame(cls, frame, ticker_column='Stock Name', date_column='Date', categories=None):
+        return cls(frame[ticker_column], frame[date_column], categories)
+
+    def __len__(self):
+        return len(self.order)
+
+    # Position of the first row of its ticker, for every sorted row
+    def group_starts(self):
+        return self.offsets[self.codes]
+
+    def tickers(self):
+        return pd.Categorical.from_codes(self.codes, self.categories)
+
+    # For every row of other (in its sorted order), the sorted position in this index of the
+    # latest row of the same ticker at or before its date ('backward') or of the earliest
+    # row on or after it ('forward'); -1 where there is none. Both indexes must share their
+    # categories. tolerance (a Timedelta) bounds the distance between the two dates.
+    def asof(self, other, direction='backward', tolerance=None, allow_exact_matches=True):
+        if not self.categories.equals(other.categories):
+            raise ValueError('Both indexes must be built with the same ticker categories')
+        if direction not in ('backward', 'forward'):
+            raise ValueError(f"Unknown direction {direction!r}; use 'backward' or 'forward'")
+
+        # Dense ranks of the dates of both sides keep code * num_dates + rank within int64
+        ranks = np.unique(np.concatenate([self.dates, other.dates]), return_inverse=True)[1]
+        num_dates = int(ranks.max()) + 1 if len(ranks) else 1
+        keys = self.codes * num_dates + ranks[:len(self)]
+        other_keys = other.codes * num_dates + ranks[len(self):]
+
+        if direction == 'backward':
+            side = 'right' if allow_exact_matches else 'left'
+            positions = np.searchsorted(keys, other_keys, side=side) - 1
+        else:
+            side = 'left' if allow_exact_matches else 'right'
+            positions = np.searchsorted(keys, other_keys, side=side)
+        inside = (positions >= 0) & (positions < len(self))
+        clipped = np.clip(positions, 0, max(len(self) - 1, 0))
+        found = inside & (self.codes[clipped] == other.codes) if len(self) else inside
+        if tolerance is not None and len(self):
+            distance = np.abs(self.dates[clipped] - other.dates)
+            found &= distance <= pd.Timedelta(tolerance).to_timedelta64()
+        return np.where(found, positions, -1)
+
+
+# Sorted tickers appearing in any of the columns
+def _shared_categories(*columns):
+    names = np.concatenate([np.asarray(pd.unique(pd.Series(column)), dtype=object)
+                            for column in columns])
+    return pd.Index(pd.unique(names)).dropna().sort_values()
+
+
+# Tweet sentiment per ticker-day, sorted by (ticker, date). Tweets with a missing
+# sentiment are ignored. Dates with a time of day are bucketed by calendar day.
+@instrument
+def daily_sentiment(sentiment_df, ticker_column='Stock Name', date_column='Date',
+                    sentiment_column='sentiment', categories=None):
+    days = _as_datetime(sentiment_df[date_column]).astype('datetime64[D]').astype('datetime64[ns]')
+    index = TickerDateIndex(sentiment_df[ticker_column], days, categories)
+    values = sentiment_df[sentiment_column].to_numpy(dtype=np.float64, na_value=np.nan)[index.order]
+    scored = ~np.isnan(values)
+    codes, dates, values = index.codes[scored], index.dates[scored], values[scored]
+
+    if len(values):
+        starts = np.flatnonzero(np.concatenate(
+            ([True], (codes[1:] != codes[:-1]) | (dates[1:] != dates[:-1]))))
+    else:
+        starts = np.zeros(0, dtype=np.intp)
+    counts = np.diff(np.append(starts, len(values)))
+
+    def total(array):
+        return np.add.reduceat(array, starts) if len(starts) else np.zeros(0)
+
+    sums = total(values)
+    return pd.DataFrame({
+        ticker_column: pd.Categorical.from_codes(codes[starts], index.categories),
+        date_column: dates[starts],
+        'tweet_count': counts,
+        'sentiment_sum': sums,
+        'sentiment': sums / np.maximum(counts, 1),
+        'positive_share': total((values > 0).astype(np.float64)) / np.maximum(counts, 1),
+        'negative_share': total((values < 0).astype(np.float64)) / np.maximum(counts, 1),
+    })
+
+
+# The rows of stock_df sorted by (ticker, date) with the daily sentiment of daily (see
+# daily_sentiment) aligned to them:
+#   tweet_count, sentiment_sum   tweets since the ticker's previous bar, up to its date
+#   sentiment                    their mean sentiment; 0 (neutral) for bars without tweets
+#   positive_share, negative_share
+#   last_sentiment               mean sentiment of the latest tweet day at or before the bar
+#   days_since_sentiment         calendar days since that tweet day
+# last_sentiment is NaN where no tweet day lies within max_staleness (a Timedelta, if given).
+@instrument
+def align_sentiment(stock_df, daily, ticker_column='Stock Name', date_column='Date',
+                    max_staleness=None):
+    categories = _shared_categories(stock_df[ticker_column], daily[ticker_column])
+    bars = TickerDateIndex.from_frame(stock_df, ticker_column, date_column, categories)
+    days = TickerDateIndex.from_frame(daily, ticker_column, date_column, categories)
+    frame = stock_df.iloc[bars.order].reset_index(drop=True)
+
+    # Every tweet day counts towards the first bar on or after it
+    bucket = bars.asof(days, direction='forward')
+    assigned = bucket >= 0
+    counts = daily['tweet_count'].to_numpy(dtype=np.float64)[days.order][assigned]
+
+    def per_bar(column):
+        values = daily[column].to_numpy(dtype=np.float64)[days.order][assigned]
+        return np.bincount(bucket[assigned], weights=values * counts if column.endswith('_share')
+                           else values, minlength=len(bars))
+
+    tweet_count = np.bincount(bucket[assigned], weights=counts, minlength=len(bars))
+    sentiment_sum = per_bar('sentiment_sum')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frame['tweet_count'] = tweet_count.astype(np.int64)
+        frame['sentiment_sum'] = sentiment_sum
+        frame['sentiment'] = np.where(tweet_count > 0, sentiment_sum / tweet_count, 0.0)
+        for column in ('positive_share', 'negative_share'):
+            frame[column] = np.where(tweet_count > 0, per_bar(column) / tweet_count, 0.0)
+
+    latest = days.asof(bars, direction='backward', tolerance=max_staleness)
+    found = latest >= 0
+    daily_means = daily['sentiment'].to_numpy(dtype=np.float64)[days.order]
+    frame['last_sentiment'] = np.where(found, daily_means[np.maximum(latest, 0)], np.nan)
+    age = (bars.dates - days.dates[np.maximum(latest, 0)]) / np.timedelta64(_NS_PER_DAY, 'ns') \
+        if len(days) else np.full(len(bars), np.nan)
+    frame['days_since_sentiment'] = np.where(found, age, np.nan)
+    return frame
+
+
+# Row positions of the first row of each row's ticker in a frame grouped by ticker
+def _group_starts(frame, ticker_column):
+    codes = pd.factorize(frame[ticker_column], sort=False)[0]
+    positions = np.arange(len(codes))
+    boundary = np.concatenate(([True], codes[1:] != codes[:-1])) if len(codes) else positions > 0
+    return np.maximum.accumulate(np.where(boundary, positions, 0)) if len(codes) else positions
+
+
+# Add '<column>_lag_<k>' columns: the value k rows earlier for the same ticker, NaN for the
+# first k rows of each ticker. frame must be sorted by (ticker, date), as the output of
+# align_sentiment is.
+def add_lag_features(frame, columns=('sentiment',), lags=DEFAULT_LAGS, ticker_column='Stock Name'):
+    starts = _group_starts(frame, ticker_column)
+    positions = np.arange(len(frame))
+    features = {}
+    for column in columns:
+        values = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        for lag in lags:
+            source = positions - lag
+            features[f'{column}_lag_{lag}'] = np.where(source >= starts,
+                                                       values[np.maximum(source, 0)], np.nan)
+    return frame.assign(**features)
+
+
+# Add '<column>_<stat>_<window>' columns over the last window rows of the same ticker,
+# for stat in 'mean', 'sum' and 'std' (sample standard deviation). Missing values are
+# skipped; windows with fewer than min_periods values (default: the window) give NaN.
+# frame must be sorted by (ticker, date).
+def add_rolling_features(frame, columns=('sentiment',), windows=DEFAULT_WINDOWS, stats=('mean',),
+                         min_periods=None, ticker_column='Stock Name'):
+    unknown = set(stats) - set(ROLLING_STATS)
+    if unknown:
+        raise ValueError(f'Unknown rolling statistics {sorted(unknown)}; use {ROLLING_STATS}')
+    starts = _group_starts(frame, ticker_column)
+    ends = np.arange(1, len(frame) + 1)
+    features = {}
+    for column in columns:
+        values = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        cumulative_count = np.concatenate(([0], np.cumsum(valid)))
+        cumulative_sum = np.concatenate(([0.0], np.cumsum(filled)))
+        cumulative_square = np.concatenate(([0.0], np.cumsum(filled * filled))) \
+            if 'std' in stats else None
+        for window in windows:
+            first = np.maximum(ends - window, starts)
+            count = cumulative_count[ends] - cumulative_count[first]
+            total = cumulative_sum[ends] - cumulative_sum[first]
+            enough = count >= (window if min_periods is None else min_periods)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                if 'mean' in stats:
+                    features[f'{column}_mean_{window}'] = np.where(enough, total / count, np.nan)
+                if 'sum' in stats:
+                    features[f'{column}_sum_{window}'] = np.where(enough, total, np.nan)
+                if 'std' in stats:
+                    squares = cumulative_square[ends] - cumulative_square[first]
+                    variance = np.maximum(squares - total * total / count, 0.0) / (count - 1)
+                    features[f'{column}_std_{window}'] = np.where(enough & (count > 1),
+                                                                  np.sqrt(variance), np.nan)
+    return frame.assign(**features)
+
+
+# The bars of stock_df sorted by (ticker, date) with their aligned sentiment (see
+# align_sentiment) and, per ticker, lagged sentiment for each of lags and, for each of
+# windows, the rolling mean and standard deviation of the sentiment, the number of tweets
+# and their tweet-weighted mean sentiment ('sentiment_weighted_<window>').
+@instrument
+def sentiment_features(stock_df, sentiment_df, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS,
+                       max_staleness=None, ticker_column='Stock Name', date_column='Date'):
+    daily = daily_sentiment(sentiment_df, ticker_column, date_column)
+    frame = align_sentiment(stock_df, daily, ticker_column, date_column, max_staleness)
+    if lags:
+        frame = add_lag_features(frame, ['sentiment'], lags, ticker_column)
+    if windows:
+        frame = add_rolling_features(frame, ['sentiment'], windows, ('mean', 'std'),
+                                     ticker_column=ticker_column)
+        frame = add_rolling_features(frame, ['tweet_count', 'sentiment_sum'], windows, ('sum',),
+                                     ticker_column=ticker_column)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for window in windows:
+                count = frame[f'tweet_count_sum_{window}'].to_numpy()
+                total = frame.pop(f'sentiment_sum_sum_{window}').to_numpy()
+                # Neutral over windows without tweets, NaN over incomplete windows
+                frame[f'sentiment_weighted_{window}'] = np.where(
+                    count > 0, total / count, np.where(np.isnan(count), np.nan, 0.0))
+    return frame
@@ -0,0 +1,122 @@
+"""Sentiment regimes for regime-switching Monte Carlo simulations.
+
+Every trading day of a ticker gets a regime from that day's tweets: the mean
+``sentiment`` rounded to -1, 0 or 1, with days without tweets neutral as in
+the LSTM features. Tickers without any tweets are left out by default:
+every one of their days would be neutral, so the neutral regime would
+describe missing data rather than neutral sentiment. The daily returns falling in each regime give its mean and
+volatility, and the regimes of consecutive trading days of the same ticker
+give the Markov transition matrix.
+
+The tables are small and depend only on the input data, so they are fitted
+once and cached on disk under a hash of the columns they are built from;
+``monte_carlo`` then samples regime paths for all simulations at once.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskCache, content_hash
+from monte_carlo import stationary_distribution
+
+REGIMES = (-1, 0, 1)
+
+REGIME_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'regimes')
+
+
+# Per-regime return tables and transition matrix, indexed in REGIMES order
+class SentimentRegimes:
+
+    def __init__(self, means, stds, transition, num_days):
+        self.means = means
+        self.stds = stds
+        self.transition = transition
+        self.num_days = num_days
+
+    # Keyword parameters for model='regime' in monte_carlo.
+    # initial_regime is a sentiment label (-1, 0 or 1); None starts from the stationary mix.
+    def model_params(self, initial_regime=None):
+        return {
+            'regime_means': self.means,
+            'regime_stds': self.stds,
+            'transition': self.transition,
+            'initial_regime': None if initial_regime is None else REGIMES.index(initial_regime),
+        }
+
+    def table(self):
+        return pd.DataFrame({
+            'mean_return': self.means,
+            'std_return': self.stds,
+            'num_days': self.num_days,
+            'stationary_share': stationary_distribution(self.transition),
+        }, index=pd.Index(REGIMES, name='regime'))
+
+    def transition_table(self):
+        return pd.DataFrame(self.transition, index=pd.Index(REGIMES, name='from'),
+                            columns=pd.Index(REGIMES, name='to'))
+
+
+# Daily returns and sentiment regime of every (ticker, date) row of stock_df.
+# Tickers that have no rows in sentiment_df are dropped unless include_uncovered is True.
+def daily_regimes(stock_df, sentiment_df, price_column='Close', ticker_column='Stock Name',
+                  date_column='Date', include_uncovered=False):
+    frame = stock_df[[ticker_column, date_column, price_column]].assign(
+        **{date_column: pd.to_datetime(stock_df[date_column])})
+    if not include_uncovered:
+        frame = frame[frame[ticker_column].isin(sentiment_df[ticker_column].unique())]
+    frame = frame.sort_values([ticker_column, date_column], kind='stable')
+    daily = sentiment_df.assign(**{date_column: pd.to_datetime(sentiment_df[date_column])}) \
+        .groupby([ticker_column, date_column], observed=True)['sentiment'].mean().rename('sentiment')
+    frame = frame.join(daily, on=[ticker_column, date_column])
+    frame['sentiment'] = frame['sentiment'].fillna(0.0)
+    frame['Returns'] = frame.groupby(ticker_column, sort=False, observed=True)[price_column].pct_change()
+    frame['regime'] = np.clip(np.rint(frame['sentiment'].to_numpy()), -1, 1).astype(np.int8)
+    return frame
+
+
+def _fit_tables(frame, ticker_column):
+    codes = frame['regime'].to_numpy() + 1
+    returns = frame['Returns'].to_numpy()
+    valid = ~np.isnan(returns)
+    num_regimes = len(REGIMES)
+
+    num_days = np.bincount(codes[valid], minlength=num_regimes)
+    sums = np.bincount(codes[valid], weights=returns[valid], minlength=num_regimes)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / num_days
+        deviations = returns[valid] - means[codes[valid]]
+        stds = np.sqrt(np.bincount(codes[valid], weights=deviations * deviations,
+                                   minlength=num_regimes) / (num_days - 1))
+    # Regimes without enough days fall back to the pooled statistics
+    sparse = num_days < 2
+    means[sparse] = returns[valid].mean()
+    stds[sparse] = returns[valid].std(ddof=1)
+
+    tickers = frame[ticker_column].to_numpy()
+    same_ticker = tickers[1:] == tickers[:-1]
+    counts = np.zeros((num_regimes, num_regimes))
+    np.add.at(counts, (codes[:-1][same_ticker], codes[1:][same_ticker]), 1)
+    totals = counts.sum(axis=1, keepdims=True)
+    # A regime never left behind has no outgoing transitions; treat all moves as equally likely
+    transition = np.where(totals > 0, counts / np.maximum(totals, 1), 1.0 / num_regimes)
+    return SentimentRegimes(means, stds, transition, num_days)
+
+
+# Fit (or load from cache) the per-regime return tables and the transition matrix.
+# stock_df holds the daily prices and sentiment_df the tweets with their 'sentiment'.
+# include_uncovered also fits tickers without tweets, all of whose days are neutral.
+def fit_sentiment_regimes(stock_df, sentiment_df, price_column='Close', ticker_column='Stock Name',
+                          date_column='Date', cache_dir=REGIME_CACHE_DIR, include_uncovered=False):
+    prices = stock_df[[ticker_column, date_column, price_column]]
+    sentiment = sentiment_df[[ticker_column, date_column, 'sentiment']]
+    key = content_hash('sentiment_regimes', prices, sentiment, include_uncovered)
+    cache = DiskCache(cache_dir)
+    regimes = cache.get(key)
+    if regimes is None:
+        frame = daily_regimes(prices, sentiment, price_column, ticker_column, date_column,
+                              include_uncovered)
+        regimes = _fit_tables(frame, ticker_column)
+        cache.put(key, regimes)
+    return regimes
@@ -0,0 +1,162 @@
+"""Stationarity checks for price series.
+
+``adf_test`` is the notebook's Augmented Dickey-Fuller report;
+``adf_result`` returns the same numbers as a dict and ``choose_differencing``
+uses them to pick the differencing order for ARIMA.
+
+``analyze_stationarity`` runs the ADF test on the levels and the first
+difference and an additive decomposition of the monthly means separately for
+every ``Stock Name``, instead of on one series mixing all tickers, across a
+process pool. Each ticker's result is cached on disk under a hash of its
+series, so repeated runs only load them; the decomposition components can be
+read back with ``load_decomposition``.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import statsmodels
+from statsmodels.tsa.seasonal import seasonal_decompose
+from statsmodels.tsa.stattools import adfuller
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskCache, content_hash
+from instrumentation import instrument
+
+STATIONARITY_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'stationarity')
+
+
+# Augmented Dickey-Fuller test as a dict
+def adf_result(timeseries):
+    result = adfuller(timeseries, autolag='AIC')
+    return {
+        'adf_statistic': result[0],
+        'p_value': result[1],
+        'used_lag': result[2],
+        'num_observations': result[3],
+        'critical_values': result[4],
+    }
+
+
+# Function to perform Augmented Dickey-Fuller test for stationarity
+def adf_test(timeseries):
+    result = adf_result(timeseries)
+    print('ADF Statistic:', result['adf_statistic'])
+    print('p-value:', result['p_value'])
+    print('Critical Values:', result['critical_values'])
+
+
+# Smallest number of differences (up to max_d) after which the ADF test rejects a
+# unit root at the given significance level
+def choose_differencing(timeseries, alpha=0.05, max_d=2):
+    values = np.asarray(timeseries, dtype=float)
+    for d in range(max_d + 1):
+        if d:
+            values = np.diff(values)
+        if adf_result(values)['p_value'] < alpha:
+            return d
+    return max_d
+
+
+# ADF result with the critical values flattened into columns, each name prefixed
+def _adf_columns(values, prefix):
+    result = adf_result(values)
+    critical_values = result.pop('critical_values')
+    columns = {f'{prefix}_{name}': value for name, value in result.items()}
+    columns.update({f'{prefix}_critical_value_{level}': value
+                    for level, value in critical_values.items()})
+    return columns
+
+
+# Additive (or multiplicative) decomposition of the monthly mean of a date-indexed series.
+# Returns the components as a frame, or None when there are fewer than two full periods.
+def monthly_decomposition(series, period=12, model='additive'):
+    monthly = series.resample('ME').mean().interpolate(limit_area='inside').dropna()
+    if len(monthly) < 2 * period:
+        return None
+    result = seasonal_decompose(monthly, model=model, period=period)
+    return pd.DataFrame({'observed': result.observed, 'trend': result.trend,
+                         'seasonal': result.seasonal, 'resid': result.resid})
+
+
+# Strength of trend and seasonality (Wang, Smith and Hyndman, 2006): 1 - Var(R) / Var(X + R),
+# near 1 when the component dominates the residuals
+def _decomposition_columns(components):
+    if components is None:
+        return {'num_months': np.nan, 'trend_strength': np.nan, 'seasonal_strength': np.nan,
+                'seasonal_amplitude': np.nan, 'seasonal_peak_month': np.nan}
+    valid = components.dropna()
+    resid_variance = valid['resid'].var()
+    seasonal = components['seasonal']
+    return {
+        'num_months': len(components),
+        'trend_strength': max(0.0, 1 - resid_variance / (valid['trend'] + valid['resid']).var()),
+        'seasonal_strength': max(0.0, 1 - resid_variance / (valid['seasonal'] + valid['resid']).var()),
+        'seasonal_amplitude': seasonal.max() - seasonal.min(),
+        'seasonal_peak_month': int(seasonal.idxmax().month),
+    }
+
+
+# Worker: test and decompose (or load from cache) the series of one ticker
+def _analyze_ticker(task):
+    ticker_column, ticker, dates, values, key, cache_dir, alpha, period, model = task
+    cache = DiskCache(cache_dir)
+    start = time.perf_counter()
+    cached = cache.get(key)
+    if cached is None:
+        series = pd.Series(values, index=pd.DatetimeIndex(dates))
+        components = monthly_decomposition(series, period, model)
+        columns = {**_adf_columns(values, 'level'), **_adf_columns(np.diff(values), 'diff'),
+                   **_decomposition_columns(components)}
+        cache.put(key, {'columns': columns, 'components': components})
+    else:
+        columns = cached['columns']
+    return {
+        ticker_column: ticker,
+        'num_observations': len(values),
+        **columns,
+        'level_stationary': columns['level_p_value'] < alpha,
+        'diff_stationary': columns['diff_p_value'] < alpha,
+        'cached': cached is not None,
+        'seconds': time.perf_counter() - start,
+        'result_key': key,
+    }
+
+
+# ADF tests of the levels and first difference plus the monthly decomposition for every
+# ticker, across a process pool (n_workers=1 runs in-process; None uses one worker per
+# CPU; mp_context sets how the workers are started). Returns one row per ticker;
+# stationarity is judged at alpha.
+@instrument
+def analyze_stationarity(stock_df, price_column='Close', ticker_column='Stock Name',
+                         date_column='Date', alpha=0.05, period=12, model='additive',
+                         n_workers=None, cache_dir=STATIONARITY_CACHE_DIR, mp_context=None):
+    ordered = stock_df.sort_values([ticker_column, date_column], kind='stable')
+    tasks = []
+    for ticker, group in ordered.groupby(ticker_column, observed=True, sort=True):
+        dates = group[date_column].to_numpy(dtype='datetime64[ns]')
+        values = group[price_column].to_numpy(dtype=np.float64)
+        key = content_hash('stationarity', ticker, dates.view(np.int64), values, period, model,
+                           statsmodels.__version__)
+        tasks.append((ticker_column, ticker, dates, values, key, cache_dir, alpha, period, model))
+
+    # Cached tickers need no worker; the rest go to the pool, largest series first
+    cache = DiskCache(cache_dir)
+    pending = sorted((task for task in tasks if task[4] not in cache), key=lambda task: -len(task[3]))
+    rows = [_analyze_ticker(task) for task in tasks if task[4] in cache]
+    if n_workers == 1 or len(pending) < 2:
+        rows.extend(map(_analyze_ticker, pending))
+    else:
+        with ProcessPoolExecutor(min(n_workers or os.cpu_count(), len(pending)),
+                                 mp_context=mp_context) as pool:
+            rows.extend(pool.map(_analyze_ticker, pending))
+    return pd.DataFrame(rows).sort_values(ticker_column, ignore_index=True)
+
+
+# Trend, seasonal and residual components of one ticker (by its result_key), or None
+# when its history is shorter than two periods
+def load_decomposition(result_key, cache_dir=STATIONARITY_CACHE_DIR):
+    cached = DiskCache(cache_dir).get(result_key)
+    return None if cached is None else cached['components']
@@ -0,0 +1,163 @@
+"""Online statistics for data that arrives in chunks.
+
+``RunningMoments`` keeps Welford mean/variance, and ``QuantileSketch`` is a
+log-bucketed (DDSketch-style) quantile sketch with a fixed relative accuracy.
+Both work column-wise on 2-D chunks, so a whole block of simulated paths can
+be folded in with a few vectorised operations, and both can be merged, so
+partial results from several chunks or processes combine exactly.
+"""
+
+import numpy as np
+
+
+# Welford / Chan running count, mean, variance, min and max per column
+class RunningMoments:
+
+    def __init__(self, num_columns=None):
+        shape = () if num_columns is None else (num_columns,)
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+
+    # Fold in a chunk of observations (rows are observations)
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        if n == 0:
+            return self
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        self._combine(n, mean, m2, values.min(axis=0), values.max(axis=0))
+        return self
+
+    # Combine with another RunningMoments over the same columns
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other._m2, other.min, other.max)
+        return self
+
+    def _combine(self, n, mean, m2, minimum, maximum):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self._m2 = self._m2 + m2 + delta ** 2 * (self.count * n / total)
+        self.min = np.minimum(self.min, minimum)
+        self.max = np.maximum(self.max, maximum)
+        self.count = total
+
+    def variance(self, ddof=0):
+        if self.count - ddof <= 0:
+            return np.full_like(self.mean, np.nan)
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.variance(ddof))
+
+
+# Bucket counts for one sign of the values, one row per column
+class _LogStore:
+
+    def __init__(self, num_columns):
+        self.counts = np.zeros((num_columns, 0), dtype=np.int64)
+        self.offset = 0
+
+    def _grow(self, low, high):
+        if self.counts.shape[1] == 0:
+            self.counts = np.zeros((self.counts.shape[0], high - low + 1), dtype=np.int64)
+            self.offset = low
+            return
+        new_low = min(low, self.offset)
+        new_high = max(high, self.offset + self.counts.shape[1] - 1)
+        if new_low == self.offset and new_high == self.offset + self.counts.shape[1] - 1:
+            return
+        counts = np.zeros((self.counts.shape[0], new_high - new_low + 1), dtype=np.int64)
+        start = self.offset - new_low
+        counts[:, start:start + self.counts.shape[1]] = self.counts
+        self.counts, self.offset = counts, new_low
+
+    # keys has shape (n, num_columns); a NaN-free integer bucket index per value
+    def add(self, keys, mask):
+        if not mask.any():
+            return
+        selected = keys[mask]
+        self._grow(int(selected.min()), int(selected.max()))
+        width = self.counts.shape[1]
+        columns = np.broadcast_to(np.arange(keys.shape[1]), keys.shape)[mask]
+        flat = columns * width + (selected - self.offset)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        if other.counts.shape[1] == 0:
+            return
+        self._grow(other.offset, other.offset + other.counts.shape[1] - 1)
+        start = other.offset - self.offset
+        self.counts[:, start:start + other.counts.shape[1]] += other.counts
+
+
+# Mergeable quantile sketch with relative accuracy.
+# Every value is counted in the bucket ceil(log_gamma(|x|)); a quantile estimate is
+# within relative_accuracy of the true order statistic. Memory depends only on the
+# range of the values, not on how many were added.
+class QuantileSketch:
+
+    def __init__(self, relative_accuracy=0.001, num_columns=None):
+        self.relative_accuracy = relative_accuracy
+        self.num_columns = num_columns
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self._gamma)
+        width = 1 if num_columns is None else num_columns
+        self._positive = _LogStore(width)
+        self._negative = _LogStore(width)
+        self._zero = np.zeros(width, dtype=np.int64)
+        self.count = 0
+
+    # Fold in a chunk of observations (rows are observations)
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return self
+        values = values.reshape(len(values), -1)
+        magnitude = np.abs(values)
+        nonzero = magnitude > 0
+        keys = np.zeros(values.shape, dtype=np.int64)
+        keys[nonzero] = np.ceil(np.log(magnitude[nonzero]) / self._log_gamma)
+        self._positive.add(keys, values > 0)
+        self._negative.add(keys, values < 0)
+        self._zero += (~nonzero).sum(axis=0)
+        self.count += len(values)
+        return self
+
+    # Combine with another sketch built with the same accuracy and columns
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different relative accuracy')
+        self._positive.merge(other._positive)
+        self._negative.merge(other._negative)
+        self._zero += other._zero
+        self.count += other.count
+        return self
+
+    def _bucket_values(self, store):
+        keys = store.offset + np.arange(store.counts.shape[1])
+        return 2 * self._gamma ** keys / (self._gamma + 1)
+
+    # Estimate quantiles (0-1). Returns shape (len(q),) or (len(q), num_columns).
+    def quantile(self, q):
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.count == 0:
+            raise ValueError('Cannot compute quantiles of an empty sketch')
+        # Buckets in ascending value order: negatives by decreasing magnitude, zero, positives
+        counts = np.concatenate([self._negative.counts[:, ::-1], self._zero[:, None],
+                                 self._positive.counts], axis=1)
+        values = np.concatenate([-self._bucket_values(self._negative)[::-1], [0.0],
+                                 self._bucket_values(self._positive)])
+        cumulative = counts.cumsum(axis=1)
+        ranks = q * (self.count - 1)
+        index = (cumulative[:, None, :] > ranks[None, :, None]).argmax(axis=2)
+        result = values[index].T
+        return result[:, 0] if self.num_columns is None else result
+
+    def percentile(self, p):
+        return self.quantile(np.asarray(p, dtype=float) / 100)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from sentiment_regimes import fit_sentiment_regimes
+
+
+def _prices(ticker, num_days, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'Stock Name': ticker, 'Date': pd.bdate_range('2021-01-01', periods=num_days),
+                         'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, num_days)))})
+
+
+def test_uncovered_ticker_does_not_change_neutral_regime(tmp_path):
+    covered = _prices('PETR4.SA', 120, seed=0)
+    rng = np.random.default_rng(1)
+    tweet_days = covered['Date'].sample(60, random_state=2)
+    sentiment_df = pd.DataFrame({'Stock Name': 'PETR4.SA', 'Date': tweet_days,
+                                 'sentiment': rng.choice([-1.0, 0.0, 1.0], len(tweet_days))})
+    with_uncovered = pd.concat([covered, _prices('VALE3.SA', 120, seed=3)], ignore_index=True)
+
+    alone = fit_sentiment_regimes(covered, sentiment_df, cache_dir=str(tmp_path / 'a'))
+    together = fit_sentiment_regimes(with_uncovered, sentiment_df, cache_dir=str(tmp_path / 'b'))
+    np.testing.assert_allclose(together.table(), alone.table())
+    np.testing.assert_allclose(together.transition, alone.transition)
+
+    pooled = fit_sentiment_regimes(with_uncovered, sentiment_df, cache_dir=str(tmp_path / 'c'),
+                                   include_uncovered=True)
+    assert pooled.num_days[1] > alone.num_days[1]
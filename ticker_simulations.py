@@ -0,0 +1,147 @@
+"""Per-ticker Monte Carlo simulations for the whole stock universe.
+
+Return parameters are estimated separately for every ``Stock Name`` so that
+``pct_change`` never spans two tickers, and the simulations are spread over a
+process pool. Each ticker gets its own child of one ``SeedSequence`` and its
+paths are split into fixed-size blocks with their own grandchild seeds, so
+the results are identical whatever the number of workers.
+
+With a target ``precision`` every ticker is instead simulated by
+``run_monte_carlo_adaptive`` as one task, which stops as soon as the
+standard errors of its statistics are small enough; the rows then carry
+those standard errors and the number of paths each ticker needed.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrument
+from monte_carlo import (DEFAULT_QUANTILES, MonteCarloAccumulator, iter_price_paths,
+                         run_monte_carlo_adaptive)
+
+# Paths simulated by one task; the unit of work handed to a worker
+DEFAULT_BLOCK_SIZE = 50_000
+
+
+# Latest price and daily return mean/std for every ticker
+def ticker_return_parameters(stock_df, price_column='Close', ticker_column='Stock Name',
+                             date_column='Date'):
+    ordered = stock_df[[ticker_column, date_column, price_column]].sort_values(
+        [ticker_column, date_column], kind='stable')
+    returns = ordered.groupby(ticker_column, sort=False, observed=True)[price_column].pct_change()
+    grouped = ordered.assign(Returns=returns).groupby(ticker_column, observed=True)
+    params = pd.DataFrame({
+        'initial_price': grouped[price_column].last(),
+        'mean_return': grouped['Returns'].mean(),
+        'std_return': grouped['Returns'].std(),
+        'num_observations': grouped['Returns'].count(),
+    })
+    params.index.name = ticker_column
+    return params.sort_index()
+
+
+# Worker: simulate one block of paths for one ticker
+def _simulate_block(task):
+    (ticker, initial_price, mean_return, std_return, num_steps, num_paths, chunk_size, seed,
+     model, model_params, sampling) = task
+    accumulator = MonteCarloAccumulator(initial_price, max_stored_paths=0)
+    for chunk in iter_price_paths(initial_price, mean_return, std_return, num_steps,
+                                  num_paths, chunk_size, seed, model, model_params, sampling):
+        accumulator.update(chunk)
+    return ticker, accumulator
+
+
+# Worker: simulate one ticker until its standard errors reach the target precision
+def _simulate_adaptive(task):
+    ticker, initial_price, mean_return, std_return, num_steps, seed, options = task
+    summary, errors = run_monte_carlo_adaptive(initial_price, mean_return, std_return, num_steps,
+                                               seed=seed, **options)
+    return ticker, summary, errors
+
+
+# Simulate every ticker in stock_df and return one row of statistics per ticker.
+# n_workers=1 runs in-process; None uses one worker per CPU. model and model_params
+# select a return model of monte_carlo.RETURN_MODELS, shared by all tickers, and sampling
+# a shock sampling scheme of monte_carlo.SAMPLING_SCHEMES. With precision (a relative
+# standard error) each ticker runs at most num_simulations paths of
+# run_monte_carlo_adaptive, with the control variate unless control_variate is False.
+# mp_context (a multiprocessing context) sets how the worker processes are started.
+@instrument
+def simulate_universe(stock_df, num_steps=252, num_simulations=10_000, seed=None, n_workers=None,
+                      block_size=DEFAULT_BLOCK_SIZE, chunk_size=10_000, quantiles=DEFAULT_QUANTILES,
+                      ticker_column='Stock Name', model='gaussian', model_params=None,
+                      sampling='random', precision=None, control_variate=True, mp_context=None,
+                      price_column='Close', date_column='Date'):
+    params = ticker_return_parameters(stock_df, price_column, ticker_column, date_column)
+    params = params[params['num_observations'] > 1]
+
+    ticker_seeds = np.random.SeedSequence(seed).spawn(len(params))
+    if precision is not None:
+        options = {'num_simulations': num_simulations, 'precision': precision,
+                   'quantiles': quantiles, 'sampling': sampling,
+                   'control_variate': control_variate, 'model': model, 'model_params': model_params}
+        tasks = [(ticker, row['initial_price'], row['mean_return'], row['std_return'], num_steps,
+                  ticker_seed, options)
+                 for (ticker, row), ticker_seed in zip(params.iterrows(), ticker_seeds)]
+        return _adaptive_rows(tasks, params, n_workers, num_steps, quantiles, ticker_column,
+                              mp_context)
+
+    num_blocks = -(-num_simulations // block_size)
+    tasks = []
+    for (ticker, row), ticker_seed in zip(params.iterrows(), ticker_seeds):
+        for block, block_seed in enumerate(ticker_seed.spawn(num_blocks)):
+            num_paths = min(block_size, num_simulations - block * block_size)
+            tasks.append((ticker, row['initial_price'], row['mean_return'], row['std_return'],
+                          num_steps, num_paths, chunk_size, block_seed, model, model_params,
+                          sampling))
+
+    if n_workers == 1:
+        accumulators = _merge_blocks(map(_simulate_block, tasks), params, quantiles)
+    else:
+        with ProcessPoolExecutor(n_workers, mp_context=mp_context) as pool:
+            accumulators = _merge_blocks(pool.map(_simulate_block, tasks), params, quantiles)
+
+    rows = []
+    for ticker, row in params.iterrows():
+        summary = accumulators[ticker].summary()
+        result = {ticker_column: ticker, **row.to_dict(), 'num_simulations': num_simulations,
+                  'num_days': num_steps}
+        result['num_observations'] = int(result['num_observations'])
+        for q, value in zip(quantiles, summary.pop('quantiles')):
+            result[f'p{q:g}_final_price'] = value
+        result.update(summary)
+        rows.append(result)
+    return pd.DataFrame(rows)
+
+
+# Merge block accumulators per ticker, in task order so the result is deterministic
+def _merge_blocks(blocks, params, quantiles):
+    accumulators = {ticker: MonteCarloAccumulator(row['initial_price'], quantiles, max_stored_paths=0)
+                    for ticker, row in params.iterrows()}
+    for ticker, accumulator in blocks:
+        accumulators[ticker].merge(accumulator)
+    return accumulators
+
+
+# One row per ticker from adaptive tasks, with the standard errors as 'se_' columns
+def _adaptive_rows(tasks, params, n_workers, num_steps, quantiles, ticker_column, mp_context=None):
+    if n_workers == 1:
+        results = list(map(_simulate_adaptive, tasks))
+    else:
+        with ProcessPoolExecutor(n_workers, mp_context=mp_context) as pool:
+            results = list(pool.map(_simulate_adaptive, tasks))
+
+    rows = []
+    for ticker, summary, errors in results:
+        result = {ticker_column: ticker, **params.loc[ticker].to_dict(),
+                  'num_simulations': summary.pop('num_simulations'), 'num_days': num_steps}
+        result['num_observations'] = int(result['num_observations'])
+        for q, value, error in zip(quantiles, summary.pop('quantiles'), errors.pop('quantiles')):
+            result[f'p{q:g}_final_price'] = value
+            result[f'se_p{q:g}_final_price'] = error
+        result.update(summary)
+        result.update({f'se_{name}': error for name, error in errors.items()})
+        rows.append(result)
+    return pd.DataFrame(rows)
@@ -0,0 +1,74 @@
+"""Token frequency statistics for the text EDA.
+
+Each text column is tokenized once, in a streaming pass over fixed-size
+chunks, into a ``Counter``. Counters from different chunks (or processes)
+are simply added together, so memory grows with the vocabulary rather than
+the corpus. The same counts feed ``most_common``, the bar charts and
+``WordCloud.generate_from_frequencies``, instead of joining the corpus into
+one string and letting WordCloud tokenize it again.
+"""
+
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from nltk.tokenize import word_tokenize
+from wordcloud import STOPWORDS
+
+from instrumentation import instrument
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Tokens WordCloud.generate would keep: words, optionally with apostrophes
+_WORD_RE = re.compile(r"\w[\w']*")
+
+
+# Counter of word_tokenize tokens for one chunk of texts
+def _count_chunk(texts):
+    counts = Counter()
+    for text in texts:
+        counts.update(word_tokenize(text))
+    return counts
+
+
+def _chunks(texts, chunk_size):
+    iterator = iter(texts)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+# Tokenize texts chunk by chunk and return the merged token Counter.
+# With n_process > 1 chunks are counted in a process pool, with at most
+# 2 * n_process chunks in flight so memory stays flat for long inputs.
+@instrument
+def count_tokens(texts, chunk_size=DEFAULT_CHUNK_SIZE, n_process=1):
+    counts = Counter()
+    if n_process == 1:
+        for chunk in _chunks(texts, chunk_size):
+            counts.update(_count_chunk(chunk))
+        return counts
+
+    with ProcessPoolExecutor(n_process) as pool:
+        pending = []
+        for chunk in _chunks(texts, chunk_size):
+            pending.append(pool.submit(_count_chunk, chunk))
+            if len(pending) >= 2 * n_process:
+                counts.update(pending.pop(0).result())
+        for future in pending:
+            counts.update(future.result())
+    return counts
+
+
+# Token Counters for several DataFrame columns, each column tokenized once
+def column_token_counts(df, columns, chunk_size=DEFAULT_CHUNK_SIZE, n_process=1):
+    return {column: count_tokens(df[column], chunk_size, n_process) for column in columns}
+
+
+# Frequencies suitable for WordCloud.generate_from_frequencies: keeps word tokens,
+# drops punctuation, numbers and stopwords the way WordCloud.generate would
+def wordcloud_frequencies(token_counts, stopwords=STOPWORDS):
+    stopwords = {word.lower() for word in stopwords}
+    return {token: count for token, count in token_counts.items()
+            if _WORD_RE.fullmatch(token) and not token.isdigit()
+            and token.lower() not in stopwords}